@@ -1,9 +1,9 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
 from forum.models import ForumAccount
+from platforum_project.func.text import fold
 
 
 class CustomManager(BaseUserManager):
@@ -41,8 +41,52 @@ class CustomUser(AbstractUser):
     REQUIRED_FIELDS = ["email", "last_name", "first_name"]
     objects = CustomManager()
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "username" not in update_fields:
+            # e.g. the last login, saved on every login
+            return
+        # The username is copied on the forum accounts of the user, see ForumAccount.username_key
+        ForumAccount.objects.filter(user=self).exclude(username_key=fold(self.username)).update(
+            username_key=fold(self.username))
+
     def retrieve_forum_account(self, forum):
-        try:
-            return ForumAccount.objects.get(user=self, forum=forum)
-        except ObjectDoesNotExist:
-            return None
+        """
+            Returns the account of the user in a forum, or None if they are not a member.
+
+            The account is memoized on the user object, which lives as long as the request for 'request.user', so the
+            views and the security checks share a single lookup, and is read from the cache of accounts across
+            requests (see 'ForumAccount.get_cached'). It comes with its forum and user already loaded.
+
+            Args:
+                forum: The forum.
+
+            Returns:
+                ForumAccount: The account of the user in the forum, or None.
+            """
+        if forum.pk not in getattr(self, "_forum_accounts", {}):
+            return self.remember_forum_account(forum, ForumAccount.get_cached(self.pk, forum.pk))
+        return self._forum_accounts[forum.pk]
+
+    def remember_forum_account(self, forum, account):
+        """
+            Memoizes the account of the user in a forum, see 'retrieve_forum_account'.
+
+            Args:
+                forum: The forum.
+                account: The account of the user in the forum, or None if they are not a member.
+
+            Returns:
+                ForumAccount: The account, with its forum and user set.
+            """
+        if not hasattr(self, "_forum_accounts"):
+            self._forum_accounts = {}
+        if account:
+            account.forum, account.user = forum, self
+        self._forum_accounts[forum.pk] = account
+        return account
+
+    def forget_forum_account(self, forum_id):
+        if hasattr(self, "_forum_accounts"):
+            self._forum_accounts.pop(forum_id, None)
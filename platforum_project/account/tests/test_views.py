@@ -1,11 +1,19 @@
+from smtplib import SMTPException
+from unittest.mock import Mock
+
 import pytest
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from pytest_django.asserts import assertRedirects
 from django.urls import reverse
 
 from account.models import CustomUser
-from account.verification import email_verification_token
+from account.verification import email_verification_token, send_email_verification
+from sav.models import OutgoingEmail
 
 
 def test_signup_view_get(client):
@@ -26,6 +34,8 @@ def test_signup_view_post(client, mailoutbox):
     user = CustomUser.objects.get(username="Patrick")
     assert not user.is_active
     assertRedirects(response, reverse("landing:index"))
+    assert not mailoutbox
+    call_command("send_emails")
     assert len(mailoutbox) == 1
     assert mailoutbox[0].subject == 'Activation du compte PlatForum'
 
@@ -63,3 +73,22 @@ def test_account_activation(client):
     assert user.is_active
     assert response.status_code == 302
     assertRedirects(response, reverse("landing:index"))
+
+
+@pytest.mark.django_db
+def test_verification_email_is_retried_later_when_smtp_fails(client, mailoutbox, monkeypatch):
+    # Given a queued verification email
+    send_email_verification(RequestFactory().get("/"), CustomUser.objects.create_user(
+        username="roro", email="r@p.com", first_name="r", last_name="r", password="12345678"))
+    # When the SMTP server refuses it
+    monkeypatch.setattr(locmem.EmailBackend, "send_messages", Mock(side_effect=SMTPException("Indisponible")))
+    call_command("send_emails")
+    # Then it is kept for a later attempt
+    email = OutgoingEmail.objects.get()
+    assert (email.attempts, email.next_attempt > timezone.now()) == (1, True)
+    # And sent once due again and the server is back
+    monkeypatch.undo()
+    OutgoingEmail.objects.update(next_attempt=timezone.now())
+    call_command("send_emails")
+    assert [message.to for message in mailoutbox] == [["r@p.com"]]
+    assert not OutgoingEmail.objects.exists()
@@ -1,11 +1,11 @@
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
 from account.models import CustomUser
 from account.verification import email_verification_token
+from sav.models import OutgoingEmail
 
 
 def send_email_verification(request, user: CustomUser):
@@ -19,4 +19,4 @@ def send_email_verification(request, user: CustomUser):
             'token': email_verification_token.make_token(user),
         }
     )
-    EmailMessage(to=[user.email], subject=subject, body=body).send()
+    OutgoingEmail.queue(to=user.email, subject=subject, body=body)
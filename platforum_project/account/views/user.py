@@ -1,5 +1,3 @@
-from smtplib import SMTPAuthenticationError
-
 from django.contrib import messages
 from django.contrib.auth import logout, get_user_model
 from django.contrib.auth.decorators import login_required
@@ -19,16 +17,16 @@ def signup(request):
      Handles the user signup process.
 
      This function processes POST requests to create a new user account. It creates a user instance from the SignUpForm,
-     sets the user as inactive, and attempts to send an email verification link. Upon successful account creation,
-     a success message is displayed to the user. If the email fails to send due to SMTP authentication issues,
-     an error message is displayed. For GET requests, it displays the signup form.
+     sets the user as inactive, and queues an email with a verification link (sent by the 'send_emails' command). Upon
+     successful account creation, a success message is displayed to the user. For GET requests, it displays the signup
+     form.
 
      Args:
          request: The HTTP request object.
 
      Returns:
          HttpResponse: Renders the signup page with a context containing the signup form. Redirects to the landing page
-         after successful account creation or in case of SMTP errors.
+         after successful account creation.
      """
     if request.method == "POST":
         form = SignUpForm(request.POST)
@@ -36,17 +34,11 @@ def signup(request):
             user = form.save(commit=False)
             user.is_active = False
             user.save()
-            try:
-                send_email_verification(request, user)
-                messages.add_message(request, level=messages.INFO,
-                                     message="Vous êtes désormais inscrit."
-                                             "Merci d'activer votre compte avec le lien reçu par email, "
-                                             "si vous ne l'avez pas reçu, merci de nous contacter.")
-            except SMTPAuthenticationError:
-                messages.add_message(request, level=messages.INFO,
-                                     message="Une erreur est survenue avec l'envoi de l'email. Merci de nous contacter"
-                                             "via l'onglet contact en précisant votre adresse email et"
-                                             " votre nom de connexion pour que l'on puisse activer votre compte.")
+            send_email_verification(request, user)
+            messages.add_message(request, level=messages.INFO,
+                                 message="Vous êtes désormais inscrit."
+                                         "Merci d'activer votre compte avec le lien reçu par email, "
+                                         "si vous ne l'avez pas reçu, merci de nous contacter.")
             return redirect("landing:index")
     else:
         form = SignUpForm()
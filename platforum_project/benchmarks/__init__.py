@@ -0,0 +1,6 @@
+"""
+    Benchmarks of the hot paths of the forums, see the 'run_benchmarks' command.
+
+    'generators' builds realistic forums through bulk inserts and 'runner' requests their pages with the Django test
+    client, measuring the latency and the number of queries of each page.
+"""
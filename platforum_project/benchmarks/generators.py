@@ -0,0 +1,204 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from account.models import CustomUser
+from forum.models import Forum, Theme, ForumAccount, Category, SubCategory, Topic, Message, Like, Conversation
+from platforum_project.func.text import fold
+
+BATCH_SIZE = 1000
+
+PASSWORD = "benchmark"
+
+WORDS = [
+    "guitare", "riff", "batterie", "basse", "album", "concert", "groupe", "chanson", "solo", "accord", "ampli",
+    "festival", "scène", "pédale", "distorsion", "tournée", "vinyle", "studio", "morceau", "rythme", "mélodie",
+    "chanteur", "batteur", "bassiste", "metal", "rock", "punk", "thrash", "doom", "légende", "répétition", "micro",
+]
+
+
+@contextmanager
+def historical_dates(*models):
+    """
+        Lets 'bulk_create' write the dates given to the objects in the 'auto_now_add' fields of some models, instead of
+        the current date, so that the generated content is spread over time.
+
+        Args:
+            *models: The models whose 'auto_now_add' fields are written as given.
+        """
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, "auto_now_add", False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class GeneratedForum:
+    """
+        A forum built by 'build_forum', with the objects the benchmarks browse.
+
+        Args:
+            forum: The forum.
+            master: The user administrating the forum.
+            member: A member who takes part in many conversations.
+            sub_category: The sub-category with the most topics.
+            deep_topic: The topic with the most messages.
+            counts: The number of objects of each kind in the forum.
+        """
+
+    def __init__(self, forum, master, member, sub_category, deep_topic, counts):
+        self.forum = forum
+        self.master = master
+        self.member = member
+        self.sub_category = sub_category
+        self.deep_topic = deep_topic
+        self.counts = counts
+
+
+def build_forum(name="Benchmark", categories=5, sub_categories=4, topics=25, messages=20, members=200, likes=1,
+                conversations=50, deep_topic=1000, days=365, seed=0):
+    """
+        Builds a realistic forum through bulk inserts, along with the derived data the pages read.
+
+        The content is random but reproducible for a given seed: the topics have between 1 and twice 'messages'
+        messages from random members, spread over the last 'days' days, and one more topic has 'deep_topic' messages
+        to measure deep pages. The stored counters and statistics, the likes counters and the search index are then
+        rebuilt with the management commands, as the bulk inserts skip the 'save' methods and signals.
+
+        Args:
+            name: The name of the forum.
+            categories: The number of categories.
+            sub_categories: The number of sub-categories per category.
+            topics: The number of topics per sub-category.
+            messages: The average number of messages per topic.
+            members: The number of members, besides the forum master.
+            likes: The average number of likes per message.
+            conversations: The number of conversations, half of them involving the benchmarked member.
+            deep_topic: The number of messages of the longest topic.
+            days: The period over which the content is spread.
+            seed: The seed of the random generator.
+
+        Returns:
+            GeneratedForum: The forum and the objects the benchmarks browse.
+        """
+    rng = random.Random(seed)
+    now = timezone.now()
+    start = now - timedelta(days=days)
+
+    def sentence(words):
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    def text():
+        return "".join(f"<p>{sentence(rng.randint(8, 40))}.</p>" for _ in range(rng.randint(1, 3)))
+
+    def dates(first, count):
+        # 'count' increasing dates between 'first' and now
+        return sorted(first + (now - first) * rng.random() for _ in range(count))
+
+    with transaction.atomic(), historical_dates(ForumAccount, Topic, Message):
+        password = make_password(PASSWORD)
+        slug = slugify(name)
+        CustomUser.objects.bulk_create(
+            [CustomUser(username=f"{slug}-{i}", email=f"{slug}-{i}@example.com", first_name="Membre",
+                        last_name=str(i), password=password) for i in range(members + 1)],
+            batch_size=BATCH_SIZE)
+        users = list(CustomUser.objects.filter(username__startswith=f"{slug}-").order_by("pk"))
+        master, member = users[0], users[1]
+
+        theme, _ = Theme.objects.get_or_create(name="Musique")
+        forum = Forum.objects.create(forum_master=master, name=name, theme=theme,
+                                     description=f"Forum de {members} membres généré pour les benchmarks")
+        ForumAccount.objects.bulk_create(
+            [ForumAccount(forum=forum, user=user, username_key=fold(user.username), forum_master=user == master,
+                          joined=start + (now - start) * i / len(users)) for i, user in enumerate(users)],
+            batch_size=BATCH_SIZE)
+        accounts = list(ForumAccount.objects.filter(forum=forum).order_by("pk"))
+        member_account = accounts[1]
+
+        Category.objects.bulk_create([Category(name=f"Catégorie {i}", forum=forum, index=i)
+                                      for i in range(categories)])
+        SubCategory.objects.bulk_create(
+            [SubCategory(name=f"Sous catégorie {i}", slug=slugify(f"Sous catégorie {i}"), category=category, index=i)
+             for category in Category.objects.filter(forum=forum) for i in range(sub_categories)])
+        sub_category_list = list(SubCategory.objects.filter(category__forum=forum).order_by("pk"))
+
+        new_topics = []
+        for sub_category in sub_category_list:
+            for _ in range(topics):
+                title = sentence(rng.randint(2, 6))
+                new_topics.append(Topic(title=title, slug=slugify(title), sub_category=sub_category, forum=forum,
+                                        account=rng.choice(accounts), creation=start + (now - start) * rng.random()))
+        new_topics.append(Topic(title="Le sujet sans fin", slug="le-sujet-sans-fin", sub_category=sub_category_list[0],
+                                forum=forum, account=accounts[0], creation=start))
+        Topic.objects.bulk_create(new_topics, batch_size=BATCH_SIZE)
+        topic_list = list(Topic.objects.filter(forum=forum).order_by("pk"))
+        longest = topic_list[-1]
+
+        new_messages = []
+        for topic in topic_list:
+            count = deep_topic if topic == longest else rng.randint(1, 2 * messages)
+            new_messages.extend(Message(message=text(), account=rng.choice(accounts), topic=topic, forum=forum,
+                                        creation=creation) for creation in dates(topic.creation, count))
+        Message.objects.bulk_create(new_messages, batch_size=BATCH_SIZE)
+
+        message_ids = list(Message.objects.filter(forum=forum).values_list("pk", flat=True))
+        new_likes = []
+        for message_id in message_ids:
+            likers = rng.sample(accounts, min(int(rng.expovariate(1 / likes)) if likes else 0, len(accounts)))
+            new_likes.extend(Like(message_id=message_id, liker=liker) for liker in likers)
+        Like.objects.bulk_create(new_likes, batch_size=BATCH_SIZE)
+
+        owners = [member_account if i % 4 == 0 else rng.choice(accounts) for i in range(conversations)]
+        new_conversations = []
+        for owner in owners:
+            subject = sentence(rng.randint(2, 4))[:50]
+            new_conversations.append(Conversation(account=owner, forum=forum, subject=subject, slug=slugify(subject)))
+        Conversation.objects.bulk_create(new_conversations)
+        conversation_list = list(Conversation.objects.filter(forum=forum).order_by("pk"))
+        new_contacts, new_messages = [], []
+        for i, (conversation, owner) in enumerate(zip(conversation_list, owners)):
+            contacts = {account for account in rng.sample(accounts, 3) if account != owner}
+            if i % 4 == 2 and owner != member_account:
+                contacts.add(member_account)
+            participants = [owner, *contacts]
+            new_contacts.extend(Conversation.contacts.through(conversation=conversation, forumaccount=contact)
+                                for contact in contacts)
+            new_messages.extend(Message(message=text(), account=rng.choice(participants), conversation=conversation,
+                                        personal=True, creation=creation)
+                                for creation in dates(start, rng.randint(1, 15)))
+        Conversation.contacts.through.objects.bulk_create(new_contacts, batch_size=BATCH_SIZE)
+        Message.objects.bulk_create(new_messages, batch_size=BATCH_SIZE)
+
+    for command, args in (("rebuild_message_counters", []), ("rebuild_subcategory_stats", ["--forum", forum.pk]),
+                          ("reconcile_likes", []), ("reindex_forum", [forum.pk])):
+        call_command(command, *args, stdout=StringIO())
+
+    return GeneratedForum(
+        forum=forum,
+        master=master,
+        member=member,
+        sub_category=sub_category_list[0],
+        deep_topic=Topic.objects.select_related("sub_category__category__forum").get(pk=longest.pk),
+        counts={
+            "categories": categories,
+            "sub_categories": len(sub_category_list),
+            "topics": len(topic_list),
+            "messages": len(message_ids),
+            "likes": len(new_likes),
+            "members": len(accounts),
+            "conversations": len(conversation_list),
+            "personal_messages": len(new_messages),
+            "deep_topic_messages": deep_topic,
+        })
+
@@ -0,0 +1,190 @@
+import platform
+import statistics
+import subprocess
+from time import perf_counter
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from forum.models import Message, Topic
+from platforum_project.func.pagination import KeysetPaginator
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentiles(latencies, points=PERCENTILES):
+    """
+        Computes percentiles of a series of latencies.
+
+        Args:
+            latencies: The latencies, in seconds.
+            points: The percentiles to compute, between 1 and 99.
+
+        Returns:
+            dict: The latency of each percentile, in seconds.
+        """
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {point: quantiles[point - 1] for point in points}
+
+
+class Scenario:
+    """
+        A page requested by the benchmarks.
+
+        Args:
+            name: The name of the page in the results.
+            url: The URL of the page.
+            user: The user requesting the page.
+            before: An optional function called before each request, outside of the measure.
+        """
+
+    def __init__(self, name, url, user, before=None):
+        self.name = name
+        self.url = url
+        self.user = user
+        self.before = before
+
+
+def scenarios(generated):
+    """
+        Lists the pages of a generated forum to benchmark: the hot paths of the members and of the forum master.
+
+        The topic page is requested with its rendered messages in the cache, as most of the time, and without them
+        ('topic_uncached', its version being bumped before each request as when a message is posted). The deep page
+        is the middle of the longest topic.
+
+        Args:
+            generated: The forum, see 'build_forum'.
+
+        Returns:
+            list: The scenarios.
+        """
+    forum, sub_category, topic = generated.forum, generated.sub_category, generated.deep_topic
+    forum_args = [forum.slug, forum.pk]
+    messages = Message.objects.filter(topic=topic).order_by("creation", "pk")
+    middle = messages[topic.message_count // 2]
+    deep_cursor = KeysetPaginator(messages, 10).encode_cursor(KeysetPaginator.AFTER, middle)
+    topic_url = topic.get_absolute_url()
+    member, master = generated.member, generated.master
+    return [
+        Scenario("index", reverse("forum:index", args=forum_args), member),
+        Scenario("sub_category", reverse("forum:sub-category", args=[*forum_args, sub_category.pk, sub_category.slug]),
+                 member),
+        Scenario("topic_first_page", topic_url, member),
+        Scenario("topic_deep_page", f"{topic_url}?cursor={deep_cursor}", member),
+        Scenario("topic_uncached", topic_url, member, before=lambda: Topic.bump_version(topic.pk)),
+        Scenario("query", f"{reverse('forum:query', args=forum_args)}?query=guitare", member),
+        Scenario("members_list", reverse("forum:members-list", args=forum_args), member),
+        Scenario("members_search", f"{reverse('forum:members-list', args=forum_args)}?search={member.username[:-1]}",
+                 member),
+        Scenario("personal_messaging", reverse("forum:private-messaging", args=forum_args), member),
+        Scenario("index_admin", reverse("forum:admin-index", args=forum_args), master),
+    ]
+
+
+def measure(client, scenario, repeat, warmup=1):
+    """
+        Requests a page several times and measures each request.
+
+        The first 'warmup' requests fill the caches and are not measured. The number of queries is the one of the
+        last request, they are expected to be the same for every request once the caches are warm.
+
+        Args:
+            client: A test client, logged in as the user of the scenario.
+            scenario: The page to request.
+            repeat: The number of measured requests.
+            warmup: The number of requests made before measuring.
+
+        Returns:
+            dict: The status code, the number of queries and the latencies (mean, percentiles and maximum, in ms).
+        """
+    latencies = []
+    for i in range(warmup + repeat):
+        if scenario.before:
+            scenario.before()
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            response = client.get(scenario.url)
+            elapsed = perf_counter() - start
+        if i >= warmup:
+            latencies.append(elapsed)
+    result = {"url": scenario.url, "status": response.status_code, "queries": len(queries), "requests": repeat,
+              "mean_ms": statistics.fmean(latencies) * 1000}
+    result.update({f"p{point}_ms": latency * 1000 for point, latency in percentiles(latencies).items()})
+    result["max_ms"] = max(latencies) * 1000
+    return result
+
+
+def run(generated, repeat=20, warmup=1, names=None):
+    """
+        Benchmarks the pages of a generated forum with the Django test client.
+
+        Args:
+            generated: The forum, see 'build_forum'.
+            repeat: The number of measured requests per page.
+            warmup: The number of requests made before measuring each page.
+            names: The names of the scenarios to run, all of them by default.
+
+        Returns:
+            dict: The results of each page, by name of scenario.
+        """
+    clients = {}
+    results = {}
+    for scenario in scenarios(generated):
+        if names and scenario.name not in names:
+            continue
+        if scenario.user.pk not in clients:
+            clients[scenario.user.pk] = Client()
+            clients[scenario.user.pk].force_login(scenario.user)
+        results[scenario.name] = measure(clients[scenario.user.pk], scenario, repeat, warmup)
+    return results
+
+
+def environment():
+    """
+        Describes what the results depend on besides the code, to be stored along with them.
+
+        Returns:
+            dict: The commit (if run from a git checkout), the date, the versions of Python and Django and the
+            database engine.
+        """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+def compare(previous, current, metrics=("p50_ms", "p95_ms", "queries")):
+    """
+        Compares the results of two runs, page by page.
+
+        Args:
+            previous: The results of the reference run, as written in the JSON file (with 'results').
+            current: The results of the new run, same format.
+            metrics: The metrics to compare.
+
+        Returns:
+            list: A (page, metric, previous value, current value, relative change) tuple per page and metric, for the
+            pages found in both runs. The change is None when the previous value is 0.
+        """
+    rows = []
+    for name, result in current["results"].items():
+        reference = previous["results"].get(name)
+        if reference is None:
+            continue
+        for metric in metrics:
+            before, after = reference[metric], result[metric]
+            rows.append((name, metric, before, after, (after - before) / before if before else None))
+    return rows
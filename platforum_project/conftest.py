@@ -1,5 +1,13 @@
+from contextlib import contextmanager
+
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from account.models import CustomUser
+from forum.models import Badge
+from forum.models.forum import account_cache
+from platforum_project.func.fragments import fragment_cache
 
 
 @pytest.fixture()
@@ -24,3 +32,75 @@ def user_3(db):
 def superuser_1(db):
     return CustomUser.objects.create_superuser(username="ely", email="e@e.com", first_name="Trouvé", last_name="Ely",
                                                password="12345678")
+
+
+@pytest.fixture(autouse=True)
+def clear_badge_cache():
+    # The badge map is cached per process, but each test has its own badges
+    Badge.clear_cache()
+
+
+@pytest.fixture(autouse=True)
+def clear_account_cache():
+    # Primary keys are reused from one test to the other, the cached accounts must not be
+    account_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_fragment_cache():
+    # Same for the cached pages of topics
+    fragment_cache().clear()
+
+
+def clear_caches():
+    Badge.clear_cache()
+    account_cache().clear()
+    fragment_cache().clear()
+
+
+def format_queries(queries):
+    return "\n".join(f"{i}. {query['sql']}" for i, query in enumerate(queries.captured_queries, start=1))
+
+
+@pytest.fixture
+def query_budget():
+    """
+        Returns a context manager failing the test when the code it wraps issues more SQL queries than a budget, with
+        the queries in the failure message.
+        """
+    @contextmanager
+    def budget(maximum, label="The block"):
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        if len(queries) > maximum:
+            pytest.fail(f"{label} issued {len(queries)} queries, over its budget of {maximum}:\n"
+                        f"{format_queries(queries)}")
+
+    return budget
+
+
+@pytest.fixture
+def assert_constant_queries():
+    """
+        Returns a function failing the test when the number of queries of a request grows with the number of rows it
+        displays, i.e. when some rows are loaded one query per row (N+1 queries).
+
+        The request is measured, then measured again after 'add_rows' added rows to what it displays. It is made once
+        before each measure, so that one-off side effects (such as marking messages as read) are not counted, and the
+        caches are cleared just before, so that the cached parts of the page are rendered, and counted, each time.
+        """
+    def check(make_request, add_rows, label="The page"):
+        make_request()
+        clear_caches()
+        with CaptureQueriesContext(connection) as few:
+            make_request()
+        add_rows()
+        make_request()
+        clear_caches()
+        with CaptureQueriesContext(connection) as many:
+            make_request()
+        if len(many) != len(few):
+            pytest.fail(f"{label} issued {len(few)} queries before adding rows and {len(many)} after:\n"
+                        f"{format_queries(many)}")
+
+    return check
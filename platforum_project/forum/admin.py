@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import Forum, ForumAccount, Category, Topic, Message, Conversation, SubCategory, Notification, Badge, Like, \
-    Theme
+    Theme, SubCategoryStats, ForumDailyStats, DeletionJob
 
 admin.site.register(Forum)
 admin.site.register(ForumAccount)
@@ -13,3 +13,6 @@ admin.site.register(Notification)
 admin.site.register(Badge)
 admin.site.register(Like)
 admin.site.register(Theme)
+admin.site.register(SubCategoryStats)
+admin.site.register(ForumDailyStats)
+admin.site.register(DeletionJob)
@@ -2,9 +2,10 @@ from django import forms
 
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django_recaptcha.fields import ReCaptchaField
 
-from forum.models import Forum, Topic, Message, ForumAccount, Category, SubCategory, Conversation
+from forum.models import Forum, Topic, Message, ForumAccount, Category, SubCategory, Conversation, SubCategoryStats
 
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column
@@ -130,7 +131,15 @@ class SubCategoryForm(forms.ModelForm):
     def __init__(self, forum, *args, **kwargs):
         # Extrait l'argument 'forum' de kwargs s'il est présent, sinon None
         super().__init__(*args, **kwargs)
-        self.fields['category'].queryset = Category.objects.filter(forum=forum)
+        self.fields['category'].queryset = Category.objects.for_forum(forum)
+
+    def save(self, commit=True):
+        if not commit or "category" not in self.changed_data:
+            return super().save(commit)
+        with transaction.atomic():
+            sub_category = super().save()
+            Topic.sync_forum(Topic.objects.filter(sub_category=sub_category).values("pk"))
+        return sub_category
 
 
 class NewSubCategoryForm(forms.ModelForm):
@@ -164,4 +173,13 @@ class TopicUpdateForm(forms.ModelForm):
 
     def __init__(self, forum, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields["sub_category"].queryset = SubCategory.objects.filter(category__forum=forum)
+        self.fields["sub_category"].queryset = SubCategory.objects.for_forum(forum)
+
+    def save(self, commit=True):
+        if not commit or "sub_category" not in self.changed_data:
+            return super().save(commit)
+        with transaction.atomic():
+            topic = super().save()
+            SubCategoryStats.topic_moved(topic, self.initial["sub_category"])
+            Topic.sync_forum([topic.pk])
+        return topic
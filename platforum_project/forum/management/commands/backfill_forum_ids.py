@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from forum.models import SubCategory, Topic, Message
+
+
+class Command(BaseCommand):
+    help = "Fills the forum copied on the topics and on the messages of the topics, by ranges of primary keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        topics = self.backfill(Topic.objects.all(), Subquery(
+            SubCategory.objects.filter(pk=OuterRef("sub_category")).values("category__forum")[:1]), chunk_size)
+        # After the topics, the messages copy their forum
+        messages = self.backfill(Message.objects.filter(topic__isnull=False), Subquery(
+            Topic.objects.filter(pk=OuterRef("topic")).values("forum")[:1]), chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"{topics} topics and {messages} messages updated."))
+
+    @staticmethod
+    def backfill(queryset, forum, chunk_size):
+        # One short transaction per range of primary keys, so that the tables are never locked for long
+        last = queryset.aggregate(last=Max("pk"))["last"] or 0
+        updated = 0
+        for start in range(0, last, chunk_size):
+            with transaction.atomic():
+                updated += queryset.filter(pk__gt=start, pk__lte=start + chunk_size).update(forum=forum)
+        return updated
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from forum.models import Forum, ForumAccount, Badge
+from platforum_project.func.images import has_variants, make_variants
+
+
+class Command(BaseCommand):
+    help = ("Generates the resized WebP variants of the logos of the forums, avatars of the members and images of the "
+            "badges uploaded before they existed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerates the existing variants too.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        generated = skipped = failed = 0
+        for model in (Forum, ForumAccount, Badge):
+            objects = model.objects.exclude(thumbnail="").exclude(thumbnail__isnull=True).only("pk", "thumbnail")
+            for obj in objects.order_by("pk").iterator(chunk_size=options["chunk_size"]):
+                if not options["force"] and has_variants(obj.thumbnail):
+                    skipped += 1
+                    continue
+                try:
+                    make_variants(obj.thumbnail)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {obj.pk} ({obj.thumbnail.name}): {error}")
+                else:
+                    generated += 1
+        self.stdout.write(self.style.SUCCESS(f"{generated} images processed, {skipped} already done, {failed} failed."))
@@ -0,0 +1,28 @@
+from itertools import batched
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum.models import ForumAccount
+from platforum_project.func.text import fold
+
+
+class Command(BaseCommand):
+    help = "Fills the folded username of the forum accounts, used to sort and search the members lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        accounts = ForumAccount.objects.select_related("user").only("pk", "username_key", "user__username").order_by(
+            "pk")
+        updated = 0
+        for chunk in batched(accounts.iterator(chunk_size=chunk_size), chunk_size):
+            stale = [account for account in chunk if account.username_key != fold(account.user.username)]
+            for account in stale:
+                account.username_key = fold(account.user.username)
+            with transaction.atomic():
+                ForumAccount.objects.bulk_update(stale, ["username_key"])
+            updated += len(stale)
+        self.stdout.write(self.style.SUCCESS(f"{updated} accounts updated."))
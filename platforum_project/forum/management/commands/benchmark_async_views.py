@@ -0,0 +1,101 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, AsyncClient, override_settings
+from django.urls import reverse
+
+from account.models import CustomUser
+from benchmarks.runner import percentiles
+from forum.models import Forum, SubCategory, Topic
+
+
+class Command(BaseCommand):
+    help = ("Compares the throughput of the read-heavy forum pages served by the synchronous views through the WSGI "
+            "handler and by the async views through the ASGI handler, under concurrent clients.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("forum", type=int, help="The pk of the forum.")
+        parser.add_argument("username", help="The member browsing the forum.")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            forum = Forum.objects.get(pk=options["forum"])
+            user = CustomUser.objects.get(username=options["username"])
+        except (Forum.DoesNotExist, CustomUser.DoesNotExist) as error:
+            raise CommandError(error)
+        urls = self.forum_urls(forum)
+        # One share of the requests per client
+        shares = [len(range(i, options["requests"], options["concurrency"])) for i in range(options["concurrency"])]
+
+        for label, urlconf, run in (("WSGI, sync views", "platforum_project.urls", self.run_wsgi),
+                                    ("ASGI, async views", "platforum_project.urls_async", self.run_asgi)):
+            with override_settings(ROOT_URLCONF=urlconf, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                results, elapsed = run(user, urls, shares)
+            latencies = sorted(latency for latency, _ in results)
+            errors = sum(1 for _, status in results if status != 200)
+            points = percentiles(latencies, (50, 95))
+            self.stdout.write(f"{label}: {len(results) / elapsed:.1f} requests/s, p50 {points[50] * 1000:.1f} ms, "
+                              f"p95 {points[95] * 1000:.1f} ms, {errors} errors")
+
+    @staticmethod
+    def forum_urls(forum):
+        urls = [reverse("forum:index", args=[forum.slug, forum.pk]),
+                reverse("forum:members-list", args=[forum.slug, forum.pk])]
+        sub_category = SubCategory.objects.filter(category__forum=forum).first()
+        if sub_category:
+            urls.append(reverse("forum:sub-category", args=[forum.slug, forum.pk, sub_category.pk, sub_category.slug]))
+        topic = Topic.objects.filter(forum=forum).order_by("-last_activity").first()
+        if topic:
+            urls.append(topic.get_absolute_url())
+            urls.append(f"{reverse('forum:query', args=[forum.slug, forum.pk])}?query={topic.title.split()[0]}")
+        return urls
+
+    @staticmethod
+    def run_wsgi(user, urls, shares):
+        # The clients log in one after the other, only the browsing is measured concurrently
+        clients = []
+        for _ in shares:
+            clients.append(Client())
+            clients[-1].force_login(user)
+
+        def browse(client, count):
+            results = []
+            for i in range(count):
+                start = perf_counter()
+                response = client.get(urls[i % len(urls)])
+                results.append((perf_counter() - start, response.status_code))
+            connections.close_all()
+            return results
+
+        start = perf_counter()
+        with ThreadPoolExecutor(len(shares)) as pool:
+            results = [result for results in pool.map(browse, clients, shares) for result in results]
+        return results, perf_counter() - start
+
+    @staticmethod
+    def run_asgi(user, urls, shares):
+        # Same, with the clients sharing the event loop
+        async def browse(client, count):
+            results = []
+            for i in range(count):
+                start = perf_counter()
+                response = await client.get(urls[i % len(urls)])
+                results.append((perf_counter() - start, response.status_code))
+            return results
+
+        async def run():
+            clients = []
+            for _ in shares:
+                clients.append(AsyncClient())
+                await clients[-1].aforce_login(user)
+            start = perf_counter()
+            results = await asyncio.gather(*map(browse, clients, shares))
+            return [result for client_results in results for result in client_results], perf_counter() - start
+
+        return asyncio.run(run())
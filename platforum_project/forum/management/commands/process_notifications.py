@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum.models import Message, Notification, NotificationEvent
+
+
+class Command(BaseCommand):
+    help = "Delivers the notifications of the new messages, in batches, coalescing them per topic and conversation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        delivered = 0
+        while events := list(NotificationEvent.objects.order_by("pk")[:options["batch_size"]]):
+            with transaction.atomic():
+                messages = (Message.objects
+                            .filter(pk__in=[event.message_id for event in events])
+                            .select_related("account__user", "topic", "conversation")
+                            .order_by("creation", "pk"))
+                Notification.notify_messages(list(messages))
+                NotificationEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+            delivered += len(events)
+        self.stdout.write(self.style.SUCCESS(f"{delivered} messages notified."))
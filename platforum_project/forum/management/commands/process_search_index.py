@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum.models import Message, Topic, SearchIndexTask
+from platforum_project.func.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Applies the pending message and topic changes to the search engine, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        processed = 0
+        while tasks := list(SearchIndexTask.objects.order_by("pk")[:options["batch_size"]]):
+            with transaction.atomic():
+                for document, model, index, remove in (
+                        (SearchIndexTask.MESSAGE, Message, backend.index_messages, backend.remove_messages),
+                        (SearchIndexTask.TOPIC, Topic, backend.index_topics, backend.remove_topics)):
+                    ids = {task.object_id for task in tasks if task.document == document}
+                    # The current state of the documents is what matters, whatever the number of changes
+                    existing = model.objects.in_bulk(ids)
+                    index(existing.values())
+                    remove(ids - existing.keys())
+                SearchIndexTask.objects.filter(pk__in=[task.pk for task in tasks]).delete()
+            processed += len(tasks)
+        self.stdout.write(self.style.SUCCESS(f"{processed} changes indexed."))
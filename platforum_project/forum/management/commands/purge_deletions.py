@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from forum.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = ("Purges the content of the deleted categories, sub-categories and topics, one batch of messages or topics "
+            "per transaction.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        jobs = list(DeletionJob.objects.filter(finished__isnull=True).order_by("pk"))
+        for job in jobs:
+            while job.purge_batch(options["batch_size"]):
+                self.stdout.write(f"{job}: {job.deleted}/{job.total} ({job.progress} %)")
+            self.stdout.write(f"{job}: done")
+        self.stdout.write(self.style.SUCCESS(f"{len(jobs)} deletions completed."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Case, Exists, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from forum.models import Topic, Conversation, Message
+from platforum_project.func.queries import related_count
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored message counters and last posts of topics, and the message counters of conversations."
+
+    def handle(self, *args, **options):
+        last = Message.objects.filter(topic=OuterRef("pk")).order_by("-creation", "-pk")
+        topics = Topic.objects.update(
+            message_count=related_count(Message.objects.all(), "topic"),
+            last_post=Subquery(last.values("pk")[:1]),
+            last_poster_name=Case(
+                When(Exists(last), then=Coalesce(Subquery(last.values("account__user__username")[:1]),
+                                                 Value("Utilisateur banni"))),
+                default=Value("")),
+            last_activity=Coalesce(Subquery(last.values("creation")[:1]), F("creation")),
+        )
+        conversations = Conversation.objects.update(message_count=related_count(Message.objects.all(),
+                                                                                "conversation"))
+        self.stdout.write(self.style.SUCCESS(f"{topics} topics and {conversations} conversations rebuilt."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum.models import SubCategory, SubCategoryStats
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored statistics (topics, messages, last activity) of every sub-category from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--forum", type=int, help="Only rebuild the sub-categories of the forum with this pk.")
+
+    def handle(self, *args, **options):
+        sub_categories = SubCategory.objects.with_activity()
+        if options["forum"]:
+            sub_categories = sub_categories.filter(category__forum_id=options["forum"])
+
+        rebuilt = 0
+        with transaction.atomic():
+            for sub_category in sub_categories:
+                SubCategoryStats.objects.update_or_create(sub_category=sub_category, defaults={
+                    "topic_count": sub_category.topics_count,
+                    "message_count": sub_category.messages_count,
+                    "last_topic_id": sub_category.last_topic_id,
+                    "last_poster_id": sub_category.last_poster_id,
+                    "last_activity": sub_category.last_activity,
+                })
+                rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"{rebuilt} sub-categories rebuilt."))
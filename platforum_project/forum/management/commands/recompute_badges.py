@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.models import Forum, ForumAccount, Message, Badge
+from platforum_project.func.queries import related_count
+
+
+class Command(BaseCommand):
+    help = "Recomputes the badges of every member of a forum, in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("forum", type=int, help="The pk of the forum.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            forum = Forum.objects.get(pk=options["forum"])
+        except Forum.DoesNotExist:
+            raise CommandError(f"Forum {options['forum']} does not exist.")
+        badges = Badge.by_description()
+        through = ForumAccount.badges.through
+
+        owned = set(through.objects.filter(forumaccount__forum=forum).values_list("forumaccount_id", "badge_id"))
+        owners = {account_id for account_id, _ in owned}
+        accounts = ForumAccount.objects.filter(forum=forum).annotate(
+            message_total=related_count(Message.objects.all(), "account"))
+
+        rows, awarded = [], 0
+        for account in accounts.iterator(chunk_size=options["batch_size"]):
+            earned = account.earned_badges(account.message_total, account.likes_received,
+                                           has_badges=account.pk in owners)
+            rows += [through(forumaccount_id=account.pk, badge_id=badges[description].pk)
+                     for description in earned
+                     if description in badges and (account.pk, badges[description].pk) not in owned]
+            if len(rows) >= options["batch_size"]:
+                awarded += len(through.objects.bulk_create(rows, ignore_conflicts=True))
+                rows = []
+        awarded += len(through.objects.bulk_create(rows, ignore_conflicts=True))
+        self.stdout.write(self.style.SUCCESS(f"{awarded} badges awarded in {forum.name}."))
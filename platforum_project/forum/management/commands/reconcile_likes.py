@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+
+from forum.models import ForumAccount, Message, Like, account_cache
+from platforum_project.func.queries import related_count
+
+
+class Command(BaseCommand):
+    help = "Removes duplicate likes and rebuilds the stored like counters of messages and accounts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        kept = Like.objects.values("message", "liker").annotate(first=Min("pk")).values("first")
+        # Loaded first: MySQL refuses a delete filtered by a subquery on the same table
+        duplicate_ids = list(Like.objects.exclude(pk__in=kept).values_list("pk", flat=True))
+        for start in range(0, len(duplicate_ids), batch_size):
+            Like.objects.filter(pk__in=duplicate_ids[start:start + batch_size]).delete()
+        with transaction.atomic():
+            messages = Message.objects.exclude(like_count=related_count(Like.objects.all(), "message")).update(
+                like_count=related_count(Like.objects.all(), "message"))
+            drifted = list(ForumAccount.objects
+                           .exclude(likes_received=related_count(Like.objects.all(), "message__account"))
+                           .values_list("pk", "user_id", "forum_id"))
+            accounts = ForumAccount.objects.filter(pk__in=[pk for pk, _, _ in drifted]).update(
+                likes_received=related_count(Like.objects.all(), "message__account"))
+        # The cached accounts still hold their former counter
+        account_cache().delete_many([ForumAccount.cache_key(user_id, forum_id) for _, user_id, forum_id in drifted])
+        self.stdout.write(self.style.SUCCESS(f"{len(duplicate_ids)} duplicate likes removed, {messages} messages and "
+                                             f"{accounts} accounts repaired."))
@@ -0,0 +1,39 @@
+from itertools import batched
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from forum.models import Forum, Message, Topic
+from platforum_project.func.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search index of a forum, streaming its topics and messages by chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("forum", type=int, help="The pk of the forum.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            forum = Forum.objects.get(pk=options["forum"])
+        except Forum.DoesNotExist:
+            raise CommandError(f"Forum {options['forum']} does not exist.")
+        backend = get_search_backend()
+        chunk_size = options["chunk_size"]
+        backend.clear_forum(forum)
+
+        topics = Topic.objects.filter(forum=forum).only("pk", "title").order_by("pk")
+        for chunk in batched(topics.iterator(chunk_size=chunk_size), chunk_size):
+            with transaction.atomic():
+                backend.index_topics(chunk)
+
+        messages = Message.objects.filter(forum=forum).only(
+            "pk", "message", "topic_id", "personal").order_by("pk")
+        indexed = 0
+        for chunk in batched(messages.iterator(chunk_size=chunk_size), chunk_size):
+            with transaction.atomic():
+                backend.index_messages(chunk)
+            indexed += len(chunk)
+            self.stdout.write(f"{indexed} messages indexed...")
+        self.stdout.write(self.style.SUCCESS(f"{forum.name} reindexed: {indexed} messages."))
@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from forum.models import Forum, ForumDailyStats
+
+
+class Command(BaseCommand):
+    help = ("Rolls up the daily activity of the forums (new members, topics, messages, likes and active posters) "
+            "since the last day rolled up, or since their creation the first time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--forum", type=int, help="Only roll up the forum with this pk.")
+        parser.add_argument("--since", type=date.fromisoformat,
+                            help="Recompute from this day (YYYY-MM-DD) instead of the last day rolled up.")
+
+    def handle(self, *args, **options):
+        forums = Forum.objects.annotate(last_day=Max("forumdailystats__day")).order_by("pk")
+        if options["forum"]:
+            forums = forums.filter(pk=options["forum"])
+            if not forums:
+                raise CommandError(f"Forum {options['forum']} does not exist.")
+
+        days = 0
+        for forum in forums:
+            # The last day rolled up may have been incomplete, it is recomputed
+            since = options["since"] or forum.last_day or forum.creation
+            days += ForumDailyStats.rollup(forum, since)
+        self.stdout.write(self.style.SUCCESS(f"{days} days rolled up."))
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (override_settings, setup_databases, setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+
+from benchmarks.generators import build_forum
+from benchmarks.runner import run, environment, compare
+
+
+class DisableMigrations:
+    # Creates the tables straight from the models, as 'pytest --nomigrations' does
+    def __contains__(self, item):
+        return True
+
+    def __getitem__(self, item):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Builds a realistic forum in a throwaway test database and benchmarks its hot paths with the test client: "
+            "latency percentiles and number of queries per page, optionally written to / compared with a JSON file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=5)
+        parser.add_argument("--sub-categories", type=int, default=4, help="Per category.")
+        parser.add_argument("--topics", type=int, default=25, help="Per sub-category.")
+        parser.add_argument("--messages", type=int, default=20, help="Average per topic.")
+        parser.add_argument("--members", type=int, default=200)
+        parser.add_argument("--likes", type=float, default=1, help="Average per message.")
+        parser.add_argument("--conversations", type=int, default=50)
+        parser.add_argument("--deep-topic", type=int, default=1000, help="Messages of the longest topic.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=20, help="Measured requests per page.")
+        parser.add_argument("--page", action="append", dest="pages", help="Only benchmark this page (repeatable).")
+        parser.add_argument("--output", help="Writes the results to this JSON file.")
+        parser.add_argument("--compare", help="Compares the results with those of a previous run (JSON file).")
+
+    def handle(self, *args, **options):
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as file:
+                    previous = json.load(file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read {options['compare']}: {error}")
+
+        setup_test_environment()
+        try:
+            with override_settings(MIGRATION_MODULES=DisableMigrations()):
+                old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                report = self.benchmark(options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+        finally:
+            teardown_test_environment()
+
+        for name, result in report["results"].items():
+            self.stdout.write(f"{name}: {result['status']}, {result['queries']} queries, "
+                              f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+                              f"p99 {result['p99_ms']:.1f} ms")
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+        if previous:
+            self.write_comparison(previous, report)
+
+    def benchmark(self, options):
+        self.stdout.write("Building the forum...")
+        dataset = {key: options[key] for key in ("categories", "sub_categories", "topics", "messages", "members",
+                                                 "likes", "conversations", "deep_topic", "seed")}
+        generated = build_forum(**dataset)
+        self.stdout.write(", ".join(f"{count} {name}" for name, count in generated.counts.items()))
+        results = run(generated, repeat=options["repeat"], names=options["pages"])
+        return {"environment": environment(), "dataset": dataset, "counts": generated.counts, "results": results}
+
+    def write_comparison(self, previous, report):
+        if previous.get("dataset") != report["dataset"]:
+            self.stdout.write(self.style.WARNING("The forums of both runs differ, the results are not comparable."))
+        self.stdout.write(f"Compared with {previous['environment'].get('commit') or 'the previous run'}:")
+        for name, metric, before, after, change in compare(previous, report):
+            change = f"{change:+.1%}" if change is not None else "n/a"
+            digits = 0 if metric == "queries" else 1
+            line = f"  {name} {metric}: {before:.{digits}f} -> {after:.{digits}f} ({change})"
+            if metric == "queries" and after > before:
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
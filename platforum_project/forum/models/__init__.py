@@ -1,3 +1,6 @@
 from .forum import *
 from .content import *
 from .interactions import *
+from .statistics import *
+from .search import *
+from .deletion import *
@@ -1,16 +1,48 @@
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Max, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
 
 from forum.default_data.messages import welcome_message
-from .interactions import Like
+from .statistics import SubCategoryStats
+
+
+class CategoryQuerySet(models.QuerySet):
+    def for_forum(self, forum):
+        return self.filter(forum=forum, hidden=False).select_related("forum")
+
+    def tree_for(self, forum, sub_categories=None):
+        """
+            Loads the whole category -> sub-category tree of a forum in two queries.
+
+            The categories are fetched in one query and their sub-categories are prefetched in a second one, so
+            'category.subcategories.all' (and 'get_sub_categories') no longer hits the database per category.
+
+            Args:
+                forum: The forum whose tree is loaded.
+                sub_categories: An optional SubCategory queryset used for the prefetch, e.g.
+                    'SubCategory.objects.with_stats()' to also load the stored statistics.
+
+            Returns:
+                QuerySet: The categories of the forum, with their sub-categories prefetched.
+            """
+        if sub_categories is None:
+            sub_categories = SubCategory.objects.all()
+        return self.for_forum(forum).prefetch_related(Prefetch("subcategories",
+                                                               queryset=sub_categories.filter(hidden=False)))
 
 
 class Category(models.Model):
     name = models.CharField(max_length=50, verbose_name="Nom")
     forum = models.ForeignKey(to="Forum", on_delete=models.CASCADE, verbose_name="Forum")
     index = models.IntegerField(default=0)
+    # Set when its deletion is requested, until its content is purged (see DeletionJob)
+    hidden = models.BooleanField(default=False, verbose_name="Masquée")
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Catégorie"
@@ -25,7 +57,39 @@ class Category(models.Model):
 
     @property
     def get_sub_categories(self):
-        return SubCategory.objects.filter(category=self)
+        return self.subcategories.all()
+
+
+class SubCategoryQuerySet(models.QuerySet):
+    def for_forum(self, forum):
+        return self.filter(category__forum=forum, hidden=False).select_related("category__forum")
+
+    def with_stats(self):
+        return self.select_related("stats__last_topic", "stats__last_poster__user")
+
+    def with_activity(self):
+        """
+            Annotates each sub-category with its activity, computed live from the topics and messages.
+
+            Adds 'topics_count', 'messages_count', 'last_activity' (date of the most recent message) and
+            'last_topic_id' / 'last_topic_title' / 'last_poster_id' (topic and author of the most recent message).
+            The stored statistics are cheaper to read, this is what they are rebuilt from: the hidden topics, whose
+            deletion is pending, are left out as they are from the statistics (see SubCategoryStats.topic_deleted).
+
+            Returns:
+                QuerySet: The annotated sub-categories.
+            """
+        last_message = Message.objects.filter(topic__sub_category=OuterRef("pk"), topic__hidden=False,
+                                              personal=False).order_by("-creation", "-pk")
+        visible = Q(topic__hidden=False)
+        return self.annotate(
+            topics_count=Count("topic", filter=visible, distinct=True),
+            messages_count=Count("topic__message", filter=visible, distinct=True),
+            last_activity=Max("topic__message__creation", filter=visible),
+            last_topic_id=Subquery(last_message.values("topic_id")[:1]),
+            last_topic_title=Subquery(last_message.values("topic__title")[:1]),
+            last_poster_id=Subquery(last_message.values("account_id")[:1]),
+        )
 
 
 class SubCategory(models.Model):
@@ -34,6 +98,10 @@ class SubCategory(models.Model):
     category = models.ForeignKey(to=Category, on_delete=models.CASCADE, verbose_name="Catégorie",
                                  related_name="subcategories")
     index = models.IntegerField(default=0)
+    # Set when its deletion, or the one of its category, is requested (see DeletionJob)
+    hidden = models.BooleanField(default=False, verbose_name="Masquée")
+
+    objects = SubCategoryQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name} - {self.category}"
@@ -42,15 +110,25 @@ class SubCategory(models.Model):
     def create_test_subcategory(cls, category):
         return cls.objects.create(name="Sous catégorie Test", category=category)
 
+    @property
+    def number_of_topics(self):
+        try:
+            return self.stats.topic_count
+        except ObjectDoesNotExist:
+            return Topic.objects.filter(sub_category=self).count()
+
     @property
     def number_of_messages(self):
-        return Message.objects.filter(topic__sub_category=self).count()
+        try:
+            return self.stats.message_count
+        except ObjectDoesNotExist:
+            return Message.objects.filter(topic__sub_category=self).count()
 
     @property
     def last_topic_commented(self):
         try:
-            return Message.objects.filter(topic__sub_category=self).last().topic.title
-        except AttributeError:
+            return self.stats.last_topic.title
+        except (AttributeError, ObjectDoesNotExist):
             return "Pas encore de sujet, lance toi ! :)"
 
     class Meta:
@@ -60,24 +138,48 @@ class SubCategory(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                SubCategoryStats.objects.create(sub_category=self)
 
 
 class Topic(models.Model):
+    # Kept up to date by the messages, the version bumps and the deletions, not by saving the topic (see 'save')
+    MAINTAINED_FIELDS = ("message_count", "last_post", "last_poster_name", "last_activity", "hidden", "version")
+
     title = models.CharField(max_length=100, verbose_name="Titre")
     slug = models.SlugField(blank=True)
     # Système d'alerte si sub_category est null
     sub_category = models.ForeignKey(to=SubCategory, on_delete=models.CASCADE)
+    # Forum of the sub-category, copied to filter the topics of a forum without joining up to it (see 'sync_forum')
+    forum = models.ForeignKey(to="Forum", on_delete=models.CASCADE, null=True, blank=True, editable=False,
+                              related_name="+", verbose_name="Forum")
     # Si le modérateur souhaite clôturer le sujet sans le supprimer
     closed = models.BooleanField(default=False, verbose_name="Clôturé")
+    # Set when its deletion, or the one of its sub-category, is requested (see DeletionJob)
+    hidden = models.BooleanField(default=False, verbose_name="Masqué")
     account = models.ForeignKey(to="ForumAccount", verbose_name="Auteur", on_delete=models.SET_NULL, null=True)
     creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de publication")
     pin = models.BooleanField(default=False, verbose_name="Epinglé")
-    last_activity = models.DateTimeField(auto_now=True, verbose_name="Activité récente")
+    last_activity = models.DateTimeField(default=timezone.now, verbose_name="Activité récente")
+    message_count = models.IntegerField(default=0, verbose_name="Nombre de messages")
+    last_post = models.ForeignKey(to="Message", on_delete=models.SET_NULL, null=True, blank=True, related_name="+",
+                                  verbose_name="Dernier message")
+    last_poster_name = models.CharField(max_length=150, blank=True, verbose_name="Auteur du dernier message")
+    # Bumped on every change of what the topic page displays, it keys the cached pages (see func/fragments.py)
+    version = models.PositiveIntegerField(default=0, verbose_name="Version")
 
     class Meta:
         verbose_name = "Sujet"
         ordering = ['-last_activity']
+        indexes = [
+            # Topics of a sub-category, pinned first then by activity, see sub_category_view
+            models.Index(fields=["sub_category", "-pin", "-last_activity"], name="topic_subcat_pin_activity_idx"),
+            # Topics of a forum, most recently active first
+            models.Index(fields=["forum", "-last_activity"], name="topic_forum_activity_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.account.user.username} - {self.sub_category.category.forum}"
@@ -98,11 +200,50 @@ class Topic(models.Model):
 
     @property
     def number_of_messages(self):
-        return Message.objects.filter(topic=self).count()
+        return self.message_count
 
     @property
     def last_message(self):
-        return Message.objects.filter(topic=self).last().account.user.username
+        return self.last_poster_name
+
+    @classmethod
+    def refresh_last_post(cls, topic_id):
+        """
+            Recomputes the "last post" columns of a topic from its most recent message.
+
+            Only needed when the most recent message may have disappeared, posting a message updates these columns
+            directly.
+
+            Args:
+                topic_id: The primary key of the topic to refresh.
+            """
+        last = (Message.objects
+                .filter(topic_id=topic_id)
+                .select_related("account__user")
+                .order_by("-creation", "-pk")
+                .first())
+        cls.objects.filter(pk=topic_id).update(
+            last_post=last,
+            last_poster_name=last.author if last else "",
+            last_activity=last.creation if last else F("creation"))
+
+    @classmethod
+    def sync_forum(cls, topics):
+        """
+            Copies the forum of their sub-category on topics and on their messages, after the topics or their
+            sub-category were moved.
+
+            Args:
+                topics: The topics, a queryset or primary keys.
+            """
+        cls.objects.filter(pk__in=topics).update(forum=Subquery(
+            SubCategory.objects.filter(pk=OuterRef("sub_category")).values("category__forum")[:1]))
+        Message.objects.filter(topic__in=topics).update(forum=Subquery(
+            cls.objects.filter(pk=OuterRef("topic")).values("forum")[:1]))
+
+    @classmethod
+    def bump_version(cls, topic_id):
+        cls.objects.filter(pk=topic_id).update(version=F("version") + 1)
 
     @classmethod
     def create_topic_test(cls, sub_category, account):
@@ -111,7 +252,29 @@ class Topic(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            adding = self._state.adding
+            if adding and not self.forum_id:
+                self.forum_id = SubCategory.objects.filter(pk=self.sub_category_id).values_list(
+                    "category__forum", flat=True).first()
+            if not adding and kwargs.get("update_fields") is None:
+                # These columns are only changed by updates of their own: they are never written back from a possibly
+                # outdated instance, e.g. the one of a moderator editing the topic while members post in it
+                kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                           if not field.primary_key and field.name not in self.MAINTAINED_FIELDS]
+            super().save(*args, **kwargs)
+            if adding:
+                SubCategoryStats.topic_created(self)
+            else:
+                Topic.bump_version(self.pk)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            message_count = Message.objects.filter(topic=self).count()
+            sub_category_id = self.sub_category_id
+            deleted = super().delete(*args, **kwargs)
+            SubCategoryStats.topic_deleted(sub_category_id, message_count)
+        return deleted
 
     def get_absolute_url(self):
         sub_category = self.sub_category
@@ -126,20 +289,40 @@ class Topic(models.Model):
         })
 
 
+class MessageQuerySet(models.QuerySet):
+    def for_display(self):
+        """
+            Loads what the topic and conversation pages render for each message along with the messages.
+
+            The authors come with their user and forum through joins, and the number of likes is stored on each message
+            ('like_count'), so that a page renders in a fixed number of queries whatever its size.
+
+            Returns:
+                QuerySet: The messages, ready to be rendered.
+            """
+        return self.select_related("account__user", "account__forum")
+
+
 class Message(models.Model):
     message = models.TextField(verbose_name="Message")
     account = models.ForeignKey(to="ForumAccount", verbose_name="Auteur", on_delete=models.SET_NULL, null=True)
     topic = models.ForeignKey(to=Topic, verbose_name="Sujet", on_delete=models.CASCADE, null=True, blank=True)
+    # Forum of the topic, copied to filter the messages of a forum without joining up to it, None for personal messages
+    forum = models.ForeignKey(to="Forum", on_delete=models.CASCADE, null=True, blank=True, editable=False,
+                              related_name="+", verbose_name="Forum")
     conversation = models.ForeignKey(to="Conversation", on_delete=models.CASCADE,
                                      verbose_name="Messagerie Personnel", null=True, blank=True)
     personal = models.BooleanField(verbose_name="Personnel", default=False)
     creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de publication")
     update = models.DateTimeField(auto_now=True, verbose_name="Modifié le", null=True)
     update_counter = models.IntegerField(default=0, verbose_name="Nombre de maj")
+    like_count = models.IntegerField(default=0, verbose_name="Nombre de j'aime")
+
+    objects = MessageQuerySet.as_manager()
 
     @property
     def like_counter(self):
-        return Like.objects.filter(message=self).count()
+        return self.like_count
 
     @property
     def author(self):
@@ -157,9 +340,8 @@ class Message(models.Model):
             Overrides the save method to update message counters and topic activity.
 
             This method first checks if the Message object already exists in the database. If it does, it increments the
-            message's update counter. If the message is new and is not marked as personal, it updates the 'last_activity'
-            field of the associated topic to the current time. Finally, it calls the superclass's save method to handle
-            the actual saving of the Message object.
+            message's update counter. It then calls the superclass's save method to handle the actual saving of the
+            Message object. If the message is new and is not marked as personal, it becomes the last post of its topic.
 
             Args:
                 *args: Variable length argument list.
@@ -167,19 +349,101 @@ class Message(models.Model):
 
             Side effects:
                 - Increments the update counter of an existing message.
-                - Updates the 'last_activity' field of the associated topic for new, non-personal messages.
+                - Copies the forum of the topic on new, non-personal messages.
+                - Updates the last post columns ('last_post', 'last_poster_name', 'last_activity') and the message
+                  counter of the associated topic for new, non-personal messages, or the message counter of the
+                  conversation for new personal messages.
+                - Updates the statistics of the topic's sub-category for new, non-personal messages.
+                - Bumps the version of the topic, whose cached pages are then outdated.
+                - Awards the author the message badges they just earned, for new messages.
                 - Saves the Message object to the database.
             """
-        existing_message = Message.objects.filter(pk=self.pk).exists()
+        existing_message = not self._state.adding
         if existing_message:
             self.update_counter += 1
-        if not existing_message and not self.personal:
-            self.topic.last_activity = timezone.now()
-            self.topic.save(update_fields=["last_activity"])
-        super().save(*args, **kwargs)
+        elif self.topic_id and not self.personal and not self.forum_id:
+            self.forum_id = self.topic.forum_id
+        with transaction.atomic():
+            if not existing_message and self.conversation_id:
+                Conversation.objects.filter(pk=self.conversation_id).update(message_count=F("message_count") + 1)
+            super().save(*args, **kwargs)
+            if not existing_message and not self.personal:
+                self.topic.last_activity = self.creation
+                Topic.objects.filter(pk=self.topic_id).update(last_activity=self.creation, last_post=self,
+                                                              last_poster_name=self.author,
+                                                              message_count=F("message_count") + 1,
+                                                              version=F("version") + 1)
+                SubCategoryStats.message_posted(self)
+            elif existing_message and self.topic_id:
+                Topic.bump_version(self.topic_id)
+            if not existing_message and self.account:
+                self.account.message_posted()
+
+    def delete(self, *args, **kwargs):
+        from .forum import ForumAccount
+
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            if self.account_id and self.like_count:
+                ForumAccount.objects.filter(pk=self.account_id).update(
+                    likes_received=F("likes_received") - self.like_count)
+                self.account.invalidate_cache()
+            if self.topic_id and not self.personal:
+                Topic.objects.filter(pk=self.topic_id).update(message_count=F("message_count") - 1,
+                                                              version=F("version") + 1)
+                Topic.refresh_last_post(self.topic_id)
+                SubCategoryStats.message_deleted(self.topic.sub_category_id)
+            if self.conversation_id:
+                Conversation.objects.filter(pk=self.conversation_id).update(message_count=F("message_count") - 1)
+        return deleted
 
     class Meta:
         ordering = ['creation']
+        indexes = [
+            # Keyset pagination of topics and conversations, see KeysetPaginator
+            models.Index(fields=["topic", "creation"], name="message_topic_creation_idx"),
+            models.Index(fields=["conversation", "creation"], name="message_conv_creation_idx"),
+            # Last messages of a member in the topics of their forum, see member_view and profile_forum
+            models.Index(fields=["account", "forum", "-creation"], name="message_account_forum_idx"),
+            # Messages of a forum by date, see ForumDailyStats
+            models.Index(fields=["forum", "creation"], name="message_forum_creation_idx"),
+        ]
+
+
+class ConversationQuerySet(models.QuerySet):
+    def inbox(self, account):
+        """
+            Lists the conversations of a member, most recently active first, in a single query.
+
+            The member's conversations are the ones they started and the ones they are a contact of. Each one is
+            annotated with the author of its last message ('last_author'), the date of its last message
+            ('last_activity') and the number of messages from the other participants the member has not read yet
+            ('unread', see ConversationReadState). The number of messages is the stored 'message_count'. Each
+            annotation is a subquery reading a handful of rows through the (conversation, creation) index.
+
+            Args:
+                account: The forum account of the member.
+
+            Returns:
+                QuerySet: The conversations of the member, annotated.
+            """
+        contact_of = Conversation.contacts.through.objects.filter(forumaccount=account).values("conversation")
+        last = Message.objects.filter(conversation=OuterRef("pk")).order_by("-creation", "-pk")
+        last_read = ConversationReadState.objects.filter(conversation=OuterRef("pk"), account=account).values(
+            "last_read")[:1]
+        unread = (Message.objects
+                  .filter(conversation=OuterRef("pk"), pk__gt=OuterRef("last_read"))
+                  .exclude(account=account)
+                  .order_by()
+                  .values("conversation")
+                  .annotate(total=Count("pk"))
+                  .values("total"))
+        return (self.filter(Q(account=account) | Q(pk__in=contact_of), forum=account.forum_id)
+                .annotate(last_author=Subquery(last.values("account__user__username")[:1]),
+                          last_activity=Subquery(last.values("creation")[:1]),
+                          last_read=Coalesce(Subquery(last_read), 0))
+                .annotate(unread=Coalesce(Subquery(unread), 0))
+                .order_by(F("last_activity").desc(nulls_last=True), "-pk"))
 
 
 class Conversation(models.Model):
@@ -189,6 +453,9 @@ class Conversation(models.Model):
     forum = models.ForeignKey(to="Forum", on_delete=models.CASCADE, verbose_name="Forum")
     subject = models.CharField(max_length=50, verbose_name="Sujet")
     slug = models.SlugField(blank=True)
+    message_count = models.IntegerField(default=0, verbose_name="Nombre de messages")
+
+    objects = ConversationQuerySet.as_manager()
 
     def __str__(self):
         return f"Discussion de {self.account.user.username} - {self.forum}"
@@ -203,7 +470,7 @@ class Conversation(models.Model):
 
     @property
     def number_of_messages(self):
-        return Message.objects.filter(conversation=self).count()
+        return self.message_count
 
     @property
     def last_message(self):
@@ -214,3 +481,51 @@ class Conversation(models.Model):
                                                      "pk_forum": self.forum.pk,
                                                      "slug_conversation": self.slug,
                                                      "pk_conversation": self.pk})
+
+
+class ConversationReadState(models.Model):
+    """
+        The last message of a conversation read by one of its participants.
+
+        Messages are numbered in order of creation, so the messages of the conversation with a greater primary key than
+        'last_read' are the unread ones, see ConversationQuerySet.inbox.
+        """
+    conversation = models.ForeignKey(to="Conversation", on_delete=models.CASCADE, related_name="read_states",
+                                     verbose_name="Conversation")
+    account = models.ForeignKey(to="ForumAccount", on_delete=models.CASCADE, verbose_name="Compte")
+    last_read = models.BigIntegerField(default=0, verbose_name="Dernier message lu")
+
+    class Meta:
+        verbose_name = "Lecture de conversation"
+        constraints = [
+            models.UniqueConstraint(fields=["conversation", "account"], name="readstate_unique_conversation_account"),
+        ]
+
+    def __str__(self):
+        return f"{self.conversation_id} - {self.account_id} - {self.last_read}"
+
+    @classmethod
+    def mark_read(cls, conversation, account, message_id):
+        """
+            Records that a participant has read a conversation up to a message.
+
+            The read state only moves forward, so that going back to an older page does not mark newer messages as
+            unread again.
+
+            Args:
+                conversation: The conversation.
+                account: The forum account of the participant.
+                message_id: The primary key of the last message read.
+            """
+        if cls.objects.filter(conversation=conversation, account=account, last_read__lt=message_id).update(
+                last_read=message_id):
+            return
+        if cls.objects.filter(conversation=conversation, account=account).exists():
+            # Already read up to this message, the usual case when a page is read again
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(conversation=conversation, account=account, last_read=message_id)
+        except IntegrityError:
+            # Recorded concurrently
+            pass
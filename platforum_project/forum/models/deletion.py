@@ -0,0 +1,156 @@
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .content import Category, SubCategory, Topic, Message
+from .forum import ForumAccount, account_cache
+from .statistics import SubCategoryStats
+
+
+class DeletionJob(models.Model):
+    """
+        The deletion of a category, sub-category or topic, whose content is purged in batches.
+
+        Requesting the deletion only hides the object, along with the sub-categories and topics it contains, so that the
+        pages stop showing them at once. The 'purge_deletions' command then deletes its messages, its topics and finally
+        the object itself, a bounded batch per transaction, instead of a single cascading delete collecting every
+        dependent row in memory and locking the tables until it is done.
+        """
+    CATEGORY = "category"
+    SUB_CATEGORY = "sub_category"
+    TOPIC = "topic"
+    TARGETS = [(CATEGORY, "Catégorie"), (SUB_CATEGORY, "Sous catégorie"), (TOPIC, "Sujet")]
+    MODELS = {CATEGORY: Category, SUB_CATEGORY: SubCategory, TOPIC: Topic}
+
+    forum = models.ForeignKey(to="Forum", on_delete=models.CASCADE, verbose_name="Forum")
+    target = models.CharField(max_length=20, choices=TARGETS, verbose_name="Objet")
+    object_id = models.BigIntegerField(verbose_name="Identifiant")
+    name = models.CharField(max_length=100, verbose_name="Nom")
+    requested_by = models.ForeignKey(to="ForumAccount", on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name="+", verbose_name="Demandée par")
+    # Topics and messages to delete, estimated from the stored counters when the deletion is requested
+    total = models.IntegerField(default=0, verbose_name="Éléments à supprimer")
+    deleted = models.IntegerField(default=0, verbose_name="Éléments supprimés")
+    creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    finished = models.DateTimeField(null=True, blank=True, verbose_name="Date de fin")
+
+    class Meta:
+        verbose_name = "Suppression"
+
+    def __str__(self):
+        return f"{self.get_target_display()} {self.name}"
+
+    @property
+    def progress(self):
+        if self.finished:
+            return 100
+        return min(99, self.deleted * 100 // self.total) if self.total else 0
+
+    @classmethod
+    def request(cls, obj, account):
+        """
+            Hides a category, sub-category or topic and queues the purge of its content.
+
+            The sub-categories and topics it contains are hidden as well, with one update per table. The counters of
+            the sub-category of a deleted topic are updated at once, the statistics of deleted sub-categories are
+            deleted along with them.
+
+            Args:
+                obj: The Category, SubCategory or Topic to delete.
+                account: The forum account of the forum master deleting it.
+
+            Returns:
+                DeletionJob: The queued deletion, or the one already requested if the object was hidden meanwhile (e.g.
+                by a double click), None if it was hidden along with its parent.
+            """
+        target = next(target for target, model in cls.MODELS.items() if isinstance(obj, model))
+        sub_categories, topics = cls.contents(target, obj.pk)
+        with transaction.atomic():
+            # Conditional, so that concurrent requests hide the object, and update its statistics, only once
+            if not type(obj).objects.filter(pk=obj.pk, hidden=False).update(hidden=True):
+                return cls.objects.filter(target=target, object_id=obj.pk).order_by("-pk").first()
+            obj.hidden = True
+            if target == cls.TOPIC:
+                message_count = Topic.objects.values_list("message_count", flat=True).get(pk=obj.pk)
+                total = message_count + 1
+            else:
+                stats = SubCategoryStats.objects.filter(sub_category__in=sub_categories).aggregate(
+                    topics=Sum("topic_count"), messages=Sum("message_count"))
+                total = (stats["topics"] or 0) + (stats["messages"] or 0)
+                sub_categories.update(hidden=True)
+            topics.update(hidden=True)
+            if target == cls.TOPIC:
+                SubCategoryStats.topic_deleted(obj.sub_category_id, message_count)
+            name = obj.title if target == cls.TOPIC else obj.name
+            return cls.objects.create(forum_id=account.forum_id, target=target, object_id=obj.pk, name=name[:100],
+                                      requested_by=account, total=total)
+
+    @classmethod
+    def contents(cls, target, object_id):
+        """
+            Returns the sub-categories and topics contained in a category, sub-category or topic.
+
+            Args:
+                target: The kind of object, see TARGETS.
+                object_id: The primary key of the object.
+
+            Returns:
+                tuple: The SubCategory and Topic querysets.
+            """
+        if target == cls.CATEGORY:
+            return (SubCategory.objects.filter(category_id=object_id),
+                    Topic.objects.filter(sub_category__category_id=object_id))
+        if target == cls.SUB_CATEGORY:
+            return SubCategory.objects.filter(pk=object_id), Topic.objects.filter(sub_category_id=object_id)
+        return SubCategory.objects.none(), Topic.objects.filter(pk=object_id)
+
+    def purge_batch(self, batch_size):
+        """
+            Deletes the next batch of the content of the object, in its own transaction.
+
+            The messages are deleted first, then the topics, then the object itself, which finishes the deletion. Only
+            the primary keys of a batch are loaded, so the memory used does not depend on the size of the object.
+
+            Args:
+                batch_size: The maximum number of messages or topics deleted.
+
+            Returns:
+                int: The number of messages or topics deleted, 0 once the object is deleted.
+            """
+        _, topics = self.contents(self.target, self.object_id)
+        with transaction.atomic():
+            if message_ids := list(Message.objects.filter(topic__in=topics).values_list("pk", flat=True)[:batch_size]):
+                self.delete_messages(message_ids)
+                deleted = len(message_ids)
+            elif topic_ids := list(topics.values_list("pk", flat=True)[:batch_size]):
+                Topic.objects.filter(pk__in=topic_ids).delete()
+                deleted = len(topic_ids)
+            else:
+                self.MODELS[self.target].objects.filter(pk=self.object_id).delete()
+                self.finished = timezone.now()
+                self.save(update_fields=["finished"])
+                return 0
+            DeletionJob.objects.filter(pk=self.pk).update(deleted=F("deleted") + deleted)
+        self.deleted += deleted
+        return deleted
+
+    @staticmethod
+    def delete_messages(message_ids):
+        """
+            Deletes messages of topics along with their likes, and takes their likes out of their authors' counters.
+
+            Args:
+                message_ids: The primary keys of the messages.
+            """
+        likes = (Message.objects.filter(pk__in=message_ids, account__isnull=False, like_count__gt=0)
+                 .values("account").annotate(likes=Sum("like_count")).order_by())
+        authors = []
+        for row in likes:
+            ForumAccount.objects.filter(pk=row["account"]).update(likes_received=F("likes_received") - row["likes"])
+            authors.append(row["account"])
+        Message.objects.filter(pk__in=message_ids).delete()
+        if authors:
+            keys = [ForumAccount.cache_key(user_id, forum_id) for user_id, forum_id in
+                    ForumAccount.objects.filter(pk__in=authors).values_list("user_id", "forum_id")]
+            # Once committed, as ForumAccount.invalidate_cache
+            transaction.on_commit(lambda: account_cache().delete_many(keys))
@@ -1,15 +1,35 @@
 from datetime import timedelta
-from django.db import models
+from django.conf import settings
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.db import models, router, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
 
+from platforum_project.func.images import SMALL, MEDIUM, LARGE, make_variants, variant_url
+from platforum_project.func.queries import related_count
+from platforum_project.func.text import fold
 from platforum_project.settings import AUTH_USER_MODEL
 from django.templatetags.static import static
 from django.core.exceptions import ValidationError
 
-from .interactions import Like
 from .content import Message
+from .statistics import SubCategoryStats
+
+MESSAGE_BADGES = {"10 messages": 10, "50 messages": 50, "100 messages": 100}
+LIKE_BADGES = {"10 likes": 10, "50 likes": 50, "100 likes": 100}
+NEW_MEMBER_BADGE = "Nouveau"
+FORUM_MASTER_BADGE = "Forum Master"
+NO_BADGE = "Noo Badge"
+
+# Cached value of a user who is not a member of a forum (a cache miss is None)
+NOT_A_MEMBER = ()
+
+
+def account_cache():
+    return caches[getattr(settings, "FORUM_ACCOUNT_CACHE", DEFAULT_CACHE_ALIAS)]
 
 
 class Forum(models.Model):
@@ -28,7 +48,10 @@ class Forum(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        uploaded = self.thumbnail and not self.thumbnail._committed
         super().save(*args, **kwargs)
+        if uploaded:
+            make_variants(self.thumbnail)
 
     def clean(self):
         if self.thumbnail and self.thumbnail.size > 5 * 1024 * 1024:
@@ -39,7 +62,38 @@ class Forum(models.Model):
 
     @property
     def thumbnail_url(self):
-        return self.thumbnail.url if self.thumbnail else static("assets/header.png")
+        # Lists of forums and administration page, displayed 100px wide
+        return variant_url(self.thumbnail, MEDIUM) if self.thumbnail else static("assets/header.png")
+
+    @property
+    def thumbnail_large_url(self):
+        # Header of the forum pages, displayed 200px wide
+        return variant_url(self.thumbnail, LARGE) if self.thumbnail else static("assets/header.png")
+
+    def counts(self):
+        """
+            Counts the members, topics and messages of the forum, for its administration page, in a single query.
+
+            The active and banned members are counted with conditional aggregates over the accounts, and the topics and
+            messages are summed from the stored statistics of the sub-categories instead of being counted.
+
+            Returns:
+                dict: The numbers of 'active_members', 'banned_members', 'topics' and 'messages'.
+            """
+        members = ForumAccount.objects.filter(forum=OuterRef("pk")).order_by().values("forum")
+        stats = SubCategoryStats.objects.filter(sub_category__category__forum=OuterRef("pk"),
+                                                sub_category__hidden=False).order_by().values(
+            "sub_category__category__forum")
+
+        def scalar(queryset, aggregate):
+            return Coalesce(Subquery(queryset.annotate(value=aggregate).values("value")), 0)
+
+        return Forum.objects.filter(pk=self.pk).values(
+            active_members=scalar(members, Count("pk", filter=Q(active=True))),
+            banned_members=scalar(members, Count("pk", filter=Q(active=False))),
+            topics=scalar(stats, Sum("topic_count")),
+            messages=scalar(stats, Sum("message_count")),
+        ).get()
 
 
 class Theme(models.Model):
@@ -52,56 +106,174 @@ class Theme(models.Model):
         return self.name
 
 
+class ForumAccountQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+            Loads what the member lists display for each member along with the members.
+
+            The users come through a join, the badges in a single extra query, and each member is annotated with their
+            number of messages ('message_total') through a subquery, so that no GROUP BY prevents the members from being
+            read in the order of the (forum, username_key) index.
+
+            Returns:
+                QuerySet: The members, ready to be paginated with a KeysetPaginator on ("username_key", "pk").
+            """
+        return (self.select_related("user")
+                .prefetch_related("badges")
+                .annotate(message_total=related_count(Message.objects.all(), "account"))
+                .order_by("username_key", "pk"))
+
+    def search(self, username):
+        return self.filter(username_key__startswith=fold(username))
+
+
 class ForumAccount(models.Model):
     forum = models.ForeignKey(to=Forum, on_delete=models.CASCADE, verbose_name="Forum")
     user = models.ForeignKey(to=AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Utilisateur")
+    # Username of the user, folded (see 'fold'), to sort and search the members of a forum through an index
+    username_key = models.CharField(max_length=150, blank=True, verbose_name="Clé du nom d'utilisateur")
     thumbnail = models.ImageField(upload_to="avatars", verbose_name="Vignette", null=True, blank=True)
     active = models.BooleanField(verbose_name="Actif", default=True)
     joined = models.DateField(verbose_name="Rejoins le", auto_now_add=True)
     forum_master = models.BooleanField(default=False)
     notification_counter = models.IntegerField(default=0)
+    likes_received = models.IntegerField(default=0, verbose_name="J'aime reçus")
     badges = models.ManyToManyField(to="Badge", blank=True)
 
+    objects = ForumAccountQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.forum} - {self.user.username}"
 
     @property
     def likes(self):
-        return Like.objects.filter(message__account=self).count()
+        return self.likes_received
 
-    def badges_manager(self):
+    @staticmethod
+    def cache_key(user_id, forum_id):
+        return f"forum-account:{user_id}:{forum_id}"
+
+    @classmethod
+    def get_cached(cls, user_id, forum_id):
         """
-            Manages the assignment of badges to a user based on specific conditions.
+            Returns the account of a user in a forum, from the cache of accounts if possible.
 
-            This method checks for various conditions like the number of messages sent, likes received, account age, and
-            special status (e.g., Forum Master). It assigns badges to the user if the conditions for each badge are met.
-            Conditions include reaching message or like milestones, being a new user, or having a special status. It ensures
-            that badges are only added if the user doesn't already have them.
+            The columns of the account (or the fact that the user is not a member) are kept in the cache set by the
+            FORUM_ACCOUNT_CACHE setting, for FORUM_ACCOUNT_CACHE_TIMEOUT seconds. They are invalidated once the
+            transaction saving the account (activation, ban, notifications...) or updating its counters is committed,
+            so that a ban takes effect on the next request.
 
-            Side effects:
-                Updates the user's badges based on the conditions met.
+            Args:
+                user_id: The primary key of the user.
+                forum_id: The primary key of the forum.
+
+            Returns:
+                ForumAccount: The account, or None if the user is not a member of the forum.
             """
-        user_badges = self.badges.all()
-        message_count = Message.objects.filter(account=self).count()
-        like_count = Like.objects.filter(message__account=self).count()
+        cache = account_cache()
+        key = cls.cache_key(user_id, forum_id)
+        values = cache.get(key)
+        field_names = [field.attname for field in cls._meta.concrete_fields]
+        if values is None:
+            rows = cls.objects.filter(user_id=user_id, forum_id=forum_id).values_list(*field_names)[:1]
+            values = tuple(rows[0]) if rows else NOT_A_MEMBER
+            cache.set(key, values, getattr(settings, "FORUM_ACCOUNT_CACHE_TIMEOUT", 300))
+        if values == NOT_A_MEMBER:
+            return None
+        return cls.from_db(router.db_for_read(cls), field_names, values)
+
+    def invalidate_cache(self):
+        # Once committed: a request reading the account in between would otherwise cache its former row again
+        key = self.cache_key(self.user_id, self.forum_id)
+        transaction.on_commit(lambda: account_cache().delete(key))
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            self.username_key = fold(self.user.username)
+        uploaded = self.thumbnail and not self.thumbnail._committed
+        super().save(*args, **kwargs)
+        if uploaded:
+            make_variants(self.thumbnail)
+        self.invalidate_cache()
+        if adding:
+            self.award_badges(*self.earned_badges(message_count=0, like_count=0, has_badges=False))
+            if ForumAccount.user.is_cached(self):
+                # The user may have memoized that they were not a member (see 'CustomUser.retrieve_forum_account')
+                self.user.forget_forum_account(self.forum_id)
+
+    def earned_badges(self, message_count, like_count, has_badges):
+        """
+            Lists the badges a member has earned, given their activity.
 
+            Args:
+                message_count: The number of messages posted by the member.
+                like_count: The number of likes received by the member.
+                has_badges: Whether the member already owns at least one badge.
+
+            Returns:
+                list: The descriptions of the earned badges.
+            """
         badge_conditions = {
-            "10 messages": message_count >= 10,
-            "50 messages": message_count >= 50,
-            "100 messages": message_count >= 100,
-            "10 likes": like_count >= 10,
-            "50 likes": like_count >= 50,
-            "100 likes": like_count >= 100,
-            "Nouveau": timezone.now().date() - self.joined < timedelta(days=4),
-            "Forum Master": self.forum_master,
-            "Noo Badge": user_badges.count() == 0
+            **{description: message_count >= threshold for description, threshold in MESSAGE_BADGES.items()},
+            **{description: like_count >= threshold for description, threshold in LIKE_BADGES.items()},
+            NEW_MEMBER_BADGE: timezone.now().date() - self.joined < timedelta(days=4),
+            FORUM_MASTER_BADGE: self.forum_master,
+            NO_BADGE: not has_badges
         }
+        return [description for description, condition in badge_conditions.items() if condition]
 
-        for description, condition in badge_conditions.items():
-            if condition:
-                badge = Badge.objects.get(description=description)
-                if badge not in user_badges:
-                    self.badges.add(badge)
+    def award_badges(self, *descriptions):
+        """
+            Adds badges to the member, by description, using the in-memory badge map.
+
+            Unknown descriptions (e.g. when the badge fixture is not loaded) are ignored, and badges the member already
+            owns are not added twice.
+
+            Args:
+                *descriptions: The descriptions of the badges to award.
+            """
+        badges = Badge.by_description()
+        to_award = [badges[description] for description in descriptions if description in badges]
+        if to_award:
+            self.badges.add(*to_award)
+
+    def message_posted(self):
+        """
+            Awards the message badges whose threshold the member's message count has reached.
+
+            Called each time the member posts a message. Concurrent posts may both count past a threshold, so every
+            reached one is awarded, the badges the member already owns being skipped (see 'award_badges').
+            """
+        message_count = Message.objects.filter(account=self).count()
+        self.award_badges(*[description for description, threshold in MESSAGE_BADGES.items()
+                            if message_count >= threshold])
+
+    def like_received(self):
+        """
+            Awards the like badges whose threshold the number of likes received by the member has reached.
+
+            The stored counter is reloaded first, since it has just been updated in the database with an F() expression.
+            As for 'message_posted', every reached threshold is awarded.
+            """
+        self.refresh_from_db(fields=["likes_received"])
+        self.award_badges(*[description for description, threshold in LIKE_BADGES.items()
+                            if self.likes_received >= threshold])
+
+    def badges_manager(self):
+        """
+            Recomputes all the badges of a member from scratch.
+
+            This method counts the messages sent and the likes received by the member, and awards every badge whose
+            condition is met (message or like milestones, new member, Forum Master status, or no badge at all). Badges
+            are normally awarded as events happen (see 'message_posted' and 'like_received'), this method is only
+            needed to repair a single member; the 'recompute_badges' command does the same for a whole forum.
+
+            Side effects:
+                Updates the user's badges based on the conditions met.
+            """
+        message_count = Message.objects.filter(account=self).count()
+        self.award_badges(*self.earned_badges(message_count, self.likes_received, has_badges=self.badges.exists()))
 
     def get_absolute_url(self):
         return reverse("forum:member", kwargs={"slug_forum": self.forum.slug,
@@ -110,17 +282,23 @@ class ForumAccount(models.Model):
 
     def deactivate(self):
         self.active = False
-        self.save()
+        self.save(update_fields=["active"])
         return self
 
     def activate(self):
         self.active = True
-        self.save()
+        self.save(update_fields=["active"])
         return self
 
     @property
     def thumbnail_url(self):
-        return self.thumbnail.url if self.thumbnail else static("default/default_thumbnail.png")
+        # Profile and member pages, displayed 100px wide
+        return variant_url(self.thumbnail, MEDIUM) if self.thumbnail else static("default/default_thumbnail.png")
+
+    @property
+    def thumbnail_small_url(self):
+        # Next to the messages and in the members lists, displayed 50 to 60px high
+        return variant_url(self.thumbnail, SMALL) if self.thumbnail else static("default/default_thumbnail.png")
 
     @property
     def messages_count(self):
@@ -132,11 +310,52 @@ class ForumAccount(models.Model):
 
     class Meta:
         verbose_name = "Compte"
+        indexes = [
+            # Account of a user in a forum, see ForumAccount.get_cached and verify_active_forum_account
+            models.Index(fields=["user", "forum", "active"], name="account_user_forum_active_idx"),
+            # Members of a forum sorted or searched by username, see ForumAccountQuerySet
+            models.Index(fields=["forum", "username_key"], name="account_forum_username_idx"),
+        ]
 
 
 class Badge(models.Model):
     description = models.CharField(max_length=100)
     thumbnail = models.ImageField(verbose_name="Image", upload_to="badges")
 
+    # Badges are reference data (see fixtures/badge.json): they are loaded once per process
+    _by_description = None
+
     def __str__(self):
         return self.description
+
+    def save(self, *args, **kwargs):
+        uploaded = self.thumbnail and not self.thumbnail._committed
+        super().save(*args, **kwargs)
+        if uploaded:
+            make_variants(self.thumbnail)
+        Badge.clear_cache()
+
+    @property
+    def thumbnail_url(self):
+        # Profile and member pages, displayed 80px wide
+        return variant_url(self.thumbnail, MEDIUM)
+
+    @property
+    def thumbnail_small_url(self):
+        # Members lists, displayed 40px wide
+        return variant_url(self.thumbnail, SMALL)
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        Badge.clear_cache()
+        return deleted
+
+    @classmethod
+    def by_description(cls):
+        if cls._by_description is None:
+            cls._by_description = {badge.description: badge for badge in cls.objects.all()}
+        return cls._by_description
+
+    @classmethod
+    def clear_cache(cls):
+        cls._by_description = None
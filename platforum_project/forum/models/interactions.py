@@ -1,37 +1,199 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 
 
 class Notification(models.Model):
     account = models.ForeignKey(to="ForumAccount", on_delete=models.CASCADE, verbose_name="Compte")
     message = models.CharField(max_length=200)
+    # The topic or conversation notified about: the new messages of a burst are coalesced into a single notification
+    topic = models.ForeignKey(to="Topic", on_delete=models.CASCADE, null=True, blank=True, related_name="+",
+                              verbose_name="Sujet")
+    conversation = models.ForeignKey(to="Conversation", on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name="+", verbose_name="Conversation")
+    count = models.IntegerField(default=1, verbose_name="Nombre de messages")
+
+    @staticmethod
+    def describe(message, count):
+        if message.topic_id:
+            prefix, where = "", message.topic.title
+        else:
+            prefix, where = "Boite personnelle : ", message.conversation.subject
+        if count == 1:
+            return f"{prefix}Nouveau message posté par {message.author} dans {where}"
+        return f"{prefix}{count} nouveaux messages dans {where}"
 
     @classmethod
-    def notify_member_if_message_posted_in_topic(cls, topic, account):
-        if topic.account != account:
-            topic.account.notification_counter += 1
-            topic.account.save(update_fields=["notification_counter"])
-            return cls.objects.create(account=topic.account,
-                                      message=f"Nouveau message posté par {account.user.username} dans {topic.title}")
+    def recipients(cls, messages):
+        """
+            Returns who is notified of each message: the author of the topic, or all the participants of the
+            conversation (its author and contacts), except the author of the message.
+
+            Args:
+                messages: The messages, with their topic and conversation.
+
+            Returns:
+                dict: The primary keys of the notified forum accounts, per message.
+            """
+        from .content import Conversation
+
+        contacts = {}
+        for conversation_id, account_id in Conversation.contacts.through.objects.filter(
+                conversation__in={message.conversation_id for message in messages if message.conversation_id}
+        ).values_list("conversation_id", "forumaccount_id"):
+            contacts.setdefault(conversation_id, set()).add(account_id)
+        recipients = {}
+        for message in messages:
+            if message.topic_id:
+                accounts = {message.topic.account_id}
+            else:
+                accounts = {message.conversation.account_id} | contacts.get(message.conversation_id, set())
+            recipients[message] = accounts - {message.account_id, None}
+        return recipients
 
     @classmethod
-    def notify_member_if_message_posted_in_conversation(cls, conversation, account):
-        if conversation.account != account:
-            conversation.account.notification_counter += 1
-            conversation.account.save(update_fields=["notification_counter"])
-            return cls.objects.create(account=conversation.account,
-                                      message=f"Boite personnelle : Nouveau message posté par {account.user.username} "
-                                              f"dans {conversation.subject}")
+    def notify_messages(cls, messages):
+        """
+            Notifies the participants of new messages, coalescing the messages of a same topic or conversation.
+
+            A participant has at most one notification per topic or conversation: a new notification is created for the
+            first message ("Nouveau message posté par ..."), the following ones increment its 'count' ("12 nouveaux
+            messages dans ...") until the notifications are deleted. The notification counters of the accounts are
+            incremented with F() expressions, once per created notification.
+
+            Args:
+                messages: The new messages, in order, with their author, topic and conversation.
+            """
+        from .forum import ForumAccount, account_cache
+
+        bursts = {}
+        for message, accounts in cls.recipients(messages).items():
+            target = ("topic", message.topic_id) if message.topic_id else ("conversation", message.conversation_id)
+            for account_id in accounts:
+                bursts.setdefault((account_id, *target), []).append(message)
+
+        created = {}
+        with transaction.atomic():
+            for (account_id, field, target_id), burst in bursts.items():
+                target = {f"{field}_id": target_id}
+                notification = cls.objects.select_for_update().filter(account_id=account_id, **target).first()
+                if notification is None:
+                    try:
+                        with transaction.atomic():
+                            cls.objects.create(account_id=account_id, count=len(burst),
+                                               message=cls.describe(burst[-1], len(burst))[:200], **target)
+                        created[account_id] = created.get(account_id, 0) + 1
+                        continue
+                    except IntegrityError:
+                        # Created meanwhile by another worker (see the constraints): the burst is added to it
+                        notification = cls.objects.select_for_update().get(account_id=account_id, **target)
+                count = notification.count + len(burst)
+                cls.objects.filter(pk=notification.pk).update(count=F("count") + len(burst),
+                                                              message=cls.describe(burst[-1], count)[:200])
+            for account_id, count in created.items():
+                ForumAccount.objects.filter(pk=account_id).update(
+                    notification_counter=F("notification_counter") + count)
+        account_cache().delete_many([ForumAccount.cache_key(user_id, forum_id) for user_id, forum_id in
+                                     ForumAccount.objects.filter(pk__in=created).values_list("user_id", "forum_id")])
+
+    class Meta:
+        constraints = [
+            # A single notification per account and topic or conversation, see 'notify_messages'. The NULLs being
+            # distinct, the notifications of the other kind are not constrained (MySQL has no conditional constraint)
+            models.UniqueConstraint(fields=["account", "topic"], name="notification_unique_account_topic"),
+            models.UniqueConstraint(fields=["account", "conversation"], name="notification_unique_account_conversation"),
+        ]
+
+
+class NotificationEvent(models.Model):
+    """
+        A new message waiting for its notifications to be delivered (see Notification.notify_messages).
+
+        The rows are written when a message is posted and drained by the 'process_notifications' command, so that
+        posting a message never waits for the notifications.
+        """
+    message = models.ForeignKey(to="Message", on_delete=models.CASCADE, verbose_name="Message")
+    creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+
+    class Meta:
+        verbose_name = "Notification à envoyer"
+
+    def __str__(self):
+        return f"{self.message_id}"
+
+    @classmethod
+    def queue(cls, message):
+        return cls.objects.create(message=message)
 
 
 class Like(models.Model):
     message = models.ForeignKey(to="Message", on_delete=models.CASCADE)
     liker = models.ForeignKey(to="ForumAccount", on_delete=models.CASCADE)
+    creation = models.DateTimeField(default=timezone.now, verbose_name="Date")
 
     def __str__(self):
         return f"{self.liker} - {self.message}"
 
+    @classmethod
+    def liked_message_ids(cls, liker, messages):
+        """
+            Returns the ids of the messages, among the given ones, liked by a member, in a single query.
+
+            Args:
+                liker: The forum account of the member, or None for a visitor without account.
+                messages: The messages to check, typically a page of messages.
+
+            Returns:
+                set: The primary keys of the messages liked by the member.
+            """
+        if liker is None:
+            return set()
+        return set(cls.objects.filter(liker=liker, message__in=[message.pk for message in messages])
+                   .values_list("message_id", flat=True))
+
+    @classmethod
+    async def aliked_message_ids(cls, liker, messages):
+        if liker is None:
+            return set()
+        return {message_id async for message_id in cls.objects.filter(
+            liker=liker, message__in=[message.pk for message in messages]).values_list("message_id", flat=True)}
+
     @classmethod
     def like_unlike(cls, liker, message):
-        like, created = cls.objects.get_or_create(message=message, liker=liker)
-        if not created:
-            like.delete()
+        """
+            Toggles the like of a member on a message, and updates the stored like counters accordingly.
+
+            The like row and the counters of the message ('like_count') and of its author ('likes_received') change in
+            the same transaction, with F() expressions so that concurrent toggles don't overwrite each other. When two
+            requests like the same message at the same time, the unique constraint lets only one of them in and the
+            other one does nothing. The version of the topic is bumped, since its pages display the like counts.
+
+            Args:
+                liker: The forum account of the member who clicked.
+                message: The liked or unliked message.
+            """
+        from .content import Message, Topic
+        from .forum import ForumAccount
+
+        with transaction.atomic():
+            unliked, _ = cls.objects.filter(message=message, liker=liker).delete()
+            if not unliked:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(message=message, liker=liker)
+                except IntegrityError:
+                    return
+            step = -1 if unliked else 1
+            Message.objects.filter(pk=message.pk).update(like_count=F("like_count") + step)
+            if message.topic_id:
+                Topic.bump_version(message.topic_id)
+            if message.account_id:
+                ForumAccount.objects.filter(pk=message.account_id).update(likes_received=F("likes_received") + step)
+                message.account.invalidate_cache()
+        if not unliked and message.account:
+            message.account.like_received()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["message", "liker"], name="like_unique_message_liker"),
+        ]
@@ -0,0 +1,41 @@
+from django.db import models
+
+
+class SearchEntry(models.Model):
+    forum = models.ForeignKey(to="Forum", on_delete=models.CASCADE, verbose_name="Forum")
+    term = models.CharField(max_length=50, verbose_name="Terme")
+    topic = models.ForeignKey(to="Topic", on_delete=models.CASCADE, null=True, blank=True, verbose_name="Sujet")
+    message = models.ForeignKey(to="Message", on_delete=models.CASCADE, null=True, blank=True,
+                                verbose_name="Message")
+    weight = models.IntegerField(default=1, verbose_name="Poids")
+
+    class Meta:
+        verbose_name = "Entrée de l'index de recherche"
+        indexes = [
+            models.Index(fields=["forum", "term"], name="search_forum_term_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} - {self.topic_id or self.message_id}"
+
+
+class SearchIndexTask(models.Model):
+    """
+        A change of a message or topic waiting to be applied to the search engine (see forum/signals.py).
+
+        The rows are written in the transaction of the change and drained by the 'process_search_index' command, so
+        that requests never wait for the search engine.
+        """
+    MESSAGE = "message"
+    TOPIC = "topic"
+    DOCUMENTS = [(MESSAGE, "Message"), (TOPIC, "Sujet")]
+
+    document = models.CharField(max_length=10, choices=DOCUMENTS, verbose_name="Document")
+    object_id = models.BigIntegerField(verbose_name="Identifiant")
+    creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+
+    class Meta:
+        verbose_name = "Tâche d'indexation"
+
+    def __str__(self):
+        return f"{self.document} - {self.object_id}"
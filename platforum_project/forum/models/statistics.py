@@ -0,0 +1,199 @@
+from datetime import datetime, time, timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+class SubCategoryStats(models.Model):
+    sub_category = models.OneToOneField(to="SubCategory", on_delete=models.CASCADE, related_name="stats",
+                                        verbose_name="Sous catégorie")
+    topic_count = models.IntegerField(default=0, verbose_name="Nombre de sujets")
+    message_count = models.IntegerField(default=0, verbose_name="Nombre de messages")
+    last_topic = models.ForeignKey(to="Topic", on_delete=models.SET_NULL, null=True, blank=True, related_name="+",
+                                   verbose_name="Dernier sujet commenté")
+    last_poster = models.ForeignKey(to="ForumAccount", on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name="+", verbose_name="Dernier auteur")
+    last_activity = models.DateTimeField(null=True, blank=True, verbose_name="Activité récente")
+
+    class Meta:
+        verbose_name = "Statistiques de sous catégorie"
+
+    def __str__(self):
+        return f"Statistiques - {self.sub_category_id}"
+
+    @classmethod
+    def topic_created(cls, topic):
+        cls.objects.filter(sub_category_id=topic.sub_category_id).update(topic_count=F("topic_count") + 1)
+
+    @classmethod
+    def topic_deleted(cls, sub_category_id, message_count):
+        cls.objects.filter(sub_category_id=sub_category_id).update(topic_count=F("topic_count") - 1,
+                                                                   message_count=F("message_count") - message_count)
+        cls.refresh_last_activity(sub_category_id)
+
+    @classmethod
+    def topic_moved(cls, topic, old_sub_category_id):
+        """
+            Moves the counters of a topic from its previous sub-category to its current one.
+
+            The topic and all of its messages are subtracted from the stats of the previous sub-category and added to
+            the stats of the new one. The "last activity" columns of both sub-categories are then recomputed, since
+            the moved topic may have been the most recently commented one.
+
+            Args:
+                topic: The topic, already saved with its new sub-category.
+                old_sub_category_id: The primary key of the sub-category the topic was moved from.
+            """
+        message_count = topic.message_set.count()
+        cls.objects.filter(sub_category_id=old_sub_category_id).update(
+            topic_count=F("topic_count") - 1, message_count=F("message_count") - message_count)
+        cls.objects.filter(sub_category_id=topic.sub_category_id).update(
+            topic_count=F("topic_count") + 1, message_count=F("message_count") + message_count)
+        cls.refresh_last_activity(old_sub_category_id)
+        cls.refresh_last_activity(topic.sub_category_id)
+
+    @classmethod
+    def message_posted(cls, message):
+        cls.objects.filter(sub_category_id=message.topic.sub_category_id).update(
+            message_count=F("message_count") + 1, last_topic=message.topic_id, last_poster=message.account_id,
+            last_activity=message.creation)
+
+    @classmethod
+    def message_deleted(cls, sub_category_id):
+        cls.objects.filter(sub_category_id=sub_category_id).update(message_count=F("message_count") - 1)
+        cls.refresh_last_activity(sub_category_id)
+
+    @classmethod
+    def refresh_last_activity(cls, sub_category_id):
+        """
+            Recomputes the "last activity" columns of a sub-category from its most recent message.
+
+            Only needed when the most recent message may have disappeared (deletion or move), posting a message updates
+            these columns directly.
+
+            Args:
+                sub_category_id: The primary key of the sub-category to refresh.
+            """
+        from .content import Message
+
+        last = (Message.objects
+                .filter(topic__sub_category_id=sub_category_id, topic__hidden=False, personal=False)
+                .order_by("-creation", "-pk")
+                .values("topic_id", "account_id", "creation")
+                .first())
+        cls.objects.filter(sub_category_id=sub_category_id).update(
+            last_topic=last["topic_id"] if last else None,
+            last_poster=last["account_id"] if last else None,
+            last_activity=last["creation"] if last else None)
+
+
+class ForumDailyStats(models.Model):
+    """
+        The activity of a forum over a day, rolled up by the 'rollup_forum_stats' command, so that the trends of the
+        administration page are read from a few rows instead of scanning the messages.
+        """
+    # (field, label, whether the daily values add up over a period)
+    METRICS = [
+        ("new_members", "Nouveaux membres", True),
+        ("new_topics", "Nouveaux sujets", True),
+        ("new_messages", "Nouveaux messages", True),
+        ("new_likes", "J'aime", True),
+        ("active_posters", "Membres ayant posté", False),
+    ]
+
+    forum = models.ForeignKey(to="Forum", on_delete=models.CASCADE, verbose_name="Forum")
+    day = models.DateField(verbose_name="Jour")
+    new_members = models.IntegerField(default=0, verbose_name="Nouveaux membres")
+    new_topics = models.IntegerField(default=0, verbose_name="Nouveaux sujets")
+    new_messages = models.IntegerField(default=0, verbose_name="Nouveaux messages")
+    new_likes = models.IntegerField(default=0, verbose_name="J'aime")
+    active_posters = models.IntegerField(default=0, verbose_name="Membres ayant posté")
+
+    class Meta:
+        verbose_name = "Statistiques quotidiennes de forum"
+        constraints = [
+            models.UniqueConstraint(fields=["forum", "day"], name="dailystats_unique_forum_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.forum_id} - {self.day}"
+
+    @classmethod
+    def rollup(cls, forum, since):
+        """
+            Recomputes the daily statistics of a forum from a day to today.
+
+            Each metric is computed for the whole period in a single query grouped by day (in the current time zone),
+            and the rows of the period are replaced at once. The days already rolled up are left untouched, so the
+            command only has to go back to the last (possibly incomplete) day it rolled up.
+
+            Args:
+                forum: The forum.
+                since: The first day to recompute.
+
+            Returns:
+                int: The number of days recomputed.
+            """
+        from .content import Topic, Message
+        from .forum import ForumAccount
+        from .interactions import Like
+
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        today = timezone.localdate()
+        rows = {since + timedelta(days=i): cls(forum=forum, day=since + timedelta(days=i))
+                for i in range((today - since).days + 1)}
+
+        def per_day(queryset, **aggregates):
+            return (queryset.filter(creation__gte=start).annotate(date=TruncDate("creation")).order_by()
+                    .values("date").annotate(**aggregates))
+
+        for row in ForumAccount.objects.filter(forum=forum, joined__gte=since).order_by().values("joined").annotate(
+                total=Count("pk")):
+            rows[row["joined"]].new_members = row["total"]
+        for row in per_day(Topic.objects.filter(forum=forum), total=Count("pk")):
+            rows[row["date"]].new_topics = row["total"]
+        for row in per_day(Message.objects.filter(forum=forum), total=Count("pk"),
+                           posters=Count("account", distinct=True)):
+            rows[row["date"]].new_messages = row["total"]
+            rows[row["date"]].active_posters = row["posters"]
+        for row in per_day(Like.objects.filter(message__forum=forum), total=Count("pk")):
+            rows[row["date"]].new_likes = row["total"]
+
+        with transaction.atomic():
+            cls.objects.filter(forum=forum, day__gte=since).delete()
+            cls.objects.bulk_create(rows.values())
+        return len(rows)
+
+    @classmethod
+    def trends(cls, forum, days):
+        """
+            Returns the daily series of each metric over the last days, to be drawn as bar charts.
+
+            Args:
+                forum: The forum.
+                days: The number of days, today included.
+
+            Returns:
+                list: A dict per metric with its 'label', whether it is 'additive', its 'total' and 'peak' over the
+                period, and its 'bars': a dict per day with the 'day', the 'value' and its 'height' (in percent of
+                the peak).
+            """
+        first = timezone.localdate() - timedelta(days=days - 1)
+        rows = {row.day: row for row in cls.objects.filter(forum=forum, day__gte=first)}
+        period = [first + timedelta(days=i) for i in range(days)]
+        trends = []
+        for name, label, additive in cls.METRICS:
+            values = [getattr(rows[day], name) if day in rows else 0 for day in period]
+            peak = max(values)
+            trends.append({
+                "name": name,
+                "label": label,
+                "additive": additive,
+                "total": sum(values),
+                "peak": peak,
+                "bars": [{"day": day, "value": value, "height": round(100 * value / peak) if peak else 0}
+                         for day, value in zip(period, values)],
+            })
+        return trends
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from forum.models import Message, Topic, SearchIndexTask
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def queue_message_indexing(sender, instance, **kwargs):
+    if not instance.personal:
+        SearchIndexTask.objects.create(document=SearchIndexTask.MESSAGE, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def queue_topic_indexing(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "title" in update_fields:
+        SearchIndexTask.objects.create(document=SearchIndexTask.TOPIC, object_id=instance.pk)
+
@@ -0,0 +1,36 @@
+import pytest
+from django.core.management import call_command
+
+from benchmarks.generators import build_forum
+from benchmarks.runner import run, compare
+from forum.models import Topic, Message
+
+
+@pytest.mark.slow
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_async_views_command(forum_1, user_1, forum_master_account_1, topic_1, capsys):
+    # Given a forum with a message
+    Message.objects.create(message="<p>Un riff</p>", account=forum_master_account_1, topic=topic_1)
+    # When the sync and async views are benchmarked
+    call_command("benchmark_async_views", forum_1.pk, user_1.username, requests=20, concurrency=4)
+    # Then both serve every page
+    output = capsys.readouterr().out
+    assert "WSGI, sync views" in output and "ASGI, async views" in output
+    assert output.count(", 0 errors") == 2
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_benchmarks_measure_every_page():
+    # Given a small generated forum
+    generated = build_forum(topics=2, messages=3, members=10, conversations=4, deep_topic=30)
+    assert Topic.objects.get(pk=generated.deep_topic.pk).message_count == 30
+    # When its pages are benchmarked twice
+    first = {"results": run(generated, repeat=2)}
+    second = {"results": run(generated, repeat=2)}
+    # Then every page is served, and the runs can be compared page by page
+    assert {result["status"] for result in first["results"].values()} == {200}
+    assert len(first["results"]) == 10
+    rows = compare(first, second)
+    assert len(rows) == 30
+    assert all(before == after for name, metric, before, after, change in rows if metric == "queries")
@@ -0,0 +1,98 @@
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from forum.models import Conversation, Message, Notification, Like
+
+# Prefix asking the database for the plan of a query, per vendor
+EXPLAIN = {"sqlite": "EXPLAIN QUERY PLAN ", "mysql": "EXPLAIN FORMAT=JSON "}
+
+pytestmark = pytest.mark.skipif(connection.vendor not in EXPLAIN, reason="No query plan harness for this database")
+
+
+def main_query(client, url, table):
+    """
+        Returns the SQL of the last SELECT on a table performed by a page, with its parameters.
+        """
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url).status_code == 200
+    table = connection.ops.quote_name(table)
+    selects = [query["sql"] for query in queries if query["sql"].startswith("SELECT")]
+    return [sql for sql in selects if f"FROM {table}" in sql][-1]
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(EXPLAIN[connection.vendor] + sql)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def assert_uses_index(sql, index=None):
+    """
+        Asserts that the database answers a query through an index (the given one, if any) and without sorting rows.
+        """
+    plan = query_plan(sql)
+    if connection.vendor == "sqlite":
+        assert "USING INDEX" in plan or "USING COVERING INDEX" in plan, plan
+        assert index is None or f"INDEX {index} " in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
+    else:
+        assert '"key":' in plan, plan
+        assert index is None or f'"key": "{index}"' in plan, plan
+        assert '"using_filesort": true' not in plan, plan
+
+
+@pytest.fixture
+def member_client(client: Client, user_1, forum_master_account_1):
+    client.force_login(user_1)
+    return client
+
+
+def test_sub_category_topics_use_index(member_client, forum_1, sub_category_1, topic_1):
+    url = reverse("forum:sub-category", args=[forum_1.slug, forum_1.pk, sub_category_1.pk, sub_category_1.slug])
+    assert_uses_index(main_query(member_client, url, "forum_topic"), "topic_subcat_pin_activity_idx")
+
+
+def test_topic_messages_use_index(member_client, forum_1, sub_category_1, topic_1, message_1):
+    assert_uses_index(main_query(member_client, topic_1.get_absolute_url(), "forum_message"),
+                      "message_topic_creation_idx")
+
+
+def test_liked_messages_use_index(member_client, forum_1, topic_1, message_1, forum_master_account_1):
+    Like.like_unlike(liker=forum_master_account_1, message=message_1)
+    assert_uses_index(main_query(member_client, topic_1.get_absolute_url(), "forum_like"))
+
+
+def test_conversation_messages_use_index(member_client, forum_1, forum_master_account_1):
+    conversation = Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="MP")
+    Message.objects.create(message="MP", account=forum_master_account_1, conversation=conversation, personal=True)
+    assert_uses_index(main_query(member_client, conversation.get_absolute_url(), "forum_message"),
+                      "message_conv_creation_idx")
+
+
+def test_member_messages_use_index(member_client, forum_1, forum_master_account_1, message_1):
+    url = reverse("forum:member", args=[forum_1.slug, forum_1.pk, forum_master_account_1.pk])
+    assert_uses_index(main_query(member_client, url, "forum_message"), "message_account_forum_idx")
+
+
+def test_own_messages_use_index(member_client, forum_1, forum_master_account_1, message_1):
+    url = reverse("forum:profile", args=[forum_1.slug, forum_1.pk])
+    assert_uses_index(main_query(member_client, url, "forum_message"), "message_account_forum_idx")
+
+
+def test_forum_account_uses_index(member_client, forum_1):
+    url = reverse("forum:index", args=[forum_1.slug, forum_1.pk])
+    assert_uses_index(main_query(member_client, url, "forum_forumaccount"), "account_user_forum_active_idx")
+
+
+def test_notifications_use_index(member_client, forum_1, forum_master_account_1):
+    Notification.objects.create(account=forum_master_account_1, message="Notification")
+    url = reverse("forum:alerts", args=[forum_1.slug, forum_1.pk])
+    assert_uses_index(main_query(member_client, url, "forum_notification"))
+
+
+def test_members_list_uses_index(member_client, forum_1):
+    url = reverse("forum:members-list", args=[forum_1.slug, forum_1.pk])
+    assert_uses_index(main_query(member_client, url, "forum_forumaccount"), "account_forum_username_idx")
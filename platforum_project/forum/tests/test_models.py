@@ -0,0 +1,607 @@
+from datetime import timedelta
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from account.models import CustomUser
+from forum.forms import TopicUpdateForm, SubCategoryForm
+from forum.models import (Category, SubCategory, SubCategoryStats, Topic, Message, ForumAccount, Conversation, Like,
+                          Forum, SearchIndexTask, Notification, NotificationEvent, ConversationReadState,
+                          ForumDailyStats, DeletionJob)
+from platforum_project.func.images import SMALL, MEDIUM, LARGE, SIZES, FORMATS, variant_name
+from platforum_project.func.search import get_search_backend, tokenize
+
+
+def stats_of(sub_category):
+    return SubCategoryStats.objects.get(sub_category=sub_category)
+
+
+@pytest.mark.django_db
+def test_sub_category_stats_follow_topics_and_messages(sub_category_1, forum_master_account_1):
+    # Given a new sub-category
+    assert stats_of(sub_category_1).topic_count == 0
+    # When a topic is created with two messages
+    topic = Topic.objects.create(title="Sujet", sub_category=sub_category_1, account=forum_master_account_1)
+    Message.objects.create(message="1", account=forum_master_account_1, topic=topic)
+    last = Message.objects.create(message="2", account=forum_master_account_1, topic=topic)
+    # Then the stats are up to date
+    stats = stats_of(sub_category_1)
+    assert (stats.topic_count, stats.message_count) == (1, 2)
+    assert stats.last_topic == topic and stats.last_poster == forum_master_account_1
+    assert stats.last_activity == last.creation
+    # When a message, then the topic, are deleted
+    last.delete()
+    assert stats_of(sub_category_1).message_count == 1
+    topic.delete()
+    # Then the sub-category is empty again
+    stats = stats_of(sub_category_1)
+    assert (stats.topic_count, stats.message_count, stats.last_topic) == (0, 0, None)
+    assert sub_category_1.last_topic_commented == "Pas encore de sujet, lance toi ! :)"
+
+
+@pytest.mark.django_db
+def test_sub_category_stats_follow_topic_move(forum_1, category_1, sub_category_1, topic_1, message_1):
+    # Given a topic with one message and another sub-category
+    other = SubCategory.objects.create(name="Autre", category=category_1)
+    # When the forum master moves the topic
+    form = TopicUpdateForm(forum_1, {"title": topic_1.title, "sub_category": other.pk}, instance=topic_1)
+    assert form.is_valid()
+    form.save()
+    # Then the counters moved with it
+    assert (stats_of(sub_category_1).topic_count, stats_of(sub_category_1).message_count) == (0, 0)
+    assert (stats_of(other).topic_count, stats_of(other).message_count) == (1, 1)
+    assert stats_of(other).last_topic == topic_1
+
+
+@pytest.mark.django_db
+def test_forum_is_copied_on_topics_and_messages(forum_1, category_1, sub_category_1, topic_1, message_1, user_2,
+                                                theme_1):
+    # Given a topic with one message, its forum is copied on both
+    assert (topic_1.forum, Message.objects.get(pk=message_1.pk).forum) == (forum_1, forum_1)
+    # When its sub-category changes category, or the topic is moved
+    other = Category.objects.create(name="Autre", forum=forum_1, index=1)
+    form = SubCategoryForm(forum_1, {"category": other.pk, "name": sub_category_1.name, "index": 0},
+                           instance=sub_category_1)
+    assert form.is_valid()
+    form.save()
+    moved = SubCategory.objects.create(name="Ailleurs", category=other)
+    form = TopicUpdateForm(forum_1, {"title": topic_1.title, "sub_category": moved.pk}, instance=topic_1)
+    assert form.is_valid()
+    form.save()
+    # Then the forum stays the one of the sub-category
+    assert Topic.objects.get(pk=topic_1.pk).forum == forum_1
+    # And when the sub-category ends up in another forum, the topic and its messages follow once synchronized
+    forum_2 = Forum.objects.create(forum_master=user_2, name="Jazz", theme=theme_1, description="Le forum du jazz")
+    other.forum = forum_2
+    other.save()
+    Topic.sync_forum([topic_1.pk])
+    assert (Topic.objects.get(pk=topic_1.pk).forum, Message.objects.get(pk=message_1.pk).forum) == (forum_2, forum_2)
+
+
+@pytest.mark.django_db
+def test_backfill_forum_ids_command(forum_1, topic_1, message_1, forum_master_account_1):
+    # Given content created before the forum was copied on it
+    conversation = Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="Concert")
+    personal = Message.objects.create(message="<p>Salut</p>", account=forum_master_account_1,
+                                      conversation=conversation, personal=True)
+    Topic.objects.update(forum=None)
+    Message.objects.update(forum=None)
+    # When the backfill runs by small chunks
+    call_command("backfill_forum_ids", chunk_size=1)
+    # Then the topics and their messages have their forum, the personal messages none
+    assert Topic.objects.get(pk=topic_1.pk).forum == forum_1
+    assert Message.objects.get(pk=message_1.pk).forum == forum_1
+    assert Message.objects.get(pk=personal.pk).forum is None
+
+
+@pytest.mark.django_db
+def test_deleted_topic_leaves_its_sub_category_at_once(forum_1, sub_category_1, topic_1, message_1,
+                                                       forum_master_account_1):
+    # Given a sub-category with two topics
+    other = Topic.objects.create(title="Autre", sub_category=sub_category_1, account=forum_master_account_1)
+    Message.objects.create(message="<p>Dernier</p>", account=forum_master_account_1, topic=topic_1)
+    # When the most recently commented one is deleted
+    job = DeletionJob.request(topic_1, forum_master_account_1)
+    # Then the sub-category no longer counts it, before it is even purged
+    stats = stats_of(sub_category_1)
+    assert (stats.topic_count, stats.message_count, stats.last_topic) == (1, 0, None)
+    assert Topic.objects.get(pk=topic_1.pk).hidden and not Topic.objects.get(pk=other.pk).hidden
+    # And each batch deletes at most the requested number of rows, the topic last
+    assert [job.purge_batch(1) for _ in range(4)] == [1, 1, 1, 0]
+    assert job.finished and not Topic.objects.filter(pk=topic_1.pk).exists()
+    assert Topic.objects.filter(pk=other.pk).exists()
+
+
+@pytest.mark.django_db
+def test_topic_deletion_requested_twice_is_queued_once(sub_category_1, topic_1, message_1, forum_master_account_1):
+    # Given a topic loaded by two concurrent requests, e.g. a double click on the delete button
+    first, second = Topic.objects.get(pk=topic_1.pk), Topic.objects.get(pk=topic_1.pk)
+    # When both request its deletion
+    job = DeletionJob.request(first, forum_master_account_1)
+    # Then the second one gets the deletion already queued
+    assert DeletionJob.request(second, forum_master_account_1) == job
+    assert DeletionJob.objects.count() == 1
+    # And the sub-category counters are only decremented once
+    stats = stats_of(sub_category_1)
+    assert (stats.topic_count, stats.message_count) == (0, 0)
+
+
+def uploaded_photo(mode="RGB", size=(800, 600)):
+    # A photo taken by a phone: with its EXIF data (orientation, position) and an ICC profile
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x8825] = {1: "N"}
+    buffer = BytesIO()
+    Image.new(mode, size, "red").save(buffer, format="PNG" if mode == "RGBA" else "JPEG", exif=exif,
+                                      icc_profile=b"profil")
+    return SimpleUploadedFile("photo.png" if mode == "RGBA" else "photo.jpg", buffer.getvalue())
+
+
+@pytest.mark.django_db
+def test_uploaded_avatar_gets_resized_variants_without_metadata(settings, tmp_path, forum_account_1):
+    # Given a member uploading a large photo
+    settings.MEDIA_ROOT = tmp_path
+    forum_account_1.thumbnail = uploaded_photo()
+    # When it is saved
+    forum_account_1.save()
+    # Then variants of every size are stored next to it, rotated and without metadata
+    name = forum_account_1.thumbnail.name
+    for size in SIZES:
+        for extension in FORMATS:
+            with Image.open(tmp_path / variant_name(name, size, extension)) as variant:
+                assert variant.size == (size * 3 // 4, size)
+                assert not variant.getexif() and "icc_profile" not in variant.info
+    # And the pages link to the variant of their size
+    assert forum_account_1.thumbnail_small_url == f"/media/{variant_name(name, SMALL)}"
+    assert forum_account_1.thumbnail_url == f"/media/{variant_name(name, MEDIUM)}"
+
+
+@pytest.mark.django_db
+def test_backfill_thumbnails_command(settings, tmp_path, forum_1):
+    # Given a transparent logo uploaded before the variants existed
+    settings.MEDIA_ROOT = tmp_path
+    forum_1.thumbnail.save("logo.png", uploaded_photo("RGBA", (300, 300)), save=False)
+    Forum.objects.filter(pk=forum_1.pk).update(thumbnail=forum_1.thumbnail.name)
+    assert not (tmp_path / variant_name(forum_1.thumbnail.name, LARGE)).exists()
+    # When the backfill runs
+    call_command("backfill_thumbnails")
+    # Then the variants exist
+    assert Image.open(tmp_path / variant_name(forum_1.thumbnail.name, LARGE)).size == (300, 300)
+    assert Image.open(tmp_path / variant_name(forum_1.thumbnail.name, SMALL)).size == (SMALL, SMALL)
+
+
+@pytest.mark.django_db
+def test_rebuild_sub_category_stats_command(sub_category_1, topic_1, message_1):
+    # Given drifted counters
+    SubCategoryStats.objects.filter(sub_category=sub_category_1).update(topic_count=42, message_count=0,
+                                                                        last_topic=None)
+    # When the rebuild command runs
+    call_command("rebuild_subcategory_stats")
+    # Then the counters match the database again
+    stats = stats_of(sub_category_1)
+    assert (stats.topic_count, stats.message_count, stats.last_topic) == (1, 1, topic_1)
+
+
+@pytest.mark.django_db
+def test_forum_counts_in_a_single_query(forum_1, forum_master_account_1, forum_account_1, message_1,
+                                        django_assert_num_queries):
+    # Given a forum with a banned member, a topic and a message
+    forum_account_1.deactivate()
+    # When its numbers are counted
+    with django_assert_num_queries(1):
+        counts = forum_1.counts()
+    # Then they come from a single query
+    assert counts == {"active_members": 1, "banned_members": 1, "topics": 1, "messages": 1}
+
+
+@pytest.mark.django_db
+def test_rollup_forum_stats_command(forum_1, forum_master_account_1, forum_account_1, topic_1, message_1):
+    # Given activity today and three days ago
+    today = timezone.localdate()
+    three_days_ago = timezone.now() - timedelta(days=3)
+    old = Message.objects.create(message="Ancien", account=forum_account_1, topic=topic_1)
+    Message.objects.filter(pk=old.pk).update(creation=three_days_ago)
+    Like.objects.create(message=old, liker=forum_master_account_1, creation=three_days_ago)
+    Message.objects.create(message="Réponse", account=forum_account_1, topic=topic_1)
+    # When the activity is rolled up since a week ago
+    call_command("rollup_forum_stats", "--since", (today - timedelta(days=6)).isoformat())
+    # Then there is a row per day, with the activity of the day
+    assert ForumDailyStats.objects.filter(forum=forum_1).count() == 7
+    stats = ForumDailyStats.objects.get(forum=forum_1, day=today)
+    assert (stats.new_members, stats.new_topics, stats.new_messages, stats.active_posters, stats.new_likes) == (
+        2, 1, 2, 2, 0)
+    stats = ForumDailyStats.objects.get(forum=forum_1, day=three_days_ago.astimezone().date())
+    assert (stats.new_messages, stats.active_posters, stats.new_likes) == (1, 1, 1)
+    # When it runs again, only the last day is recomputed
+    Message.objects.create(message="Encore", account=forum_master_account_1, topic=topic_1)
+    call_command("rollup_forum_stats")
+    assert ForumDailyStats.objects.filter(forum=forum_1).count() == 7
+    assert ForumDailyStats.objects.get(forum=forum_1, day=today).new_messages == 3
+
+
+@pytest.mark.django_db
+def test_category_tree_for_loads_the_tree_in_two_queries(forum_1, category_1, sub_category_1, message_1,
+                                                         forum_master_account_1, django_assert_num_queries):
+    # Given a forum with several categories and sub-categories
+    for i in range(3):
+        category = Category.objects.create(name=f"Catégorie {i}", forum=forum_1)
+        SubCategory.objects.create(name=f"Sous catégorie {i}", category=category)
+    # When the whole tree and the stats are read
+    with django_assert_num_queries(2):
+        names = [(category.name, sub_category.name, sub_category.number_of_messages,
+                  sub_category.last_topic_commented)
+                 for category in Category.objects.tree_for(forum_1, SubCategory.objects.with_stats())
+                 for sub_category in category.get_sub_categories]
+    # Then everything was loaded up front
+    assert len(names) == 4
+    assert ("Catégorie1", "SousCatégorie1", 1, "Titre1") in names
+
+
+@pytest.mark.django_db
+def test_sub_category_with_activity(sub_category_1, topic_1, message_1, forum_master_account_1):
+    # Given a second message in the topic
+    last = Message.objects.create(message="2", account=forum_master_account_1, topic=topic_1)
+    # When the activity is computed live
+    sub_category = SubCategory.objects.with_activity().get(pk=sub_category_1.pk)
+    # Then it matches the topics and messages
+    assert (sub_category.topics_count, sub_category.messages_count) == (1, 2)
+    assert sub_category.last_activity == last.creation
+    assert sub_category.last_topic_title == topic_1.title
+
+
+@pytest.mark.django_db
+def test_rebuilt_stats_leave_out_the_topics_being_deleted(sub_category_1, topic_1, message_1,
+                                                          forum_master_account_1):
+    # Given a topic whose deletion is pending, more recently commented than another one
+    other = Topic.objects.create(title="Autre", sub_category=sub_category_1, account=forum_master_account_1)
+    kept = Message.objects.create(message="1", account=forum_master_account_1, topic=other)
+    Message.objects.create(message="2", account=forum_master_account_1, topic=topic_1)
+    DeletionJob.request(topic_1, forum_master_account_1)
+    live = stats_of(sub_category_1)
+    # When the statistics are rebuilt before it is purged
+    call_command("rebuild_subcategory_stats")
+    # Then they match the ones kept up to date by the deletion
+    stats = stats_of(sub_category_1)
+    assert (stats.topic_count, stats.message_count, stats.last_topic) == (live.topic_count, live.message_count,
+                                                                          live.last_topic) == (1, 1, other)
+    assert stats.last_activity == kept.creation
+
+
+@pytest.mark.django_db
+def test_new_member_and_message_badges_are_awarded_on_events(badges, forum_1, user_2, topic_1):
+    # Given a new member
+    account = ForumAccount.objects.create(forum=forum_1, user=user_2)
+    assert {badge.description for badge in account.badges.all()} == {"Nouveau", "Noo Badge"}
+    # When they post their tenth message
+    for i in range(10):
+        Message.objects.create(message=str(i), account=account, topic=topic_1)
+    # Then the message badge is awarded
+    assert account.badges.filter(description="10 messages").exists()
+    assert not account.badges.filter(description="50 messages").exists()
+    # When the threshold was passed without the badge being awarded, e.g. by two concurrent posts
+    account.badges.remove(account.badges.get(description="10 messages"))
+    Message.objects.create(message="11", account=account, topic=topic_1)
+    # Then it is awarded on the next message, once
+    assert account.badges.filter(description="10 messages").count() == 1
+
+
+@pytest.mark.django_db
+def test_recompute_badges_command(badges, forum_1, forum_account_1, forum_master_account_1, topic_1):
+    # Given members who lost their badges
+    for i in range(10):
+        Message.objects.create(message=str(i), account=forum_account_1, topic=topic_1)
+    ForumAccount.badges.through.objects.all().delete()
+    # When the badges of the forum are recomputed
+    call_command("recompute_badges", forum_1.pk)
+    # Then every member gets back what they earned
+    assert {badge.description for badge in forum_account_1.badges.all()} == {"Nouveau", "Noo Badge", "10 messages"}
+    assert {badge.description for badge in forum_master_account_1.badges.all()} == {"Nouveau", "Noo Badge",
+                                                                                    "Forum Master"}
+
+
+@pytest.mark.django_db
+def test_message_counters_of_topics_and_conversations(forum_1, topic_1, forum_master_account_1, forum_account_1):
+    # Given a topic and a conversation
+    conversation = Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="MP")
+    # When messages are posted and one of them is deleted
+    Message.objects.create(message="1", account=forum_master_account_1, topic=topic_1)
+    Message.objects.create(message="2", account=forum_account_1, topic=topic_1).delete()
+    Message.objects.create(message="3", account=forum_master_account_1, conversation=conversation, personal=True)
+    # Then the stored counters are up to date
+    topic_1.refresh_from_db()
+    conversation.refresh_from_db()
+    assert (topic_1.number_of_messages, conversation.number_of_messages) == (1, 1)
+    # And they can be rebuilt
+    Topic.objects.update(message_count=0)
+    call_command("rebuild_message_counters")
+    topic_1.refresh_from_db()
+    assert topic_1.message_count == 1
+
+
+@pytest.mark.django_db
+def test_like_unlike_updates_stored_counters(forum_1, topic_1, forum_master_account_1, forum_account_1):
+    # Given a message of a member
+    message = Message.objects.create(message="1", account=forum_account_1, topic=topic_1)
+    # When another member likes it twice (like, then unlike) and likes it again
+    Like.like_unlike(liker=forum_master_account_1, message=message)
+    Like.like_unlike(liker=forum_master_account_1, message=message)
+    Like.like_unlike(liker=forum_master_account_1, message=message)
+    # Then there is a single like, counted on the message and on its author
+    message.refresh_from_db()
+    forum_account_1.refresh_from_db()
+    assert Like.objects.filter(message=message).count() == 1
+    assert (message.like_count, forum_account_1.likes_received) == (1, 1)
+    # When the message is deleted
+    message.delete()
+    # Then its likes are no longer counted for its author
+    forum_account_1.refresh_from_db()
+    assert forum_account_1.likes_received == 0
+
+
+@pytest.mark.django_db
+def test_reconcile_likes_command(forum_1, topic_1, forum_master_account_1, forum_account_1):
+    # Given counters that drifted away from the likes
+    message = Message.objects.create(message="1", account=forum_account_1, topic=topic_1)
+    Like.objects.create(message=message, liker=forum_master_account_1)
+    Message.objects.update(like_count=5)
+    ForumAccount.objects.filter(pk=forum_account_1.pk).update(likes_received=7)
+    cached = ForumAccount.get_cached(forum_account_1.user_id, forum_1.pk)
+    # When the likes are reconciled
+    call_command("reconcile_likes", batch_size=1)
+    # Then the likes are kept and the counters match them again
+    assert Like.objects.count() == 1
+    message.refresh_from_db()
+    forum_account_1.refresh_from_db()
+    assert (message.like_count, forum_account_1.likes_received) == (1, 1)
+    # And the account is no longer read from the cache with its former counter
+    assert cached.likes_received == 7
+    assert ForumAccount.get_cached(forum_account_1.user_id, forum_1.pk).likes_received == 1
+
+
+def test_tokenize_folds_accents_and_drops_french_stop_words():
+    # Given an HTML message written with the editor
+    text = "<p>Les Guitares &eacute;lectriques de l'été !</p>"
+    # When it is tokenized
+    terms = tokenize(text)
+    # Then the tags, accents, elisions, stop words and plurals are gone
+    assert terms == ["guitare", "electrique"]
+
+
+@pytest.mark.django_db
+def test_topics_not_backfilled_yet_are_indexed_in_their_forum(forum_1, topic_1, forum_master_account_1):
+    # Given a topic and a message whose forum the 'backfill_forum_ids' command has not filled yet
+    message = Message.objects.create(message="<p>Un riff</p>", account=forum_master_account_1, topic=topic_1)
+    Topic.objects.filter(pk=topic_1.pk).update(forum=None)
+    Message.objects.filter(pk=message.pk).update(forum=None)
+    # When they are indexed
+    backend = get_search_backend()
+    backend.index_topics(Topic.objects.filter(pk=topic_1.pk))
+    backend.index_messages(Message.objects.filter(pk=message.pk))
+    # Then they are found in the forum of their sub-category
+    assert list(backend.search_topics(forum_1, topic_1.title)) == [topic_1]
+    assert list(backend.search_messages(forum_1, "riff")) == [message]
+
+
+@pytest.mark.django_db
+def test_search_is_ranked_and_scoped_to_the_forum(forum_1, topic_1, forum_master_account_1, user_2, theme_1):
+    # Given indexed messages in the forum, and in another forum
+    backend = get_search_backend()
+    once = Message.objects.create(message="<p>Une guitare</p>", account=forum_master_account_1, topic=topic_1)
+    twice = Message.objects.create(message="<p>Guitares et guitare électrique</p>", account=forum_master_account_1,
+                                   topic=topic_1)
+    other_forum = Forum.objects.create(forum_master=user_2, name="Autre", theme=theme_1, description="Autre")
+    other_account = ForumAccount.objects.create(forum=other_forum, user=user_2)
+    other_sub_category = SubCategory.objects.create(
+        name="Sous catégorie", category=Category.objects.create(name="Catégorie", forum=other_forum))
+    other_topic = Topic.objects.create(title="Guitare", sub_category=other_sub_category, account=other_account)
+    Message.objects.create(message="<p>guitare</p>", account=other_account, topic=other_topic)
+    call_command("process_search_index")
+    # When searching the forum
+    # Then only its messages are found, the most relevant first
+    assert list(backend.search_messages(forum_1, "GUITARES")) == [twice, once]
+    assert list(backend.search_messages(forum_1, "guitare electrique")) == [twice]
+    assert list(backend.search_topics(forum_1, "titre1")) == [topic_1]
+
+
+@pytest.mark.django_db
+def test_search_index_follows_changes_through_the_outbox(forum_1, topic_1, forum_master_account_1):
+    # Given an indexed message
+    backend = get_search_backend()
+    message = Message.objects.create(message="<p>Une guitare</p>", account=forum_master_account_1, topic=topic_1)
+    call_command("process_search_index")
+    # When it is updated, then deleted, and the topic renamed
+    message.message = "<p>Une basse</p>"
+    message.save()
+    assert list(backend.search_messages(forum_1, "basse")) == []
+    call_command("process_search_index", batch_size=1)
+    assert list(backend.search_messages(forum_1, "basse")) == [message]
+    message.delete()
+    topic_1.title = "Batterie"
+    topic_1.save()
+    topic_1.pin_topic()
+    # Then the changes are queued, and applied by the worker
+    assert SearchIndexTask.objects.count() == 2
+    call_command("process_search_index")
+    assert not SearchIndexTask.objects.exists()
+    assert not backend.search_messages(forum_1, "basse").exists()
+    assert list(backend.search_topics(forum_1, "batterie")) == [topic_1]
+
+
+@pytest.mark.django_db
+def test_reindex_forum_command(forum_1, topic_1, forum_master_account_1):
+    # Given messages missing from the search index
+    messages = [Message.objects.create(message=f"<p>riff {i}</p>", account=forum_master_account_1, topic=topic_1)
+                for i in range(5)]
+    SearchIndexTask.objects.all().delete()
+    # When the forum is reindexed by small chunks
+    call_command("reindex_forum", forum_1.pk, chunk_size=2)
+    # Then everything can be found
+    assert set(get_search_backend().search_messages(forum_1, "riff")) == set(messages)
+    assert list(get_search_backend().search_topics(forum_1, "titre1")) == [topic_1]
+
+
+@pytest.mark.django_db
+def test_forum_accounts_are_cached_and_invalidated(forum_1, user_2, forum_account_1, django_assert_num_queries,
+                                                  django_capture_on_commit_callbacks):
+    # Given an account read once
+    ForumAccount.get_cached(user_2.pk, forum_1.pk)
+    # When it is read again
+    # Then the database is not queried
+    with django_assert_num_queries(0):
+        account = ForumAccount.get_cached(user_2.pk, forum_1.pk)
+    assert account == forum_account_1 and account.active
+    # When the member is banned
+    with django_capture_on_commit_callbacks(execute=True):
+        forum_account_1.deactivate()
+        # Then the cached account is kept until the ban is committed, not to be cached again meanwhile
+        assert ForumAccount.get_cached(user_2.pk, forum_1.pk).active
+    # And the ban is seen as soon as it is
+    assert not ForumAccount.get_cached(user_2.pk, forum_1.pk).active
+    # When a member gets notified
+    topic = Topic.objects.create(title="Sujet", sub_category=SubCategory.objects.create(
+        name="Sous catégorie", category=Category.objects.create(name="Catégorie", forum=forum_1)),
+        account=forum_account_1)
+    NotificationEvent.queue(Message.objects.create(
+        message="1", topic=topic, account=ForumAccount.objects.create(forum=forum_1, user=forum_1.forum_master)))
+    call_command("process_notifications")
+    # Then their counter is up to date
+    assert ForumAccount.get_cached(user_2.pk, forum_1.pk).notification_counter == 1
+
+
+@pytest.mark.django_db
+def test_non_members_are_cached_until_they_sign_up(forum_1, user_2, django_assert_num_queries,
+                                                  django_capture_on_commit_callbacks):
+    # Given a user who is not a member
+    assert ForumAccount.get_cached(user_2.pk, forum_1.pk) is None
+    with django_assert_num_queries(0):
+        assert ForumAccount.get_cached(user_2.pk, forum_1.pk) is None
+    # When they sign up
+    with django_capture_on_commit_callbacks(execute=True):
+        account = ForumAccount.objects.create(forum=forum_1, user=user_2)
+    # Then they are a member
+    assert ForumAccount.get_cached(user_2.pk, forum_1.pk) == account
+
+
+@pytest.mark.django_db
+def test_topic_last_post_columns(topic_1, forum_master_account_1, forum_account_1):
+    # Given a topic with two messages
+    first = Message.objects.create(message="1", account=forum_master_account_1, topic=topic_1)
+    last = Message.objects.create(message="2", account=forum_account_1, topic=topic_1)
+    # Then the last one is stored on the topic
+    topic_1.refresh_from_db()
+    assert (topic_1.last_post, topic_1.last_message, topic_1.last_activity) == (last, "pat", last.creation)
+    # When it is deleted
+    last.delete()
+    # Then the previous one takes its place
+    topic_1.refresh_from_db()
+    assert (topic_1.last_post, topic_1.last_message, topic_1.last_activity) == (first, "gab", first.creation)
+    # And the columns can be rebuilt
+    Topic.objects.update(last_post=None, last_poster_name="")
+    call_command("rebuild_message_counters")
+    topic_1.refresh_from_db()
+    assert (topic_1.last_post, topic_1.last_message, topic_1.last_activity) == (first, "gab", first.creation)
+
+
+def test_saving_an_outdated_topic_keeps_its_maintained_columns(topic_1, forum_master_account_1, forum_account_1):
+    # Given a topic loaded by a moderator, then replied to and hidden
+    outdated = Topic.objects.get(pk=topic_1.pk)
+    last = Message.objects.create(message="1", account=forum_account_1, topic=topic_1)
+    Topic.objects.filter(pk=topic_1.pk).update(hidden=True)
+    # When the moderator saves it
+    outdated.title = "Nouveau titre"
+    outdated.save()
+    # Then only the edited columns are written
+    topic_1.refresh_from_db()
+    assert topic_1.title == "Nouveau titre"
+    assert (topic_1.message_count, topic_1.last_post, topic_1.last_message, topic_1.hidden) == (1, last, "pat", True)
+
+
+def test_username_key_follows_the_username(user_2, forum_account_1, django_assert_num_queries):
+    # Given a member, whose folded username is stored on the account
+    assert forum_account_1.username_key == "pat"
+    # When the user is renamed
+    user_2.username = "Pâquerette"
+    user_2.save()
+    # Then the account follows
+    forum_account_1.refresh_from_db()
+    assert forum_account_1.username_key == "paquerette"
+    assert list(ForumAccount.objects.search("PÂQ")) == [forum_account_1]
+    # And saving other fields of the user leaves the accounts alone
+    with django_assert_num_queries(1):
+        user_2.save(update_fields=["last_login"])
+    # And the key can be backfilled for existing accounts
+    ForumAccount.objects.update(username_key="")
+    call_command("backfill_username_keys")
+    forum_account_1.refresh_from_db()
+    assert forum_account_1.username_key == "paquerette"
+
+
+def test_inbox_lists_owned_and_contact_conversations_with_unread_counts(forum_1, forum_master_account_1,
+                                                                        forum_account_1, django_assert_num_queries):
+    # Given a conversation started by a member and one they are a contact of
+    owned = Conversation.objects.create(account=forum_account_1, forum=forum_1, subject="Mienne")
+    other = Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="Autre")
+    other.contacts.add(forum_account_1)
+    Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="Privée")
+    Message.objects.create(message="1", account=forum_account_1, conversation=owned, personal=True)
+    first = Message.objects.create(message="2", account=forum_master_account_1, conversation=other, personal=True)
+    Message.objects.create(message="3", account=forum_master_account_1, conversation=other, personal=True)
+    # When the inbox is listed
+    with django_assert_num_queries(1):
+        inbox = list(Conversation.objects.inbox(forum_account_1))
+    # Then both come in a single query, most recently active first, with what the inbox displays
+    assert inbox == [other, owned]
+    assert [(c.message_count, c.last_author, c.unread) for c in inbox] == [(2, "gab", 2), (1, "pat", 0)]
+    # And reading a conversation only moves forward
+    ConversationReadState.mark_read(other, forum_account_1, other.message_set.last().pk)
+    ConversationReadState.mark_read(other, forum_account_1, first.pk)
+    assert [c.unread for c in Conversation.objects.inbox(forum_account_1)] == [0, 0]
+
+
+def test_notifications_are_coalesced_per_topic_and_conversation(forum_1, topic_1, forum_master_account_1,
+                                                                forum_account_1):
+    # Given a conversation between three members, and a topic of the forum master
+    third = ForumAccount.objects.create(forum=forum_1, user=CustomUser.objects.create_user(
+        username="lea", email="l@l.com", first_name="Léa", last_name="L", password="12345678"))
+    conversation = Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="MP")
+    conversation.contacts.add(forum_account_1, third)
+    # When a burst of messages is posted
+    for i in range(12):
+        NotificationEvent.queue(Message.objects.create(message=f"{i}", account=forum_account_1, topic=topic_1))
+    NotificationEvent.queue(Message.objects.create(message="MP", account=forum_account_1, conversation=conversation,
+                                                   personal=True))
+    call_command("process_notifications", batch_size=5)
+    # Then each participant gets a single notification per topic or conversation, the author none
+    notifications = {(n.account_id, n.message, n.count) for n in Notification.objects.all()}
+    assert notifications == {
+        (forum_master_account_1.pk, "12 nouveaux messages dans Titre1", 12),
+        (forum_master_account_1.pk, "Boite personnelle : Nouveau message posté par pat dans MP", 1),
+        (third.pk, "Boite personnelle : Nouveau message posté par pat dans MP", 1),
+    }
+    assert [account.notification_counter for account in ForumAccount.objects.order_by("pk")] == [2, 0, 1]
+    assert not NotificationEvent.objects.exists()
+
+
+@pytest.mark.django_db
+def test_notification_created_by_a_concurrent_worker_is_coalesced(monkeypatch, topic_1, forum_master_account_1,
+                                                                   forum_account_1):
+    # Given another worker creating the notification of the topic right after it was looked up
+    first = QuerySet.first
+
+    def concurrent_first(queryset):
+        if queryset.model is Notification and not Notification.objects.exists():
+            Notification.objects.create(account=forum_master_account_1, topic=topic_1, count=1, message="Autre")
+            return None
+        return first(queryset)
+
+    monkeypatch.setattr(QuerySet, "first", concurrent_first)
+    # When a message of the topic is notified
+    Notification.notify_messages([Message.objects.create(message="1", account=forum_account_1, topic=topic_1)])
+    # Then it is added to the notification created meanwhile, not to a second one
+    notification = Notification.objects.get()
+    assert (notification.count, notification.message) == (2, "2 nouveaux messages dans Titre1")
@@ -0,0 +1,243 @@
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.urls import reverse
+
+from account.models import CustomUser
+from forum import urls as forum_urls
+from forum.models import ForumAccount, Category, SubCategory, Topic, Message, Like, Conversation, Notification
+from platforum_project.func.text import fold
+
+# Maximum number of queries of each route of forum/urls.py, requested by the forum master with empty caches. Lower a
+# budget when a view gets cheaper, raising one must be a deliberate choice.
+QUERY_BUDGETS = {
+    "create-forum": 3,
+    "signup": 4,
+    "index": 6,
+    "sub-category": 7,
+    "add-topic": 5,
+    "topic": 8,
+    "update-message": 8,
+    "delete-message": 20,
+    "like": 15,
+    "private-messaging": 5,
+    "conversation": 12,
+    "start-conversation": 6,
+    "update-message-conversation": 7,
+    "delete-message-conversation": 14,
+    "profile": 6,
+    "members-list": 6,
+    "member": 8,
+    "alerts": 5,
+    "delete-alerts": 9,
+    "query": 7,
+    "admin-index": 6,
+    "pin": 10,
+    "admin-members": 6,
+    "admin-member-status": 6,
+    "builder": 7,
+    "delete-category-admin": 12,
+    "delete-subcategory-admin": 12,
+    "admin-update-category": 5,
+    "admin-update-subcategory": 6,
+    "admin-add-sub-category": 5,
+    "admin-update-topic": 7,
+    "admin-delete-topic": 15,
+}
+
+# Rows displayed by the list pages when checking for N+1 queries (1 before adding rows)
+ROWS = 20
+
+
+@pytest.fixture
+def conversation_1(forum_1, forum_master_account_1, forum_account_1):
+    conversation = Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="Répétition")
+    conversation.contacts.add(forum_account_1)
+    return conversation
+
+
+@pytest.fixture
+def personal_message_1(conversation_1, forum_master_account_1):
+    return Message.objects.create(message="<p>Salut</p>", account=forum_master_account_1,
+                                  conversation=conversation_1, personal=True)
+
+
+@pytest.fixture
+def routes(forum_1, forum_master_account_1, forum_account_1, category_1, sub_category_1, topic_1, message_1,
+           conversation_1, personal_message_1):
+    """
+        The request made to each route: its method, URL arguments and data.
+        """
+    call_command("process_search_index")
+    forum = {"slug_forum": forum_1.slug, "pk_forum": forum_1.pk}
+    sub_category = {**forum, "pk": sub_category_1.pk, "slug_sub_category": sub_category_1.slug}
+    topic = {**sub_category, "pk_topic": topic_1.pk, "slug_topic": topic_1.slug}
+    conversation = {**forum, "slug_conversation": conversation_1.slug, "pk_conversation": conversation_1.pk}
+    return {
+        "create-forum": ("get", {}, {}),
+        "signup": ("get", forum, {}),
+        "index": ("get", forum, {}),
+        "sub-category": ("get", sub_category, {}),
+        "add-topic": ("get", sub_category, {}),
+        "topic": ("get", topic, {}),
+        "update-message": ("get", {**topic, "pk_message": message_1.pk}, {}),
+        "delete-message": ("post", {"pk_forum": forum_1.pk, "pk_topic": topic_1.pk, "pk_message": message_1.pk}, {}),
+        "like": ("post", {"pk_forum": forum_1.pk, "pk_message": message_1.pk}, {}),
+        "private-messaging": ("get", forum, {}),
+        "conversation": ("get", conversation, {}),
+        "start-conversation": ("get", {**forum, "pk_member": forum_account_1.pk}, {}),
+        "update-message-conversation": ("get", {**conversation, "pk_message": personal_message_1.pk}, {}),
+        "delete-message-conversation": ("post", {"pk_forum": forum_1.pk, "pk_conversation": conversation_1.pk,
+                                                 "pk_message": personal_message_1.pk}, {}),
+        "profile": ("get", forum, {}),
+        "members-list": ("get", forum, {}),
+        "member": ("get", {**forum, "pk_member": forum_account_1.pk}, {}),
+        "alerts": ("get", forum, {}),
+        "delete-alerts": ("post", {"pk_forum": forum_1.pk}, {}),
+        "query": ("get", forum, {"query": "message1"}),
+        "admin-index": ("get", forum, {}),
+        "pin": ("post", {"pk_forum": forum_1.pk, "pk_topic": topic_1.pk}, {}),
+        "admin-members": ("get", forum, {}),
+        "admin-member-status": ("post", {"pk_forum": forum_1.pk, "pk_member": forum_account_1.pk}, {}),
+        "builder": ("get", forum, {}),
+        "delete-category-admin": ("post", {"pk_forum": forum_1.pk, "pk_category": category_1.pk}, {}),
+        "delete-subcategory-admin": ("post", {"pk_forum": forum_1.pk, "pk_subcategory": sub_category_1.pk}, {}),
+        "admin-update-category": ("get", {**forum, "pk_category": category_1.pk}, {}),
+        "admin-update-subcategory": ("get", {**forum, "pk_subcategory": sub_category_1.pk}, {}),
+        "admin-add-sub-category": ("get", {**forum, "pk_category": category_1.pk}, {}),
+        "admin-update-topic": ("get", {**forum, "pk_topic": topic_1.pk}, {}),
+        "admin-delete-topic": ("post", {"pk_forum": forum_1.pk, "pk_topic": topic_1.pk}, {}),
+    }
+
+
+def new_members(forum, count):
+    """
+        Adds members with distinct users to a forum, in bulk.
+        """
+    password = make_password("12345678")
+    users = CustomUser.objects.bulk_create([
+        CustomUser(username=f"membre{i}", email=f"membre{i}@m.com", first_name="Membre", last_name=str(i),
+                   password=password) for i in range(count)])
+    ForumAccount.objects.bulk_create([ForumAccount(forum=forum, user=user, username_key=fold(user.username))
+                                      for user in CustomUser.objects.filter(pk__in=[user.pk for user in users])])
+    return list(ForumAccount.objects.filter(forum=forum, user__username__startswith="membre"))
+
+
+def test_every_route_has_a_budget():
+    # Given the routes of the forum application
+    names = {pattern.name for pattern in forum_urls.urlpatterns}
+    # Then each one has a query budget
+    assert names == set(QUERY_BUDGETS)
+
+
+@pytest.mark.parametrize("name", sorted(QUERY_BUDGETS))
+def test_route_within_query_budget(client, user_1, routes, query_budget, name):
+    # Given the forum master, or a user who is not a member yet to sign up
+    if name == "signup":
+        client.force_login(CustomUser.objects.create_user(username="visiteur", email="v@v.com", first_name="Visiteur",
+                                                          last_name="Visiteur", password="12345678"))
+    else:
+        client.force_login(user_1)
+    method, kwargs, data = routes[name]
+    # When the route is requested
+    with query_budget(QUERY_BUDGETS[name], f"forum:{name}"):
+        response = getattr(client, method)(reverse(f"forum:{name}", kwargs=kwargs), data)
+    # Then it is served within its budget
+    assert response.status_code in (200, 302)
+
+
+def add_categories(forum_1, **objects):
+    for i in range(1, ROWS):
+        category = Category.objects.create(name=f"Catégorie {i}", forum=forum_1, index=i)
+        SubCategory.objects.create(name=f"Sous catégorie {i}", category=category)
+
+
+def add_topics(forum_1, sub_category_1, **objects):
+    for account in new_members(forum_1, ROWS - 1):
+        topic = Topic.objects.create(title=f"Sujet de {account.user.username}", sub_category=sub_category_1,
+                                     account=account)
+        Message.objects.create(message="<p>Premier message</p>", account=account, topic=topic)
+
+
+def add_topic_messages(forum_1, topic_1, forum_master_account_1, **objects):
+    for account in new_members(forum_1, ROWS - 1):
+        message = Message.objects.create(message="<p>Un message</p>", account=account, topic=topic_1)
+        Like.like_unlike(liker=forum_master_account_1, message=message)
+
+
+def add_conversations(forum_1, forum_master_account_1, **objects):
+    for account in new_members(forum_1, ROWS - 1):
+        conversation = Conversation.objects.create(account=account, forum=forum_1, subject="Concert")
+        conversation.contacts.add(forum_master_account_1)
+        Message.objects.create(message="<p>Salut</p>", account=account, conversation=conversation, personal=True)
+
+
+def add_conversation_messages(forum_1, conversation_1, **objects):
+    for account in new_members(forum_1, ROWS - 1):
+        conversation_1.contacts.add(account)
+        Message.objects.create(message="<p>Salut</p>", account=account, conversation=conversation_1, personal=True)
+
+
+def add_members(forum_1, **objects):
+    for account in new_members(forum_1, ROWS - 1):
+        account.badges.set([])
+
+
+def add_search_results(forum_1, sub_category_1, **objects):
+    for account in new_members(forum_1, ROWS - 1):
+        topic = Topic.objects.create(title="Sujet message1", sub_category=sub_category_1, account=account)
+        Message.objects.create(message="<p>Réponse au message1</p>", account=account, topic=topic)
+    call_command("process_search_index")
+
+
+def add_notifications(forum_1, sub_category_1, forum_master_account_1, **objects):
+    for account in new_members(forum_1, ROWS - 1):
+        topic = Topic.objects.create(title="Sujet", sub_category=sub_category_1, account=forum_master_account_1)
+        message = Message.objects.create(message="<p>Réponse</p>", account=account, topic=topic)
+        Notification.objects.create(account=forum_master_account_1, topic=topic,
+                                    message=Notification.describe(message, 1))
+
+
+def add_member_messages(sub_category_1, forum_account_1, **objects):
+    for i in range(1, ROWS):
+        topic = Topic.objects.create(title=f"Sujet {i}", sub_category=sub_category_1, account=forum_account_1)
+        Message.objects.create(message="<p>Mon message</p>", account=forum_account_1, topic=topic)
+
+
+def add_own_messages(sub_category_1, forum_master_account_1, **objects):
+    add_member_messages(sub_category_1=sub_category_1, forum_account_1=forum_master_account_1)
+
+
+# The pages listing rows, with the function adding rows to what they display
+LIST_PAGES = {
+    "index": add_categories,
+    "sub-category": add_topics,
+    "topic": add_topic_messages,
+    "private-messaging": add_conversations,
+    "conversation": add_conversation_messages,
+    "members-list": add_members,
+    "admin-members": add_members,
+    "query": add_search_results,
+    "alerts": add_notifications,
+    "member": add_member_messages,
+    "profile": add_own_messages,
+    "builder": add_categories,
+}
+
+
+@pytest.mark.parametrize("name", sorted(LIST_PAGES))
+def test_list_page_queries_do_not_grow_with_rows(client, user_1, routes, assert_constant_queries, forum_1,
+                                                 forum_master_account_1, forum_account_1, sub_category_1, topic_1,
+                                                 conversation_1, name):
+    # Given a list page displaying a single row
+    client.force_login(user_1)
+    _, kwargs, data = routes[name]
+    url = reverse(f"forum:{name}", kwargs=kwargs)
+    # When it displays a full page of rows instead
+    # Then it issues the same number of queries
+    assert_constant_queries(
+        lambda: client.get(url, data),
+        lambda: LIST_PAGES[name](forum_1=forum_1, forum_master_account_1=forum_master_account_1,
+                                 forum_account_1=forum_account_1, sub_category_1=sub_category_1, topic_1=topic_1,
+                                 conversation_1=conversation_1),
+        f"forum:{name}")
@@ -0,0 +1,112 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from PIL import Image
+from django.core.management import call_command
+
+from platforum_project.func.staticfiles import PrecompressedStaticFilesWSGI, PrecompressedStaticFilesASGI
+
+
+@pytest.fixture
+def collected_static(settings, tmp_path):
+    """
+        Collects a style sheet and the image it uses with the precompressing storage, returns the collected directory.
+        """
+    source = tmp_path / "static"
+    (source / "css").mkdir(parents=True)
+    (source / "css" / "style.css").write_text("body { background: url('../logo.png'); }\n" * 50)
+    image = Image.new("RGB", (200, 200), "white")
+    image.putpixel((0, 0), (255, 0, 0))
+    image.save(source / "logo.png", compress_level=0)
+    settings.STATICFILES_DIRS = [source]
+    settings.STATICFILES_FINDERS = ["django.contrib.staticfiles.finders.FileSystemFinder"]
+    settings.STATIC_ROOT = tmp_path / "collected"
+    settings.STORAGES = {**settings.STORAGES, "staticfiles": {
+        "BACKEND": "platforum_project.func.staticfiles.CompressedManifestStaticFilesStorage"}}
+    call_command("collectstatic", interactive=False, verbosity=0)
+    return settings.STATIC_ROOT
+
+
+def test_collectstatic_hashes_and_precompresses_the_static_files(collected_static, tmp_path):
+    # Given the collected files
+    paths = json.loads((collected_static / "staticfiles.json").read_text())["paths"]
+    # Then the style sheet has a hashed name, references the hashed image and has a gzip copy
+    style = collected_static / paths["css/style.css"]
+    assert paths["logo.png"] in style.read_text()
+    assert gzip.decompress((collected_static / f"{paths['css/style.css']}.gz").read_bytes()) == style.read_bytes()
+    # And the image is recompressed without losing a pixel
+    logo = collected_static / paths["logo.png"]
+    assert logo.stat().st_size < (tmp_path / "static" / "logo.png").stat().st_size
+    with Image.open(logo) as image:
+        assert image.getpixel((0, 0)) == (255, 0, 0) and image.getpixel((1, 1)) == (255, 255, 255)
+    assert not (collected_static / f"{paths['logo.png']}.gz").exists()
+
+
+def application(environ, start_response):
+    start_response("200 OK", [])
+    return [b"application"]
+
+
+def wsgi_get(app, path, method="GET", **headers):
+    response = {}
+    body = app({"REQUEST_METHOD": method, "PATH_INFO": path, **headers},
+               lambda status, headers: response.update(status=status, headers=dict(headers)))
+    return response["status"], response["headers"], b"".join(body)
+
+
+def test_static_files_are_served_precompressed_with_far_future_headers(collected_static):
+    # Given the WSGI layer in front of the application
+    app = PrecompressedStaticFilesWSGI(application)
+    paths = json.loads((collected_static / "staticfiles.json").read_text())["paths"]
+    url = f"/static/{paths['css/style.css']}"
+    # When a client accepting gzip requests the hashed style sheet
+    status, headers, body = wsgi_get(app, url, HTTP_ACCEPT_ENCODING="br;q=0, gzip")
+    # Then it gets the gzip copy, cached for a year
+    assert status == "200 OK" and headers["Content-Encoding"] == "gzip"
+    assert headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert gzip.decompress(body) == (collected_static / paths["css/style.css"]).read_bytes()
+    gzip_etag = headers["ETag"]
+    # And the other clients the file itself, the unhashed names being revalidated
+    status, headers, body = wsgi_get(app, "/static/css/style.css", HTTP_ACCEPT_ENCODING="gzip;q=0")
+    assert "Content-Encoding" not in headers and headers["Cache-Control"] == "public, max-age=60"
+    assert int(headers["Content-Length"]) == len(body)
+    assert wsgi_get(app, url, HTTP_IF_NONE_MATCH=headers["ETag"])[0] != "304 Not Modified"
+    assert wsgi_get(app, "/static/css/style.css", HTTP_IF_NONE_MATCH=headers["ETag"])[0] == "304 Not Modified"
+    # And each copy is validated with its own ETag
+    status, headers, _ = wsgi_get(app, url, HTTP_ACCEPT_ENCODING="identity")
+    assert headers["ETag"] != gzip_etag
+    assert wsgi_get(app, url, HTTP_IF_NONE_MATCH=gzip_etag)[0] == "200 OK"
+    assert wsgi_get(app, url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=gzip_etag)[0] == "304 Not Modified"
+    assert wsgi_get(app, url, method="HEAD")[2] == b""
+    # And the other requests reach the application
+    assert wsgi_get(app, "/forum/")[2] == b"application"
+    assert wsgi_get(app, "/static/absent.css")[2] == b"application"
+
+
+def test_static_files_are_served_by_the_asgi_layer(collected_static):
+    # Given the ASGI layer in front of the application
+    async def asgi_application(scope, receive, send):
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b"application"})
+
+    app = PrecompressedStaticFilesASGI(asgi_application)
+    paths = json.loads((collected_static / "staticfiles.json").read_text())["paths"]
+
+    async def get(path):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": [(b"accept-encoding", b"gzip")]}
+        await app(scope, None, send)
+        return messages[0], b"".join(message.get("body", b"") for message in messages[1:])
+
+    # When the image and a page are requested
+    start, body = asyncio.run(get(f"/static/{paths['logo.png']}"))
+    # Then the image is served from the disk, the page by the application
+    assert start["status"] == 200 and (b"content-type", b"image/png") in start["headers"]
+    assert body == (collected_static / paths["logo.png"]).read_bytes()
+    assert asyncio.run(get("/forum/"))[1] == b"application"
@@ -1,10 +1,16 @@
 import pytest
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from pytest_django.asserts import assertRedirects, assertContains, assertNotContains
 
+from account.models import CustomUser
 from forum.default_data.messages import welcome_message
-from forum.models import Forum, Theme, ForumAccount, Category, SubCategory, Topic, Message
+from forum.models import Forum, Theme, ForumAccount, Category, SubCategory, Topic, Message, Like, Conversation, \
+    Notification, NotificationEvent, ForumDailyStats, DeletionJob
+from platforum_project.func.fragments import fragment_cache
 
 
 @pytest.mark.django_db
@@ -112,6 +118,19 @@ def test_index_admin_view_if_forum_master(client: Client, forum_1, user_1, forum
     assert response.status_code == 200
 
 
+def test_index_admin_view_shows_counts_and_trends(client: Client, forum_1, user_1, forum_master_account_1, message_1):
+    # Given a forum whose activity is rolled up
+    call_command("rollup_forum_stats")
+    client.force_login(user_1)
+    # When the forum master gets the trends of the last 90 days
+    response = client.get(reverse("forum:admin-index", args=[forum_1.slug, forum_1.pk]), {"days": 90})
+    # Then the page shows the numbers of the forum and a bar per day
+    assert response.context["counts"] == {"active_members": 1, "banned_members": 0, "topics": 1, "messages": 1}
+    assertContains(response, "Activité des 90 derniers jours")
+    assertContains(response, 'class="trend-bar"', count=90 * len(ForumDailyStats.METRICS))
+    assert [trend["total"] for trend in response.context["trends"]] == [1, 1, 1, 0, 1]
+
+
 def test_pin_topic_if_not_forum_master_account(client: Client, forum_1, forum_account_1, user_2, topic_1):
     # Given an user with no forum master status
     client.force_login(user_2)
@@ -132,3 +151,316 @@ def test_pin_topic_if_forum_master(client: Client, forum_1, user_1, forum_master
     topic_1.refresh_from_db()
     assert response.status_code == 302
     assert topic_1.pin is True
+
+
+def test_index_forum_view_queries_do_not_depend_on_sub_categories(client: Client, forum_1, user_2, forum_account_1,
+                                                                   category_1, sub_category_1, message_1, badges,
+                                                                   django_assert_num_queries):
+    # Given a forum with one sub-category
+    client.force_login(user_2)
+    url = reverse("forum:index", args=[forum_1.slug, forum_1.pk])
+    client.get(url)
+    with CaptureQueriesContext(connection) as one_sub_category:
+        client.get(url)
+    # When the forum grows with more sub-categories, topics and messages
+    for i in range(5):
+        sub_category = SubCategory.objects.create(name=f"Sous catégorie {i}", category=category_1)
+        topic = Topic.objects.create(title=f"Sujet {i}", sub_category=sub_category, account=forum_account_1)
+        Message.objects.create(message="Hello", account=forum_account_1, topic=topic)
+    # Then the index page still renders with the same number of queries
+    with django_assert_num_queries(len(one_sub_category)):
+        response = client.get(url)
+    assertContains(response, "Sujet 4")
+
+
+def test_builder_view_queries(client: Client, forum_1, user_1, forum_master_account_1, category_1, sub_category_1,
+                              django_assert_num_queries):
+    # Given a forum master and a forum with several categories
+    for i in range(3):
+        category = Category.objects.create(name=f"Catégorie {i}", forum=forum_1)
+        SubCategory.objects.create(name=f"Sous catégorie {i}", category=category)
+    client.force_login(user_1)
+    # When the builder is displayed
+    # Then the whole tree and the pending deletions are loaded with a fixed number of queries
+    with django_assert_num_queries(7):
+        response = client.get(reverse("forum:builder", args=[forum_1.slug, forum_1.pk]))
+    assertContains(response, "Sous catégorie 2")
+
+
+def test_index_forum_view_does_not_touch_badges(client: Client, forum_1, user_2, forum_account_1, badges):
+    # Given a member
+    client.force_login(user_2)
+    # When they open the forum index
+    with CaptureQueriesContext(connection) as queries:
+        client.get(reverse("forum:index", args=[forum_1.slug, forum_1.pk]))
+    # Then no badge is queried
+    assert not [query for query in queries if "badge" in query["sql"]]
+
+
+def test_topic_view_keyset_pagination(client: Client, forum_1, user_1, forum_master_account_1, sub_category_1,
+                                      topic_1):
+    # Given a topic with 25 messages
+    for i in range(25):
+        Message.objects.create(message=f"<p>message-{i:02}</p>", account=forum_master_account_1, topic=topic_1)
+    client.force_login(user_1)
+    url = reverse("forum:topic", args=[forum_1.slug, forum_1.pk, sub_category_1.pk, sub_category_1.slug,
+                                       topic_1.pk, topic_1.slug])
+    # When the member walks through the pages, uncached
+    client.get(url)
+    fragment_cache().clear()
+    with CaptureQueriesContext(connection) as first_queries:
+        first = client.get(url)
+    first_queries = [query["sql"] for query in first_queries]
+    fragment_cache().clear()
+    with CaptureQueriesContext(connection) as second_queries:
+        second = client.get(url, {"cursor": first.context["page_obj"].next_cursor})
+    second_queries = [query["sql"] for query in second_queries]
+    last = client.get(url, {"cursor": first.context["page_obj"].last_cursor})
+    previous = client.get(url, {"cursor": second.context["page_obj"].previous_cursor})
+    # Then each page has the expected messages, and the count comes from the topic
+    assert [m.message for m in second.context["page_obj"]][0] == "<p>message-10</p>"
+    assert [m.message for m in last.context["page_obj"]][-1] == "<p>message-24</p>"
+    assert not last.context["page_obj"].has_next()
+    assert [m.pk for m in previous.context["page_obj"]] == [m.pk for m in first.context["page_obj"]]
+    assertContains(first, "25 message(s) sur 3 page(s)")
+    assert first_queries and len(second_queries) == len(first_queries)
+    assert not [sql for sql in first_queries + second_queries
+                if "OFFSET" in sql or sql.startswith('SELECT COUNT(*) AS "__count" FROM "forum_message"')]
+    # And an invalid cursor falls back to the first page
+    assert client.get(url, {"cursor": "nope"}).context["page_obj"].object_list == first.context["page_obj"].object_list
+
+
+def test_topic_view_queries_do_not_depend_on_page_size(client: Client, forum_1, user_1, forum_master_account_1,
+                                                       forum_account_1, sub_category_1, topic_1):
+    # Given a topic with a single message
+    Message.objects.create(message="<p>seul</p>", account=forum_account_1, topic=topic_1)
+    client.force_login(user_1)
+    url = reverse("forum:topic", args=[forum_1.slug, forum_1.pk, sub_category_1.pk, sub_category_1.slug,
+                                       topic_1.pk, topic_1.slug])
+    client.get(url)
+    with CaptureQueriesContext(connection) as one_message:
+        client.get(url)
+    one_message = len(one_message)
+    # When the topic gets a full page of liked messages
+    for i in range(9):
+        message = Message.objects.create(message=f"<p>message-{i}</p>", account=forum_master_account_1,
+                                         topic=topic_1)
+        Like.like_unlike(liker=forum_master_account_1, message=message)
+    client.get(url)
+    with CaptureQueriesContext(connection) as full_page:
+        response = client.get(url)
+    # Then the page is rendered with the same number of queries
+    assert len(full_page) == one_message
+    assert sorted(response.context["liked_messages"]) == sorted(
+        Like.objects.filter(liker=forum_master_account_1).values_list("message_id", flat=True))
+    assert [message.like_count for message in response.context["page_obj"]] == [0] + [1] * 9
+
+
+def test_query_view_searches_the_forum(client: Client, forum_1, user_1, forum_master_account_1, topic_1):
+    # Given a message in the forum
+    message = Message.objects.create(message="<p>Un riff de guitare</p>", account=forum_master_account_1,
+                                     topic=topic_1)
+    call_command("process_search_index")
+    client.force_login(user_1)
+    # When a member searches for it
+    response = client.get(reverse("forum:query", args=[forum_1.slug, forum_1.pk]), {"query": "guitares"})
+    # Then it is found
+    assert list(response.context["page_obj"]) == [message]
+    assertContains(response, topic_1.get_absolute_url())
+
+
+def test_forum_and_account_are_resolved_once_per_request(client: Client, forum_1, user_2, forum_account_1):
+    # Given a member
+    client.force_login(user_2)
+    # When they open a page checking their account
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(reverse("forum:alerts", args=[forum_1.slug, forum_1.pk]))
+    queries = [query["sql"] for query in queries]
+    # Then their account is queried once, and the forum master comes with the forum
+    assert response.status_code == 200
+    assert len([sql for sql in queries if sql.startswith('SELECT "forum_forumaccount"')]) == 1
+    assert len([sql for sql in queries if 'FROM "forum_forum"' in sql]) == 1
+    assertContains(response, forum_1.forum_master.username)
+
+
+def test_sub_category_view_lists_pinned_topics_first_in_one_query(client: Client, forum_1, user_1,
+                                                                  forum_master_account_1, sub_category_1):
+    # Given a sub-category with a pinned topic and commented topics
+    pinned = Topic.objects.create(title="Règles", sub_category=sub_category_1, account=forum_master_account_1)
+    pinned.pin_topic()
+    topics = [Topic.objects.create(title=f"Sujet {i}", sub_category=sub_category_1, account=forum_master_account_1)
+              for i in range(3)]
+    for topic in topics:
+        Message.objects.create(message="<p>message</p>", account=forum_master_account_1, topic=topic)
+    client.force_login(user_1)
+    url = reverse("forum:sub-category", args=[forum_1.slug, forum_1.pk, sub_category_1.pk, sub_category_1.slug])
+    client.get(url)
+    # When the sub-category is displayed
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    # Then the pinned topic comes first, then the most recently active ones, from a single topic query
+    assert list(response.context["page_obj"]) == [pinned] + topics[::-1]
+    assert len([query for query in queries if 'FROM "forum_topic"' in query["sql"]]) == 2  # count + page
+    assertContains(response, "gab")
+
+
+def test_members_list_queries_do_not_depend_on_members(client: Client, forum_1, user_1, forum_master_account_1, badges):
+    # Given a forum with a single member
+    client.force_login(user_1)
+    url = reverse("forum:members-list", args=[forum_1.slug, forum_1.pk])
+    client.get(url)
+    with CaptureQueriesContext(connection) as one_member:
+        client.get(url)
+    # When many members with badges and messages join
+    for i in range(25):
+        user = CustomUser.objects.create_user(username=f"Élise{i:02}", email=f"{i}@e.com", first_name="É",
+                                              last_name="L", password="12345678")
+        ForumAccount.objects.create(forum=forum_1, user=user)
+    client.get(url)
+    with CaptureQueriesContext(connection) as many_members:
+        response = client.get(url)
+    # Then the first page is rendered with the same number of queries, sorted by username
+    assert len(many_members) == len(one_member)
+    page = response.context["page_obj"]
+    assert [member.user.username for member in page] == [f"Élise{i:02}" for i in range(20)]
+    assert page.has_next()
+    # And the next page continues after the last member
+    response = client.get(url, {"cursor": page.next_cursor})
+    assert [member.user.username for member in response.context["page_obj"]] == (
+            [f"Élise{i:02}" for i in range(20, 25)] + ["gab"])
+
+
+def test_members_list_searches_by_username_prefix(client: Client, forum_1, user_1, forum_master_account_1, user_2,
+                                                   forum_account_1):
+    # Given two members
+    client.force_login(user_1)
+    # When a member searches for the beginning of a username, whatever the case
+    response = client.get(reverse("forum:members-list", args=[forum_1.slug, forum_1.pk]), {"search": "PA"})
+    # Then only the matching member is listed
+    assert list(response.context["page_obj"]) == [forum_account_1]
+
+
+def test_opening_a_conversation_marks_it_as_read(client: Client, forum_1, user_2, forum_account_1,
+                                                  forum_master_account_1):
+    # Given a member with an unread message in a conversation
+    conversation = Conversation.objects.create(account=forum_master_account_1, forum=forum_1, subject="MP")
+    conversation.contacts.add(forum_account_1)
+    Message.objects.create(message="Salut", account=forum_master_account_1, conversation=conversation, personal=True)
+    client.force_login(user_2)
+    inbox = reverse("forum:private-messaging", args=[forum_1.slug, forum_1.pk])
+    assert client.get(inbox).context["unread"] == 1
+    # When they open it
+    client.get(conversation.get_absolute_url())
+    # Then it is no longer unread
+    response = client.get(inbox)
+    assert response.context["unread"] == 0
+    assertContains(response, "MP")
+
+
+def test_topic_pages_are_cached_per_version_with_the_controls_of_each_viewer(client: Client, forum_1, user_2,
+                                                                              forum_master_account_1, forum_account_1,
+                                                                              sub_category_1, topic_1):
+    # Given a topic with a message of a member, displayed once
+    message = Message.objects.create(message="<p>Premier riff</p>", account=forum_account_1, topic=topic_1)
+    reader = CustomUser.objects.create_user(username="lea", email="l@l.com", first_name="Léa", last_name="L",
+                                            password="12345678")
+    ForumAccount.objects.create(forum=forum_1, user=reader)
+    url = reverse("forum:topic", args=[forum_1.slug, forum_1.pk, sub_category_1.pk, sub_category_1.slug,
+                                       topic_1.pk, topic_1.slug])
+    edit = reverse("forum:update-message", args=[forum_1.slug, forum_1.pk, sub_category_1.pk, sub_category_1.slug,
+                                                 topic_1.pk, topic_1.slug, message.pk])
+    client.force_login(user_2)
+    client.get(url)
+    # When it is displayed again, by its author then by another member
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    client.force_login(reader)
+    other = client.get(url)
+    # Then the messages come from the cache, with the controls of each viewer
+    assert not [query for query in queries if 'FROM "forum_message"' in query["sql"]]
+    assertContains(response, "Premier riff")
+    assertContains(response, edit)
+    assertContains(other, "Premier riff")
+    assertNotContains(other, edit)
+    # And an edit, a like or a new message shows up at once
+    message.message = "<p>Riff corrigé</p>"
+    message.save()
+    Like.like_unlike(liker=forum_master_account_1, message=message)
+    Message.objects.create(message="<p>Second riff</p>", account=forum_master_account_1, topic=topic_1)
+    response = client.get(url)
+    assertContains(response, "Riff corrigé")
+    assertContains(response, "Second riff")
+    assert [message.like_count for message in response.context["page_obj"]] == [1, 0]
+    topic_1.refresh_from_db()
+    assert topic_1.version == 4
+
+
+def test_posting_a_reply_queues_its_notification(client: Client, forum_1, user_2, forum_account_1,
+                                                 forum_master_account_1, sub_category_1, topic_1):
+    # Given a member replying to the topic of the forum master
+    client.force_login(user_2)
+    url = reverse("forum:topic", args=[forum_1.slug, forum_1.pk, sub_category_1.pk, sub_category_1.slug,
+                                       topic_1.pk, topic_1.slug])
+    # When the reply is posted
+    client.post(url, data={"message": "<p>Réponse</p>"})
+    # Then the notification is queued, and delivered by the worker
+    assert NotificationEvent.objects.count() == 1 and not Notification.objects.exists()
+    call_command("process_notifications")
+    assert Notification.objects.get(account=forum_master_account_1).count == 1
+
+
+def test_deleted_category_is_hidden_then_purged_in_batches(client: Client, forum_1, user_1, forum_master_account_1,
+                                                            forum_account_1, category_1, sub_category_1, topic_1,
+                                                            message_1):
+    # Given a category whose topic has three messages, one of them liked
+    client.force_login(user_1)
+    reply = Message.objects.create(message="<p>Réponse</p>", account=forum_account_1, topic=topic_1)
+    Message.objects.create(message="<p>Encore</p>", account=forum_account_1, topic=topic_1)
+    Like.like_unlike(liker=forum_master_account_1, message=reply)
+    # When the forum master deletes the category
+    response = client.post(reverse("forum:delete-category-admin", args=[forum_1.pk, category_1.pk]))
+    # Then it is hidden at once, with its content, but nothing is deleted yet
+    assertRedirects(response, reverse("forum:builder", args=[forum_1.slug, forum_1.pk]))
+    assertNotContains(client.get(reverse("forum:index", args=[forum_1.slug, forum_1.pk])), sub_category_1.name)
+    assert client.get(topic_1.get_absolute_url()).status_code == 404
+    assert Forum.objects.get(pk=forum_1.pk).counts()["messages"] == 0
+    assert Message.objects.filter(topic=topic_1).count() == 3
+    assertContains(client.get(reverse("forum:builder", args=[forum_1.slug, forum_1.pk])), "Suppressions en cours")
+    # And the worker then purges it by batches of 2 messages, reporting its progress
+    call_command("purge_deletions", batch_size=2)
+    job = DeletionJob.objects.get()
+    assert (job.total, job.deleted, job.progress) == (4, 4, 100)
+    assert not Category.objects.filter(pk=category_1.pk).exists()
+    assert not Topic.objects.filter(pk=topic_1.pk).exists() and not Like.objects.exists()
+    assert ForumAccount.objects.get(pk=forum_account_1.pk).likes_received == 0
+
+
+@pytest.mark.urls("platforum_project.urls_async")
+def test_async_views_render_the_same_pages(client: Client, forum_1, user_1, forum_master_account_1,
+                                           sub_category_1, topic_1):
+    # Given a forum served by the async views, with a message
+    Message.objects.create(message="<p>Un riff de guitare</p>", account=forum_master_account_1, topic=topic_1)
+    call_command("process_search_index")
+    urls = {
+        "forum/index.html": reverse("forum:index", args=[forum_1.slug, forum_1.pk]),
+        "forum/sub-category.html": reverse("forum:sub-category", args=[forum_1.slug, forum_1.pk, sub_category_1.pk,
+                                                                       sub_category_1.slug]),
+        "forum/topic.html": topic_1.get_absolute_url(),
+        "search/request.html": reverse("forum:query", args=[forum_1.slug, forum_1.pk]) + "?query=guitare",
+        "forum/members-list.html": reverse("forum:members-list", args=[forum_1.slug, forum_1.pk]),
+    }
+    # When an anonymous user opens them
+    # Then they are sent to the login page
+    assert all(client.get(url).status_code == 302 for url in urls.values())
+    # When a member opens them
+    client.force_login(user_1)
+    for template, url in urls.items():
+        response = client.get(url)
+        # Then they are rendered by the async views
+        assert response.status_code == 200
+        assert template in [t.name for t in response.templates]
+        assert response.resolver_match.func.__name__.startswith("async_")
+    assertContains(client.get(urls["forum/topic.html"]), "Un riff de guitare")
+    # And replies are still posted
+    client.post(urls["forum/topic.html"], data={"message": "<p>Réponse</p>"})
+    assert Message.objects.filter(topic=topic_1, message="<p>Réponse</p>").exists()
@@ -0,0 +1,21 @@
+"""
+    The forum routes of forum/urls.py, with the read-heavy pages served by their async views (see
+    forum/views/asynchronous.py).
+"""
+from django.urls import path
+
+from . import urls
+from .views.asynchronous import async_index, async_sub_category_view, async_topic_view, async_query_view, \
+    async_members_list_view
+
+ASYNC_VIEWS = {
+    "index": async_index,
+    "sub-category": async_sub_category_view,
+    "topic": async_topic_view,
+    "query": async_query_view,
+    "members-list": async_members_list_view,
+}
+
+app_name = urls.app_name
+urlpatterns = [path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+               for pattern in urls.urlpatterns]
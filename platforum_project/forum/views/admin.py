@@ -4,23 +4,26 @@ from django.forms import model_to_dict
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 
-from account.models import CustomUser
 from forum.forms import CreateCategory, CategoryForm, SubCategoryForm, ForumUpdateThumbnail, TopicUpdateForm, \
     NewSubCategoryForm
-from forum.models import Forum, Topic, ForumAccount, Category, SubCategory, Message
+from forum.models import Topic, ForumAccount, Category, SubCategory, ForumDailyStats, DeletionJob
+from platforum_project.func.decorators import forum_view
+from platforum_project.func.pagination import KeysetPaginator
 from platforum_project.func.security import verify_forum_master_status
 
 
 @login_required
+@forum_view
 def index_admin_view(request, slug_forum, pk_forum):
     """
         Displays the admin view for a specific forum.
 
         This view function is accessible only to administrators of the forum. It retrieves the forum based on the provided
         primary key and slug. It checks if the logged-in user has an associated forum account and verifies their forum
-        master status. The function gathers data about active and banned members, topics, and messages of the forum. If
-        a POST request is made, it allows for updating the forum's thumbnail. The gathered data is then passed to the
-        admin forum template for rendering.
+        master status. The function counts the active and banned members, topics, and messages of the forum in a single
+        query (see 'Forum.counts'), and reads the daily activity of the last 30 or 90 days ("days" parameter) from the
+        rolled up statistics (see ForumDailyStats). If a POST request is made, it allows for updating the forum's
+        thumbnail. The gathered data is then passed to the admin forum template for rendering.
 
         Args:
             request: The HTTP request object.
@@ -29,17 +32,13 @@ def index_admin_view(request, slug_forum, pk_forum):
 
         Returns:
             HttpResponse: Renders the admin forum page with context data including the forum, account, form for thumbnail
-            update, and lists of active members, banned members, topics, and messages.
+            update, the numbers of active members, banned members, topics, and messages, and the trends.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     verify_forum_master_status(account)
 
-    active_members = ForumAccount.objects.filter(forum=forum, active=True)
-    ban_members = ForumAccount.objects.filter(forum=forum, active=False)
-    topics = Topic.objects.filter(sub_category__category__forum=forum)
-    messages = Message.objects.filter(topic__sub_category__category__forum=forum)
+    days = 90 if request.GET.get("days") == "90" else 30
 
     if request.method == "POST":
         form = ForumUpdateThumbnail(request.POST, request.FILES, instance=forum)
@@ -49,13 +48,13 @@ def index_admin_view(request, slug_forum, pk_forum):
     else:
         form = ForumUpdateThumbnail()
     return render(request, "admin-forum/index.html", context={"forum": forum, "account": account, "form": form,
-                                                              "active_members": active_members,
-                                                              "ban_members": ban_members, "topics": topics,
-                                                              "messages": messages})
+                                                              "counts": forum.counts(), "days": days,
+                                                              "trends": ForumDailyStats.trends(forum, days)})
 
 
 @login_required
 @require_POST
+@forum_view
 def pin_topic(request, pk_forum, pk_topic):
     """
         Handles the pinning or unpinning of a topic within a forum.
@@ -73,10 +72,9 @@ def pin_topic(request, pk_forum, pk_topic):
         Returns:
             HttpResponse: Redirects to the sub-category page of the topic after toggling its pinned status.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
-    topic = get_object_or_404(Topic, pk=pk_topic)
+    forum = request.forum
+    account = request.forum_account
+    topic = get_object_or_404(Topic, pk=pk_topic, hidden=False)
     verify_forum_master_status(account)
     topic.pin_topic() if not topic.pin else topic.unpin_topic()
     return redirect("forum:sub-category", slug_forum=forum.slug, pk_forum=forum.pk,
@@ -84,13 +82,15 @@ def pin_topic(request, pk_forum, pk_topic):
 
 
 @login_required
+@forum_view
 def display_members(request, slug_forum, pk_forum):
     """
         Displays the member list for a specific forum.
 
         This view, intended for forum administrators, retrieves and displays a list of members of a specific forum. It
         checks the requesting user's forum account and their forum master status. The function also provides a search
-        functionality to filter members by username. The list of members excludes forum masters.
+        functionality to filter members by the beginning of their username. The list of members excludes forum masters,
+        is sorted by username and paginated with a cursor, 20 per page.
 
         Args:
             request: The HTTP request object, potentially containing a search query.
@@ -99,22 +99,26 @@ def display_members(request, slug_forum, pk_forum):
 
         Returns:
             HttpResponse: Renders the forum members page with context data including the forum, the user's forum account,
-            and the list of members (filtered by search query if provided).
+            the search and the page of members (filtered by search query if provided).
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     verify_forum_master_status(account)
-    members = ForumAccount.objects.filter(forum=forum, forum_master=False)
+    members = ForumAccount.objects.filter(forum=forum, forum_master=False).for_listing()
 
     search = request.GET.get("search")
     if search:
-        members = ForumAccount.objects.filter(forum=forum, forum_master=False, user__username__icontains=search)
-    return render(request, "admin-forum/members.html", context={"forum": forum, "account": account, "members": members})
+        members = members.search(search)
+    paginator = KeysetPaginator(members, 20, ordering=("username_key", "pk"))
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    return render(request, "admin-forum/members.html", context={"forum": forum, "account": account,
+                                                                "members": page_obj, "page_obj": page_obj,
+                                                                "search": search})
 
 
 @login_required
 @require_POST
+@forum_view
 def member_status_view(request, pk_forum, pk_member):
     """
        Toggles the active status of a forum member.
@@ -135,9 +139,8 @@ def member_status_view(request, pk_forum, pk_member):
        Raises:
            PermissionDenied: If the target member is a forum master.
        """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    verify_forum_master_status(account=user.retrieve_forum_account(forum))
+    forum = request.forum
+    verify_forum_master_status(account=request.forum_account)
     member_account: ForumAccount = get_object_or_404(ForumAccount, pk=pk_member)
     if member_account.forum_master:
         raise PermissionDenied()
@@ -149,13 +152,15 @@ def member_status_view(request, pk_forum, pk_member):
 
 
 @login_required
+@forum_view
 def builder_view(request, slug_forum, pk_forum):
     """
        Handles the creation of categories and sub-categories within a forum.
 
        This view is accessible only to forum masters. It displays existing categories and provides a form to create new
        categories and up to five sub-categories. The form data is used to create new Category and SubCategory objects
-       associated with the forum. After creation, it redirects to the same page to allow further creation.
+       associated with the forum. After creation, it redirects to the same page to allow further creation. The deletions
+       whose content is still being purged are listed with their progress.
 
        Args:
            request: The HTTP request object, either GET for displaying the form or POST for submitting the form.
@@ -166,11 +171,11 @@ def builder_view(request, slug_forum, pk_forum):
            HttpResponse: Renders the forum builder page with context data including the forum, user's forum account,
            existing categories, and the category creation form.
        """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     verify_forum_master_status(account)
-    categories = Category.objects.filter(forum=forum)
+    categories = Category.objects.tree_for(forum)
+    deletions = DeletionJob.objects.filter(forum=forum, finished__isnull=True).order_by("creation")
 
     if request.method == "POST":
         form = CreateCategory(request.POST)
@@ -188,10 +193,12 @@ def builder_view(request, slug_forum, pk_forum):
     return render(request, "admin-forum/builder.html", context={"forum": forum,
                                                                 "account": account,
                                                                 "categories": categories,
+                                                                "deletions": deletions,
                                                                 "form": form})
 
 
 @login_required
+@forum_view
 def add_sub_category(request, slug_forum, pk_forum, pk_category):
     """
         Handles the addition of a new sub-category to a specific category in a forum.
@@ -210,10 +217,9 @@ def add_sub_category(request, slug_forum, pk_forum, pk_category):
             HttpResponse: Renders the add sub-category page with context data including the forum, user's forum account,
             the parent category, and the sub-category creation form.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
-    category = get_object_or_404(Category, pk=pk_category)
+    forum = request.forum
+    account = request.forum_account
+    category = get_object_or_404(Category, pk=pk_category, hidden=False)
     verify_forum_master_status(account)
 
     if request.method == "POST":
@@ -231,13 +237,15 @@ def add_sub_category(request, slug_forum, pk_forum, pk_category):
 
 @login_required
 @require_POST
+@forum_view
 def delete_category_view(request, pk_forum, pk_category):
     """
         Handles the deletion of a category within a forum.
 
         This view is designed for forum masters to delete a specific category from a forum. It ensures that the request
         is a POST request and that the user has forum master status in the specified forum. Upon validation, the specified
-        category is deleted. After successful deletion, the function redirects to the forum builder page.
+        category is hidden along with its content, which the 'purge_deletions' command then deletes in batches (see
+        DeletionJob). The function then redirects to the forum builder page, which shows the progress of the deletion.
 
         Args:
             request: The HTTP POST request object.
@@ -247,23 +255,23 @@ def delete_category_view(request, pk_forum, pk_category):
         Returns:
             HttpResponse: Redirects to the forum builder page after deletion of the category.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    verify_forum_master_status(account=user.retrieve_forum_account(forum))
-    Category.objects.get(pk=pk_category).delete()
+    forum = request.forum
+    verify_forum_master_status(account=request.forum_account)
+    DeletionJob.request(get_object_or_404(Category, pk=pk_category, hidden=False), request.forum_account)
     return redirect("forum:builder", slug_forum=forum.slug, pk_forum=forum.pk)
 
 
 @login_required
 @require_POST
+@forum_view
 def delete_subcategory_view(request, pk_forum, pk_subcategory):
     """
        Handles the deletion of a sub-category within a forum.
 
        Accessible only to forum masters, this view enables the deletion of a specified sub-category from the forum.
        The function checks that the request is a POST request and that the user has the necessary forum master status.
-       It then deletes the sub-category identified by the primary key. Following the deletion, it redirects to the
-       forum builder page to continue forum management.
+       It then hides the sub-category identified by the primary key along with its content, which the 'purge_deletions'
+       command deletes in batches (see DeletionJob). It redirects to the forum builder page to continue forum management.
 
        Args:
            request: The HTTP POST request object.
@@ -273,14 +281,14 @@ def delete_subcategory_view(request, pk_forum, pk_subcategory):
        Returns:
            HttpResponse: Redirects to the forum builder page after the successful deletion of the sub-category.
        """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    verify_forum_master_status(account=user.retrieve_forum_account(forum))
-    SubCategory.objects.get(pk=pk_subcategory).delete()
+    forum = request.forum
+    verify_forum_master_status(account=request.forum_account)
+    DeletionJob.request(get_object_or_404(SubCategory, pk=pk_subcategory, hidden=False), request.forum_account)
     return redirect("forum:builder", slug_forum=forum.slug, pk_forum=forum.pk)
 
 
 @login_required
+@forum_view
 def update_category_view(request, slug_forum, pk_forum, pk_category):
     """
         Handles the updating of a category within a forum.
@@ -300,11 +308,10 @@ def update_category_view(request, slug_forum, pk_forum, pk_category):
             HttpResponse: Renders the category update page with context data including the forum, user's forum account,
             the category, and the category update form.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     verify_forum_master_status(account)
-    category = get_object_or_404(Category, pk=pk_category)
+    category = get_object_or_404(Category, pk=pk_category, hidden=False)
 
     if request.method == "POST":
         form = CategoryForm(request.POST, instance=category)
@@ -318,6 +325,7 @@ def update_category_view(request, slug_forum, pk_forum, pk_category):
 
 
 @login_required
+@forum_view
 def update_subcategory_view(request, slug_forum, pk_forum, pk_subcategory):
     """
         Handles the updating of a sub-category within a forum.
@@ -337,11 +345,10 @@ def update_subcategory_view(request, slug_forum, pk_forum, pk_subcategory):
             HttpResponse: Renders the sub-category update page with context data including the forum, user's forum account,
             the sub-category, and the sub-category update form.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     verify_forum_master_status(account)
-    subcategory = get_object_or_404(SubCategory, pk=pk_subcategory)
+    subcategory = get_object_or_404(SubCategory, pk=pk_subcategory, hidden=False)
 
     if request.method == "POST":
         form = SubCategoryForm(forum, request.POST, instance=subcategory)
@@ -355,6 +362,7 @@ def update_subcategory_view(request, slug_forum, pk_forum, pk_subcategory):
 
 
 @login_required
+@forum_view
 def update_topic(request, slug_forum, pk_forum, pk_topic):
     """
         Handles the updating of a forum topic.
@@ -374,11 +382,10 @@ def update_topic(request, slug_forum, pk_forum, pk_topic):
             HttpResponse: Renders the topic update page with context data including the forum, user's forum account,
             the topic, and the topic update form.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     verify_forum_master_status(account)
-    topic = get_object_or_404(Topic, pk=pk_topic)
+    topic = get_object_or_404(Topic, pk=pk_topic, hidden=False)
 
     if request.method == "POST":
         form = TopicUpdateForm(forum, request.POST, instance=topic)
@@ -393,14 +400,15 @@ def update_topic(request, slug_forum, pk_forum, pk_topic):
 
 @login_required
 @require_POST
+@forum_view
 def delete_topic_view(request, pk_forum, pk_topic):
     """
         Handles the deletion of a topic within a forum.
 
         This view, accessible only to forum masters, enables the deletion of a specific topic from the forum. It verifies
-        the forum master status of the requesting user and then proceeds to delete the topic identified by the primary key.
-        After deletion, the function redirects to the sub-category page of the deleted topic, maintaining the forum's
-        navigational context.
+        the forum master status of the requesting user and then hides the topic identified by the primary key, whose
+        messages the 'purge_deletions' command deletes in batches (see DeletionJob). The function then redirects to the
+        sub-category page of the deleted topic, maintaining the forum's navigational context.
 
         Args:
             request: The HTTP POST request object.
@@ -410,11 +418,10 @@ def delete_topic_view(request, pk_forum, pk_topic):
         Returns:
             HttpResponse: Redirects to the sub-category page of the deleted topic's forum after successful deletion.
         """
-    user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     verify_forum_master_status(account)
-    topic = get_object_or_404(Topic, pk=pk_topic)
-    topic.delete()
+    topic = get_object_or_404(Topic, pk=pk_topic, hidden=False)
+    DeletionJob.request(topic, account)
     return redirect("forum:sub-category", slug_forum=forum.slug, pk_forum=forum.pk, pk=topic.sub_category.pk,
                     slug_sub_category=topic.sub_category.slug)
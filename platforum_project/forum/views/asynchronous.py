@@ -0,0 +1,130 @@
+"""
+    Native async versions of the read-heavy forum views, served instead of the synchronous ones by the URLconf chosen
+    when the FORUM_ASYNC_VIEWS setting is enabled (see forum/urls_async.py), for deployments behind an ASGI server.
+
+    The independent queries of a page are awaited together with 'asyncio.gather', and the templates are rendered in a
+    thread since they may still read lazy relations. Django runs the queries of a request one after the other on a
+    single thread for now, so the gain is the event loop being free for the other requests while they run, not faster
+    pages. The forms stay synchronous: a POST is handed over to the synchronous view.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.shortcuts import render, redirect, aget_object_or_404
+
+from forum.models import Category, SubCategory, Topic, Message, ForumAccount, Like
+from forum.forms import PostMessage
+from platforum_project.func.decorators import async_login_required, forum_view
+from platforum_project.func.fragments import cached_topic_page, layer_message_controls
+from platforum_project.func.pagination import KeysetPaginator
+from platforum_project.func.search import get_search_backend
+from platforum_project.func.security import verify_active_forum_account
+from . import forum as sync_views
+
+arender = sync_to_async(render)
+
+
+@async_login_required
+@forum_view
+async def async_index(request, slug_forum, pk_forum):
+    """
+        Async version of 'index'.
+        """
+    forum = request.forum
+    categories = [category async for category in Category.objects.tree_for(forum, SubCategory.objects.with_stats())]
+    return await arender(request, "forum/index.html", context={"forum": forum, "categories": categories,
+                                                               "account": request.forum_account})
+
+
+@async_login_required
+@forum_view
+async def async_sub_category_view(request, pk, slug_forum, pk_forum, slug_sub_category):
+    """
+        Async version of 'sub_category_view': the sub-category and the page of topics are fetched concurrently.
+        """
+    topics = Topic.objects.filter(sub_category_id=pk, hidden=False).order_by("-pin", "-last_activity")
+    paginator = Paginator(topics, 10)
+    sub_category, page_obj = await asyncio.gather(aget_object_or_404(SubCategory, pk=pk, hidden=False),
+                                                  sync_to_async(paginator.get_page)(request.GET.get("page")))
+    page_obj.object_list = [topic async for topic in page_obj.object_list]
+    return await arender(request, "forum/sub-category.html", context={"sub_category": sub_category,
+                                                                      "forum": request.forum,
+                                                                      "topics": topics,
+                                                                      "account": request.forum_account,
+                                                                      "page_obj": page_obj})
+
+
+@async_login_required
+@forum_view
+async def async_topic_view(request, slug_forum, pk_forum, pk, slug_sub_category, pk_topic, slug_topic):
+    """
+        Async version of 'topic_view': the sub-category and the topic are fetched concurrently, then the page of
+        messages (usually from the cache, see 'cached_topic_page') and the likes of the member.
+        """
+    if request.method == "POST":
+        return await sync_to_async(sync_views.topic_view)(request, slug_forum=slug_forum, pk_forum=pk_forum, pk=pk,
+                                                          slug_sub_category=slug_sub_category, pk_topic=pk_topic,
+                                                          slug_topic=slug_topic)
+    account = request.forum_account
+    sub_category, topic = await asyncio.gather(aget_object_or_404(SubCategory, pk=pk, hidden=False),
+                                               aget_object_or_404(Topic, pk=pk_topic, hidden=False))
+    messages = Message.objects.filter(topic=topic).for_display()
+    paginator = KeysetPaginator(messages, 10, count=topic.message_count)
+    page_obj, chunks = await sync_to_async(cached_topic_page)(topic, paginator, request.GET.get("cursor"))
+    liked_messages = await Like.aliked_message_ids(account, page_obj)
+    context = {
+        "forum": request.forum,
+        "sub_category": sub_category,
+        "topic": topic,
+        "messages": messages,
+        "account": account,
+        "form": PostMessage(),
+        "page_obj": page_obj,
+        "liked_messages": liked_messages
+    }
+    context["messages_html"] = await sync_to_async(layer_message_controls)(chunks, page_obj, request, context)
+    return await arender(request, "forum/topic.html", context=context)
+
+
+@async_login_required
+@forum_view
+async def async_query_view(request, slug_forum, pk_forum):
+    """
+        Async version of 'query_view': the best topics and the page of messages are searched concurrently.
+        """
+    forum = request.forum
+    search = request.GET.get("query")
+    if not search:
+        return redirect("forum:index", slug_forum=forum.slug, pk_forum=forum.pk)
+    backend = get_search_backend()
+    paginator = Paginator(backend.search_messages(forum, search), 10)
+
+    async def best_topics():
+        return [topic async for topic in backend.search_topics(forum, search)[:10]]
+
+    topics, page_obj = await asyncio.gather(best_topics(), sync_to_async(paginator.get_page)(request.GET.get("page")))
+    page_obj.object_list = [message async for message in page_obj.object_list]
+    return await arender(request, "search/request.html", context={"forum": forum, "account": request.forum_account,
+                                                                  "topics": topics, "page_obj": page_obj,
+                                                                  "search": search})
+
+
+@async_login_required
+@forum_view
+async def async_members_list_view(request, slug_forum, pk_forum):
+    """
+        Async version of 'members_list_view'.
+        """
+    forum = request.forum
+    verify_active_forum_account(request.user, forum)
+    members = ForumAccount.objects.filter(forum=forum, active=True).for_listing()
+    search = request.GET.get("search")
+    if search:
+        members = members.search(search)
+    paginator = KeysetPaginator(members, 20, ordering=("username_key", "pk"))
+    page_obj = await sync_to_async(paginator.get_page)(request.GET.get("cursor"))
+    return await arender(request, "forum/members-list.html", context={"forum": forum,
+                                                                      "account": request.forum_account,
+                                                                      "members": page_obj, "page_obj": page_obj,
+                                                                      "search": search})
@@ -1,24 +1,29 @@
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
 from django.db import transaction
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 
 from account.models import CustomUser
+from platforum_project.func.decorators import forum_view
+from platforum_project.func.fragments import cached_topic_page, layer_message_controls
+from platforum_project.func.pagination import KeysetPaginator
+from platforum_project.func.search import get_search_backend
 from platforum_project.func.security import user_permission, verify_active_forum_account
-from forum.models import Forum, Category, SubCategory, Topic, Message, ForumAccount, Notification, Like
+from forum.models import Category, SubCategory, Topic, Message, ForumAccount, NotificationEvent, Like
 from forum.forms import CreateTopic, PostMessage
 
 
 @login_required
+@forum_view
 def index(request, slug_forum, pk_forum):
     """
        Displays the main page of a specific forum.
 
        This view, accessible only to logged-in users, retrieves and displays the main page of a specified forum based on
-       its primary key. It attempts to retrieve the user's account for this forum and, if found, updates the user's
-       badges using the 'badges_manager' method. The view also fetches and displays all categories within the forum.
+       its primary key and attempts to retrieve the user's account for this forum. The view also fetches and displays
+       all categories within the forum, with their sub-categories and the stored statistics of each sub-category, in a
+       constant number of queries. Badges are awarded when messages are posted and likes received, not here.
        If no account is associated with the user in this forum, the user's account details are not displayed.
 
        Args:
@@ -30,23 +35,22 @@ def index(request, slug_forum, pk_forum):
            HttpResponse: Renders the main page of the forum with context data including the forum, its categories,
            and the user's forum account (if present).
        """
-    user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account: ForumAccount = user.retrieve_forum_account(forum)
-    if account:
-        account.badges_manager()
-    categories = Category.objects.filter(forum=forum)
+    forum = request.forum
+    account: ForumAccount = request.forum_account
+    categories = Category.objects.tree_for(forum, SubCategory.objects.with_stats())
     return render(request, "forum/index.html", context={"forum": forum, "categories": categories, "account": account})
 
 
 @login_required
+@forum_view
 def sub_category_view(request, pk, slug_forum, pk_forum, slug_sub_category):
     """
        Displays the topics within a specific sub-category of a forum.
 
-       This view, available only to logged-in users, shows the topics under a particular sub-category of a forum. It
-       lists both pinned and regular topics separately. The topics are paginated with 10 topics per page. The view
-       retrieves the user's forum account for additional context, such as permissions or user-specific data.
+       This view, available only to logged-in users, shows the topics under a particular sub-category of a forum. The
+       pinned topics come first, then the most recently active ones, in a single query reading the last post columns
+       stored on each topic. The topics are paginated with 10 topics per page. The view retrieves the user's forum
+       account for additional context, such as permissions or user-specific data.
 
        Args:
            request: The HTTP request object.
@@ -57,25 +61,24 @@ def sub_category_view(request, pk, slug_forum, pk_forum, slug_sub_category):
 
        Returns:
            HttpResponse: Renders the sub-category page with context data including the sub-category, forum, topics,
-           pinned topics, user's forum account, and pagination object.
+           user's forum account, and pagination object.
        """
-    user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
-    sub_category = get_object_or_404(SubCategory, pk=pk)
-    topics = Topic.objects.filter(sub_category=sub_category, pin=False)
-    pin_topics = Topic.objects.filter(sub_category=sub_category, pin=True)
+    forum = request.forum
+    account = request.forum_account
+    sub_category = get_object_or_404(SubCategory, pk=pk, hidden=False)
+    topics = Topic.objects.filter(sub_category=sub_category, hidden=False).order_by("-pin", "-last_activity")
 
     paginator = Paginator(topics, 10)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     return render(request, "forum/sub-category.html", context={"sub_category": sub_category,
                                                                "forum": forum,
-                                                               "topics": topics, "pin_topics": pin_topics,
+                                                               "topics": topics,
                                                                "account": account, "page_obj": page_obj})
 
 
 @login_required
+@forum_view
 def add_topic(request, slug_forum, pk_forum, pk, slug_sub_category):
     """
         Handles the creation of a new topic within a sub-category of a forum.
@@ -97,10 +100,10 @@ def add_topic(request, slug_forum, pk_forum, pk, slug_sub_category):
             and user's forum account. Redirects to the new topic page upon successful creation.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
-    sub_category = get_object_or_404(SubCategory, pk=pk)
+    account = request.forum_account
+    sub_category = get_object_or_404(SubCategory, pk=pk, hidden=False)
 
     if request.method == "POST":
         form = CreateTopic(request.POST)
@@ -123,14 +126,18 @@ def add_topic(request, slug_forum, pk_forum, pk, slug_sub_category):
 
 
 @login_required
+@forum_view
 def topic_view(request, slug_forum, pk_forum, pk, slug_sub_category, pk_topic, slug_topic):
     """
         Displays a specific forum topic and its messages.
 
         This view, accessible to logged-in users, presents the details of a specific topic, including all associated
-        messages. The messages are paginated with 10 messages per page. It also provides a form for posting new messages
-        to the topic. Upon POST request with valid data, a new message is added to the topic, and a notification is
-        possibly sent to members following the topic.
+        messages. The messages are paginated with 10 messages per page, with a cursor on (creation, id) so that deep
+        pages are as fast as the first one. The authors, like counts and likes of the member are loaded per page, not
+        per message. The rendered messages of each page are cached per version of the topic, the controls of the
+        member are added on top of them (see platforum_project/func/fragments.py). It also provides a form for posting
+        new messages to the topic. Upon POST request with valid data, a new message is added to the topic, and its
+        notification is queued for the members following the topic (see the 'process_notifications' command).
 
         Args:
             request: The HTTP request object, either GET for displaying the topic and messages or POST for submitting
@@ -144,18 +151,19 @@ def topic_view(request, slug_forum, pk_forum, pk, slug_sub_category, pk_topic, s
 
         Returns:
             HttpResponse: Renders the topic page with context data including the forum, sub-category, topic, messages,
-            user's account, message posting form, and pagination object.
+            user's account, message posting form, pagination object, the ids of the messages liked by the user and the
+            HTML of the messages.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
-    sub_category = get_object_or_404(SubCategory, pk=pk)
-    topic = get_object_or_404(Topic, pk=pk_topic)
-    messages = Message.objects.filter(topic=topic)
+    forum = request.forum
+    account = request.forum_account
+    sub_category = get_object_or_404(SubCategory, pk=pk, hidden=False)
+    topic = get_object_or_404(Topic, pk=pk_topic, hidden=False)
+    messages = Message.objects.filter(topic=topic).for_display()
 
-    paginator = Paginator(messages, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(messages, 10, count=topic.message_count)
+    page_obj, chunks = cached_topic_page(topic, paginator, request.GET.get("cursor"))
+    liked_messages = Like.liked_message_ids(account, page_obj)
 
     if request.method == "POST":
         verify_active_forum_account(user, forum)
@@ -164,23 +172,28 @@ def topic_view(request, slug_forum, pk_forum, pk, slug_sub_category, pk_topic, s
             message = form.save(commit=False)
             message.topic = topic
             message.account = account
-            message.save()
-            Notification.notify_member_if_message_posted_in_topic(topic, account)
+            with transaction.atomic():
+                message.save()
+                NotificationEvent.queue(message)
             return redirect(topic)
     else:
         form = PostMessage()
-    return render(request, "forum/topic.html", context={
+    context = {
         "forum": forum,
         "sub_category": sub_category,
         "topic": topic,
         "messages": messages,
         "account": account,
         "form": form,
-        "page_obj": page_obj
-    })
+        "page_obj": page_obj,
+        "liked_messages": liked_messages
+    }
+    context["messages_html"] = layer_message_controls(chunks, page_obj, request, context)
+    return render(request, "forum/topic.html", context=context)
 
 
 @login_required
+@forum_view
 def like_unlike_view(request, pk_forum, pk_message):
     """
         Handles liking or unliking a forum message.
@@ -199,15 +212,17 @@ def like_unlike_view(request, pk_forum, pk_message):
             HttpResponse: Redirects to the topic page that contains the message.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
-    message = get_object_or_404(Message, pk=pk_message)
+    account = request.forum_account
+    message = get_object_or_404(Message.objects.select_related("account", "topic__sub_category__category__forum"),
+                                pk=pk_message)
     Like.like_unlike(liker=account, message=message)
     return redirect(message.topic)
 
 
 @login_required
+@forum_view
 def update_message(request, slug_forum, pk_forum, pk, slug_sub_category, pk_topic, slug_topic, pk_message):
     """
         Handles the updating of a specific message within a forum topic.
@@ -232,11 +247,11 @@ def update_message(request, slug_forum, pk_forum, pk, slug_sub_category, pk_topi
             message, form, and user's account.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    sub_category = get_object_or_404(SubCategory, pk=pk)
-    topic = get_object_or_404(Topic, pk=pk_topic)
+    forum = request.forum
+    sub_category = get_object_or_404(SubCategory, pk=pk, hidden=False)
+    topic = get_object_or_404(Topic, pk=pk_topic, hidden=False)
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
+    account = request.forum_account
     message = get_object_or_404(Message, pk=pk_message)
     user_permission(message, account)
 
@@ -259,6 +274,7 @@ def update_message(request, slug_forum, pk_forum, pk, slug_sub_category, pk_topi
 
 @login_required
 @require_POST
+@forum_view
 def delete_message(request, pk_forum, pk_topic, pk_message):
     """
        Handles the deletion of a specific message within a forum topic.
@@ -278,22 +294,25 @@ def delete_message(request, pk_forum, pk_topic, pk_message):
            HttpResponse: Redirects to the topic page containing the deleted message.
        """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
-    message = get_object_or_404(Message, pk=pk_message)
+    account = request.forum_account
+    message = get_object_or_404(Message.objects.select_related("account", "topic"), pk=pk_message)
     user_permission(message, account)
     message.delete()
-    return redirect(Topic.objects.get(pk=pk_topic))
+    return redirect(Topic.objects.select_related("sub_category__category__forum").get(pk=pk_topic))
 
 
 @login_required
+@forum_view
 def members_list_view(request, slug_forum, pk_forum):
     """
         Displays a list of active forum members.
 
         This view allows logged-in users to view a list of active members in a forum. It first verifies the user's
-        active account status in the forum. Users can also perform a search to filter members by username.
+        active account status in the forum. Users can also perform a search to filter members by the beginning of their
+        username. The members are sorted by username and paginated with a cursor, 20 per page, and the page is loaded
+        in a fixed number of queries whatever the number of members (see ForumAccountQuerySet.for_listing).
 
         Args:
             request: The HTTP request object.
@@ -301,23 +320,27 @@ def members_list_view(request, slug_forum, pk_forum):
             pk_forum: The primary key of the forum.
 
         Returns:
-            HttpResponse: Renders the members list page with context data including the forum, user's account, and
-            the list of active members.
+            HttpResponse: Renders the members list page with context data including the forum, user's account, the
+            search and the page of active members.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
-    members = ForumAccount.objects.filter(forum=forum, active=True)
+    account = request.forum_account
+    members = ForumAccount.objects.filter(forum=forum, active=True).for_listing()
 
     search = request.GET.get("search")
     if search:
-        members = ForumAccount.objects.filter(forum=forum, user__username__icontains=search)
-    return render(request, "forum/members-list.html", context={"forum": forum,
-                                                               "account": account, "members": members})
+        members = members.search(search)
+    paginator = KeysetPaginator(members, 20, ordering=("username_key", "pk"))
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    return render(request, "forum/members-list.html", context={"forum": forum, "account": account,
+                                                               "members": page_obj, "page_obj": page_obj,
+                                                               "search": search})
 
 
 @login_required
+@forum_view
 def member_view(request, slug_forum, pk_forum, pk_member):
     """
         Displays the profile and activity of a forum member.
@@ -336,24 +359,26 @@ def member_view(request, slug_forum, pk_forum, pk_member):
             the member's profile, and recent messages.
         """
     user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
+    account = request.forum_account
     member = get_object_or_404(ForumAccount, pk=pk_member)
-    last_messages = Message.objects.filter(account=member, topic__sub_category__category__forum=forum).order_by(
-        "-creation")[:5]
+    last_messages = Message.objects.filter(account=member, forum=forum, topic__hidden=False).select_related(
+        "topic__sub_category").order_by("-creation")[:5]
     return render(request, "forum/member.html", context={"forum": forum, "account": account,
                                                          "member": member, "messages": last_messages})
 
 
 @login_required
+@forum_view
 def query_view(request, slug_forum, pk_forum):
     """
         Displays search results for topics and messages within a forum.
 
         This view allows logged-in users to search for topics and messages within a forum based on a user's query.
-        It first verifies the user's active account status in the forum and then performs the search for topics and messages
-        matching the query.
+        The search is delegated to the configured search engine (see 'get_search_backend'), which only looks into the
+        current forum and ranks the results by relevance. The 10 best topics are displayed, and the messages are
+        paginated with 10 messages per page.
 
         Args:
             request: The HTTP request object.
@@ -362,21 +387,19 @@ def query_view(request, slug_forum, pk_forum):
 
         Returns:
             HttpResponse: Renders the search results page with context data including the forum, user's account,
-            search results for topics and messages.
+            search results for topics and messages, and the pagination object of the messages.
         """
-    user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
 
     search = request.GET.get("query")
     if search:
-        topics = Topic.objects.filter(title__icontains=search)
-        messages = Message.objects.filter(
-            Q(personal=False),
-            Q(message__icontains=search) | Q(topic__title__icontains=search)
-        )
+        backend = get_search_backend()
+        topics = backend.search_topics(forum, search)[:10]
+        paginator = Paginator(backend.search_messages(forum, search), 10)
+        page_obj = paginator.get_page(request.GET.get("page"))
 
     else:
         return redirect("forum:index", slug_forum=forum.slug, pk_forum=forum.pk)
     return render(request, "search/request.html", context={"forum": forum, "account": account,
-                                                           "topics": topics, "messages": messages, "search": search})
+                                                           "topics": topics, "page_obj": page_obj, "search": search})
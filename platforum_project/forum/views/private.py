@@ -1,18 +1,20 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.db import transaction
 
 from account.models import CustomUser
-from forum.models import Conversation, Forum, Message, ForumAccount, Notification
+from forum.models import Conversation, ConversationReadState, Message, ForumAccount, Notification, NotificationEvent
 from forum.forms import PostMessage, ProfileUpdateForm, SignupForumForm, ConversationForm
 
+from platforum_project.func.decorators import forum_view
+from platforum_project.func.pagination import KeysetPaginator
 from platforum_project.func.security import user_permission, verify_active_forum_account, \
     verify_account_for_private_conversation
 
 
 @login_required
+@forum_view
 def signup_forum(request, slug_forum, pk_forum):
     """
     Handles user registration for a specific forum.
@@ -30,8 +32,8 @@ def signup_forum(request, slug_forum, pk_forum):
         successful or if the user is already a member.
     """
     user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
+    forum = request.forum
+    account = request.forum_account
     if account:
         return redirect("forum:profile", pk_forum=forum.pk, slug_forum=forum.slug)
 
@@ -49,6 +51,7 @@ def signup_forum(request, slug_forum, pk_forum):
 
 
 @login_required
+@forum_view
 def start_conversation(request, slug_forum, pk_forum, pk_member):
     """
     Starts a private conversation with another forum member.
@@ -67,9 +70,9 @@ def start_conversation(request, slug_forum, pk_forum, pk_member):
         if the initiation is successful.
     """
     user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
+    account = request.forum_account
     member = get_object_or_404(ForumAccount, pk=pk_member)
 
     if request.method == "POST":
@@ -92,12 +95,14 @@ def start_conversation(request, slug_forum, pk_forum, pk_member):
 
 
 @login_required
+@forum_view
 def personal_messaging(request, slug_forum, pk_forum):
     """
     Displays the personal messaging interface for a forum user.
 
     This view allows a logged-in user to access their personal messaging interface within a forum. It lists the user's
-    own conversations and conversations they are a part of.
+    own conversations and conversations they are a part of, most recently active first, with their number of unread
+    messages, in a single query (see ConversationQuerySet.inbox).
 
     Args:
         request: The HTTP request object.
@@ -109,24 +114,25 @@ def personal_messaging(request, slug_forum, pk_forum):
          and forum details.
     """
     user: CustomUser = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
-    my_conversations = Conversation.objects.filter(forum=forum, account=account)
-    conversations = Conversation.objects.filter(forum=forum, contacts=account)
+    account = request.forum_account
+    conversations = list(Conversation.objects.inbox(account))
     return render(request, "private/personal-messaging.html", context={
-        "forum": forum,
-        "my_conversations": my_conversations, "conversations": conversations, "account": account
+        "forum": forum, "conversations": conversations, "account": account,
+        "unread": sum(conversation.unread for conversation in conversations)
     })
 
 
 @login_required
+@forum_view
 def conversation_view(request, slug_forum, pk_forum, slug_conversation, pk_conversation):
     """
         Render and handle private conversation view.
 
         This view renders the private conversation page, allowing users to view and post messages in a private conversation.
         It verifies the user's active forum account, checks permissions to access the conversation, and handles message posting.
+        The messages displayed, and the ones posted, are marked as read for the user (see ConversationReadState).
 
         Args:
             request: The HTTP request object.
@@ -139,16 +145,15 @@ def conversation_view(request, slug_forum, pk_forum, slug_conversation, pk_conve
             HttpResponse: Renders the private conversation page with context data.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    conversation = get_object_or_404(Conversation, pk=pk_conversation)
-    account = user.retrieve_forum_account(forum)
-    messages = Message.objects.filter(conversation=conversation)
-    contacts = conversation.contacts.all()
+    conversation = get_object_or_404(Conversation.objects.select_related("account__user"), pk=pk_conversation)
+    account = request.forum_account
+    messages = Message.objects.filter(conversation=conversation).for_display()
+    contacts = conversation.contacts.select_related("user")
 
-    paginator = Paginator(messages, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(messages, 10, count=conversation.message_count)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     verify_account_for_private_conversation(account, conversation, contacts)
 
@@ -157,17 +162,22 @@ def conversation_view(request, slug_forum, pk_forum, slug_conversation, pk_conve
         if form.is_valid():
             message = form.save(commit=False)
             message.conversation, message.account, message.personal = conversation, account, True
-            message.save()
-            Notification.notify_member_if_message_posted_in_conversation(conversation, account)
+            with transaction.atomic():
+                message.save()
+                NotificationEvent.queue(message)
+            ConversationReadState.mark_read(conversation, account, message.pk)
             return redirect(conversation)
     else:
         form = PostMessage()
+        if page_obj.object_list:
+            ConversationReadState.mark_read(conversation, account, max(message.pk for message in page_obj))
     return render(request, "private/conversation.html",
                   context={"account": account, "forum": forum, "conversation": conversation, "messages": messages,
                            "form": form, "contacts": contacts, "page_obj": page_obj})
 
 
 @login_required
+@forum_view
 def update_message_conversation(request, slug_forum, pk_forum, slug_conversation, pk_conversation, pk_message):
     """
        Render and handle the update of a message within a private conversation.
@@ -187,9 +197,9 @@ def update_message_conversation(request, slug_forum, pk_forum, slug_conversation
            HttpResponse: Renders the message update form with context data.
        """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
+    account = request.forum_account
     conversation = get_object_or_404(Conversation, pk=pk_conversation)
     message = get_object_or_404(Message, pk=pk_message)
     user_permission(message, account)
@@ -207,6 +217,7 @@ def update_message_conversation(request, slug_forum, pk_forum, slug_conversation
 
 @require_POST
 @login_required
+@forum_view
 def delete_message_conversation(request, pk_forum, pk_conversation, pk_message):
     """
         Handle the deletion of a message within a private conversation.
@@ -224,17 +235,18 @@ def delete_message_conversation(request, pk_forum, pk_conversation, pk_message):
             HttpResponse: Redirects back to the conversation after deleting the message.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
-    conversation = get_object_or_404(Conversation, pk=pk_conversation)
-    message = get_object_or_404(Message, pk=pk_message)
+    account = request.forum_account
+    conversation = get_object_or_404(Conversation.objects.select_related("forum"), pk=pk_conversation)
+    message = get_object_or_404(Message.objects.select_related("account"), pk=pk_message)
     user_permission(message, account)
     message.delete()
     return redirect(conversation)
 
 
 @login_required
+@forum_view
 def profile_forum(request, slug_forum, pk_forum):
     """
         Display and update the user's forum profile.
@@ -250,11 +262,10 @@ def profile_forum(request, slug_forum, pk_forum):
         Returns:
             HttpResponse: Renders the user's profile page with the ability to update profile information.
         """
-    user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
-    account = user.retrieve_forum_account(forum)
-    last_messages = Message.objects.filter(account=account, topic__sub_category__category__forum=forum).order_by(
-        "-creation")[:5]
+    forum = request.forum
+    account = request.forum_account
+    last_messages = Message.objects.filter(account=account, forum=forum, topic__hidden=False).select_related(
+        "topic__sub_category").order_by("-creation")[:5]
 
     if request.method == "POST":
         form = ProfileUpdateForm(request.POST, request.FILES, instance=account)
@@ -268,6 +279,7 @@ def profile_forum(request, slug_forum, pk_forum):
 
 
 @login_required
+@forum_view
 def notifications_view(request, slug_forum, pk_forum):
     """
        Display a user's forum notifications.
@@ -284,9 +296,9 @@ def notifications_view(request, slug_forum, pk_forum):
            HttpResponse: Renders the user's notifications page with a list of notifications.
        """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account = user.retrieve_forum_account(forum)
+    account = request.forum_account
     notifications = Notification.objects.filter(account=account)
     return render(request, "private/notifications.html", context={"forum": forum, "account": account,
                                                                   "notifications": notifications})
@@ -294,6 +306,7 @@ def notifications_view(request, slug_forum, pk_forum):
 
 @login_required
 @require_POST
+@forum_view
 def delete_notifications(request, pk_forum):
     """
         Delete a user's forum notifications.
@@ -310,10 +323,13 @@ def delete_notifications(request, pk_forum):
             HttpResponse: Redirects to the user's notifications page after deleting all notifications.
         """
     user = request.user
-    forum = get_object_or_404(Forum, pk=pk_forum)
+    forum = request.forum
     verify_active_forum_account(user, forum)
-    account: ForumAccount = user.retrieve_forum_account(forum)
-    Notification.objects.filter(account=account).delete()
-    account.notification_counter = 0
-    account.save()
+    account: ForumAccount = request.forum_account
+    with transaction.atomic():
+        # Locks the account so that the notifications delivered meanwhile are either deleted or counted
+        ForumAccount.objects.select_for_update().filter(pk=account.pk).exists()
+        Notification.objects.filter(account=account).delete()
+        account.notification_counter = 0
+        account.save(update_fields=["notification_counter"])
     return redirect("forum:alerts", slug_forum=forum.slug, pk_forum=forum.pk)
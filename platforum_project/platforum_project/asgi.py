@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'platforum_project.settings')
 
 application = get_asgi_application()
+
+if settings.FORUM_SERVE_STATIC:
+    from platforum_project.func.staticfiles import PrecompressedStaticFilesASGI
+
+    application = PrecompressedStaticFilesASGI(application)
@@ -0,0 +1,73 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import get_object_or_404, aget_object_or_404
+
+from forum.models import Forum, ForumAccount
+
+
+def async_login_required(view):
+    """
+        The 'login_required' decorator for the async views, which Django only supports from version 5.1.
+
+        Args:
+            view: The async view to decorate.
+
+        Returns:
+            function: The decorated view, redirecting the anonymous users to the login page.
+        """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Replaces the lazy 'request.user', which would load the user again from a synchronous context
+        request.user = user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def forum_view(view):
+    """
+        Resolves the forum of a view and the account of the user in it, once per request.
+
+        The forum is taken from the 'pk_forum' argument of the view and loaded with its forum master and theme, which
+        every forum page displays. It is attached to the request as 'request.forum', and the account of the user (None
+        if they are not a member) as 'request.forum_account'. The account is memoized on the user (see
+        'CustomUser.retrieve_forum_account'), so the checks of 'platforum_project/func/security.py' reuse it. Must be
+        placed under 'login_required' (or 'async_login_required' for an async view, whose forum and account are then
+        fetched concurrently).
+
+        Args:
+            view: The view to decorate, which must take a 'pk_forum' argument.
+
+        Returns:
+            function: The decorated view.
+
+        Raises:
+            Http404: If the forum does not exist.
+        """
+    forums = Forum.objects.select_related("forum_master", "theme")
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = request.user
+            request.forum, account = await asyncio.gather(
+                aget_object_or_404(forums, pk=kwargs["pk_forum"]),
+                sync_to_async(ForumAccount.get_cached)(user.pk, kwargs["pk_forum"]))
+            request.forum_account = user.remember_forum_account(request.forum, account)
+            return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.forum = get_object_or_404(forums, pk=kwargs["pk_forum"])
+        request.forum_account = request.user.retrieve_forum_account(request.forum)
+        return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,76 @@
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from platforum_project.func.pagination import KeysetPage
+
+DEFAULT_FRAGMENT_CACHE_TIMEOUT = 600
+
+
+def fragment_cache():
+    return caches[getattr(settings, "FORUM_FRAGMENT_CACHE", DEFAULT_CACHE_ALIAS)]
+
+
+def topic_page_key(topic, cursor):
+    digest = hashlib.md5((cursor or "").encode(), usedforsecurity=False).hexdigest()
+    return f"forum:topic-page:{topic.pk}:{topic.version}:{digest}"
+
+
+def cached_topic_page(topic, paginator, cursor):
+    """
+        Returns a page of messages of a topic along with their rendered HTML, from the cache when possible.
+
+        The page and the HTML of its messages ('forum/topic-messages.html') are cached together, keyed on the topic,
+        the cursor and the version of the topic. The version is bumped whenever a message of the topic is posted,
+        edited, deleted or liked, and when the topic is edited (see Topic.bump_version), so an outdated entry is never
+        read again and simply expires. On a hit, the messages are neither queried nor rendered.
+
+        The HTML is shared by all the viewers: it is returned split around each message's controls, which depend on
+        the viewer, see 'layer_message_controls'. The changes of an author's profile (username, thumbnail) show up
+        when the entry expires, see the FORUM_FRAGMENT_CACHE_TIMEOUT setting.
+
+        Args:
+            topic: The topic.
+            paginator: A KeysetPaginator over the messages of the topic.
+            cursor: The cursor of the requested page, if any.
+
+        Returns:
+            tuple: The KeysetPage and the list of HTML chunks surrounding the controls of its messages.
+        """
+    if cursor and paginator.decode_cursor(cursor) == (None, None):
+        # An invalid cursor falls back to the first page, which is cached once
+        cursor = None
+    cache = fragment_cache()
+    key = topic_page_key(topic, cursor)
+    entry = cache.get(key)
+    if entry is None:
+        page = paginator.get_page(cursor)
+        # Random, so that the marker cannot be forged in the content of a message
+        marker = f"<!-- controls {secrets.token_hex(8)} -->"
+        html = render_to_string("forum/topic-messages.html", {"page_obj": page, "controls_marker": marker})
+        entry = (page.object_list, page.has_next(), page.has_previous(), html.split(marker))
+        cache.set(key, entry, getattr(settings, "FORUM_FRAGMENT_CACHE_TIMEOUT", DEFAULT_FRAGMENT_CACHE_TIMEOUT))
+    object_list, has_next, has_previous, chunks = entry
+    return KeysetPage(object_list, paginator, has_next, has_previous), chunks
+
+
+def layer_message_controls(chunks, page, request, context):
+    """
+        Inserts the controls of the viewer (like, edit and delete buttons) into the cached HTML of a page of messages.
+
+        Args:
+            chunks: The HTML chunks returned by 'cached_topic_page'.
+            page: The page of messages returned by 'cached_topic_page'.
+            request: The HTTP request object.
+            context: The context of the topic page ('forum', 'sub_category', 'topic', 'account', 'liked_messages').
+
+        Returns:
+            str: The HTML of the messages, safe.
+        """
+    controls = [render_to_string("forum/topic-message-controls.html", {**context, "message": message}, request=request)
+                for message in page]
+    return mark_safe("".join(chunk + control for chunk, control in zip(chunks, controls)) + chunks[-1])
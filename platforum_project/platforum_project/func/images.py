@@ -0,0 +1,73 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Width and height (at most) of the variants of the uploaded images, about twice the size they are displayed at
+SMALL = 120
+MEDIUM = 200
+LARGE = 400
+SIZES = (SMALL, MEDIUM, LARGE)
+
+# Formats of the variants, by extension: only the ones the pages link to
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+}
+
+
+def variant_name(name, size, extension="webp"):
+    """
+        Returns the name of a variant of a stored image, next to the original ("avatars/moi.png" ->
+        "avatars/moi.120.webp").
+
+        Args:
+            name: The name of the original in its storage.
+            size: The size of the variant, see SIZES.
+            extension: The format of the variant, see FORMATS.
+
+        Returns:
+            str: The name of the variant in the same storage.
+        """
+    root, _ = posixpath.splitext(name)
+    return f"{root}.{size}.{extension}"
+
+
+def variant_url(field_file, size, extension="webp"):
+    # Computed from the name of the original: displaying a variant costs no query nor storage access
+    return field_file.storage.url(variant_name(field_file.name, size, extension))
+
+
+def has_variants(field_file):
+    return all(field_file.storage.exists(variant_name(field_file.name, size, extension))
+               for size in SIZES for extension in FORMATS)
+
+
+def make_variants(field_file):
+    """
+        Stores the resized variants of an uploaded image next to it, in every size and format.
+
+        The image is rotated according to its EXIF orientation, then its metadata (EXIF, including the GPS position of
+        photos, ICC profile, comments) is dropped. Existing variants are replaced.
+
+        Args:
+            field_file: The stored original, the value of an ImageField.
+
+        Raises:
+            OSError: The original cannot be read or is not an image.
+        """
+    storage = field_file.storage
+    with storage.open(field_file.name, "rb") as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    image.info = {}
+    for size in SIZES:
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, format=image_format, **options)
+            name = variant_name(field_file.name, size, extension)
+            storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
@@ -0,0 +1,145 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from math import ceil
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """
+        A page of results returned by a KeysetPaginator.
+
+        It iterates like the page of a regular Paginator and exposes opaque cursors to reach the neighbouring pages
+        ('next_cursor', 'previous_cursor') and the last page ('last_cursor'). The first page has no cursor.
+        """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not (self._has_next and self.object_list):
+            return None
+        return self.paginator.encode_cursor(KeysetPaginator.AFTER, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not (self._has_previous and self.object_list):
+            return None
+        return self.paginator.encode_cursor(KeysetPaginator.BEFORE, self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return KeysetPaginator.LAST
+
+
+class KeysetPaginator:
+    """
+        Paginates a queryset by seeking on its ordering key instead of using OFFSET.
+
+        Each page is fetched with a "WHERE key > last key seen ORDER BY key LIMIT n" query, so that a deep page costs
+        the same as the first one as long as an index covers the filter and the ordering. The ordering must be unique,
+        hence the primary key as last field. The total count is not computed, pass it from a stored counter if the
+        template displays it.
+
+        Args:
+            queryset: The queryset to paginate.
+            per_page: The number of objects per page.
+            ordering: The fields of the ordering key, a leading "-" for descending order.
+            count: The total number of objects, if known.
+        """
+    AFTER = "a"
+    BEFORE = "b"
+    LAST = "last"
+
+    def __init__(self, queryset, per_page, ordering=("creation", "pk"), count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.count = count
+
+    @property
+    def num_pages(self):
+        return max(ceil(self.count / self.per_page), 1) if self.count is not None else None
+
+    def encode_cursor(self, direction, obj):
+        values = [str(getattr(obj, field.lstrip("-"))) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps([direction, values]).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if cursor == self.LAST:
+            return self.LAST, None
+        try:
+            direction, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            return None, None
+        if direction not in (self.AFTER, self.BEFORE) or not isinstance(values, list) \
+                or len(values) != len(self.ordering):
+            return None, None
+        return direction, values
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith("-") else f"-{field}" for field in self.ordering]
+
+    def _seek(self, values, forward):
+        """
+            Builds the filter selecting the rows after (forward) or before the given key, in the ordering's order.
+
+            For a key (a, b) in ascending order, "after" is: a > va OR (a = va AND b > vb).
+            """
+        conditions = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            ascending = not field.startswith("-")
+            lookup = "gt" if ascending == forward else "lt"
+            equal = {previous.lstrip("-"): value for previous, value in zip(self.ordering[:i], values)}
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": values[i]}))
+        return reduce(lambda left, right: left | right, conditions)
+
+    def get_page(self, cursor=None):
+        """
+            Returns the page designated by a cursor, or the first page if the cursor is missing or invalid.
+
+            Args:
+                cursor: An opaque cursor taken from a page ('next_cursor', 'previous_cursor' or 'last_cursor').
+
+            Returns:
+                KeysetPage: The requested page.
+            """
+        direction, values = self.decode_cursor(cursor) if cursor else (None, None)
+        size = self.per_page + 1
+        queryset = self.queryset
+        try:
+            if direction in (self.AFTER, self.BEFORE):
+                queryset = queryset.filter(self._seek(values, forward=direction == self.AFTER))
+        except (ValueError, ValidationError):
+            direction, queryset = None, self.queryset
+
+        if direction == self.BEFORE:
+            rows = list(queryset.order_by(*self._reversed_ordering())[:size])
+            return KeysetPage(rows[:self.per_page][::-1], self, has_next=True, has_previous=len(rows) > self.per_page)
+        if direction == self.LAST:
+            rows = list(queryset.order_by(*self._reversed_ordering())[:size])
+            return KeysetPage(rows[:self.per_page][::-1], self, has_next=False, has_previous=len(rows) > self.per_page)
+
+        rows = list(queryset.order_by(*self.ordering)[:size])
+        return KeysetPage(rows[:self.per_page], self, has_next=len(rows) > self.per_page,
+                          has_previous=direction == self.AFTER)
@@ -0,0 +1,21 @@
+from django.db.models import Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+
+
+def related_count(queryset, field):
+    """
+        Builds a correlated subquery counting the rows of 'queryset' whose 'field' points to the outer row.
+
+        Unlike 'Count' over a join, several of these can be combined in the same query without multiplying each other,
+        and they can be used in 'update()'.
+
+        Args:
+            queryset: The rows to count, e.g. 'Message.objects.all()'.
+            field: The lookup from these rows to the outer model, e.g. "account" or "message__account".
+
+        Returns:
+            Expression: The count, 0 when there is no row.
+        """
+    counts = queryset.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(
+        total=Count("pk")).values("total")
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
@@ -0,0 +1,164 @@
+import html
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.utils.html import strip_tags
+from django.utils.module_loading import import_string
+
+from forum.models import Topic, Message, SearchEntry
+from platforum_project.func.text import fold
+
+DEFAULT_SEARCH_BACKEND = "platforum_project.func.search.InvertedIndexBackend"
+
+MAX_TERM_LENGTH = 50
+
+# Accents are folded before comparing, hence "a" for "à", "ete" for "été"...
+FRENCH_STOP_WORDS = {
+    "a", "ai", "au", "aux", "avec", "ce", "ces", "cet", "cette", "dans", "de", "des", "du", "elle", "en", "est", "et",
+    "etait", "ete", "eu", "il", "ils", "je", "la", "le", "les", "leur", "lui", "ma", "mais", "me", "meme", "mes",
+    "moi", "mon", "ne", "nos", "notre", "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se",
+    "ses", "son", "sont", "sur", "ta", "te", "tes", "toi", "ton", "tu", "un", "une", "vos", "votre", "vous", "y",
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def stem(word):
+    """
+        Reduces a French word to a crude stem by removing the mark of the plural ("guitares" -> "guitare").
+
+        Args:
+            word: A folded word.
+
+        Returns:
+            str: The stem of the word.
+        """
+    if len(word) > 3 and word[-1] in "sx":
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """
+        Splits a text (possibly HTML, as written with the editor) into search terms.
+
+        The tags are stripped and the entities decoded, the text is folded (see 'fold') and split into words. The
+        elisions ("l'", "qu'"...) and the French stop words are dropped, and the remaining words are stemmed.
+
+        Args:
+            text: The text to tokenize.
+
+        Returns:
+            list: The terms of the text, in order, with repetitions.
+        """
+    words = WORD_PATTERN.findall(fold(html.unescape(strip_tags(text or ""))))
+    return [stem(word)[:MAX_TERM_LENGTH] for word in words if len(word) > 1 and word not in FRENCH_STOP_WORDS]
+
+
+class SearchBackend:
+    """
+        The interface of the search engines used by the search page, see the FORUM_SEARCH_BACKEND setting.
+
+        The engine is kept up to date by the 'process_search_index' command, which drains the changes recorded in
+        SearchIndexTask, and can be rebuilt per forum with the 'reindex_forum' command. The searches are scoped to a
+        forum and return querysets ordered by relevance, ready to be paginated.
+        """
+
+    def index_messages(self, messages):
+        raise NotImplementedError
+
+    def index_topics(self, topics):
+        raise NotImplementedError
+
+    def remove_messages(self, message_ids):
+        raise NotImplementedError
+
+    def remove_topics(self, topic_ids):
+        raise NotImplementedError
+
+    def clear_forum(self, forum):
+        raise NotImplementedError
+
+    def search_topics(self, forum, query):
+        raise NotImplementedError
+
+    def search_messages(self, forum, query):
+        raise NotImplementedError
+
+
+class InvertedIndexBackend(SearchBackend):
+    """
+        A search engine storing an inverted index in the database (see SearchEntry), usable with any database.
+
+        Each (term, message) and (term, topic title) pair is a row, weighted by the number of occurrences of the term.
+        A search looks up the terms of the query through the (forum, term) index, keeps the documents containing all
+        of them and sorts them by total weight.
+        """
+    batch_size = 1000
+
+    @staticmethod
+    def _forum_ids(topic_ids):
+        # Through the sub-category for the topics the 'backfill_forum_ids' command has not filled yet
+        return dict(Topic.objects.filter(pk__in=topic_ids).values_list(
+            "pk", Coalesce("forum", "sub_category__category__forum")))
+
+    def _write(self, documents, document, text, topic_id):
+        forum_ids = self._forum_ids({topic_id(obj) for obj in documents})
+        SearchEntry.objects.bulk_create(
+            [SearchEntry(forum_id=forum_ids[topic_id(obj)], term=term, weight=weight, **{document: obj})
+             for obj in documents if topic_id(obj) in forum_ids
+             for term, weight in Counter(tokenize(text(obj))).items()],
+            batch_size=self.batch_size)
+
+    def index_messages(self, messages):
+        messages = list(messages)
+        self.remove_messages([message.pk for message in messages])
+        self._write([message for message in messages if message.topic_id and not message.personal], "message",
+                    lambda message: message.message, lambda message: message.topic_id)
+
+    def index_topics(self, topics):
+        topics = list(topics)
+        self.remove_topics([topic.pk for topic in topics])
+        self._write(topics, "topic", lambda topic: topic.title, lambda topic: topic.pk)
+
+    def remove_messages(self, message_ids):
+        SearchEntry.objects.filter(message__in=message_ids).delete()
+
+    def remove_topics(self, topic_ids):
+        SearchEntry.objects.filter(topic__in=topic_ids).delete()
+
+    def clear_forum(self, forum):
+        SearchEntry.objects.filter(forum=forum).delete()
+
+    @staticmethod
+    def _ranked(queryset, forum, query):
+        terms = set(tokenize(query))
+        if not terms:
+            return queryset.none()
+        return (queryset
+                .filter(searchentry__forum=forum, searchentry__term__in=terms)
+                .annotate(matched=Count("searchentry"), score=Sum("searchentry__weight"))
+                .filter(matched=len(terms)))
+
+    def search_topics(self, forum, query):
+        topics = Topic.objects.filter(hidden=False).select_related("sub_category__category__forum")
+        return self._ranked(topics, forum, query).order_by("-score", "-last_activity", "-pk")
+
+    def search_messages(self, forum, query):
+        messages = Message.objects.filter(topic__hidden=False).select_related("topic__sub_category__category__forum",
+                                                                              "account__user")
+        return self._ranked(messages, forum, query).order_by("-score", "-creation", "-pk")
+
+
+def get_search_backend():
+    """
+        Returns the search engine configured by the FORUM_SEARCH_BACKEND setting (the dotted path of a SearchBackend
+        subclass), the inverted index by default.
+
+        Returns:
+            SearchBackend: The search engine.
+        """
+    return import_string(getattr(settings, "FORUM_SEARCH_BACKEND", DEFAULT_SEARCH_BACKEND))()
@@ -1,5 +1,4 @@
-from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
-from forum.models import ForumAccount
+from django.core.exceptions import PermissionDenied
 
 
 def user_permission(forum_element, account):
@@ -25,7 +24,8 @@ def verify_active_forum_account(user, forum):
     """
         Verifies if a user has an active forum account for a specific forum.
 
-        This function checks whether the given user has an active account associated with the specified forum. It returns
+        This function checks whether the given user has an active account associated with the specified forum, reusing
+        the account already retrieved during the request (see 'CustomUser.retrieve_forum_account'). It returns
         True if such an account exists. If no active account is found, it raises a PermissionDenied exception, indicating
         that the user lacks the necessary permissions to access or perform actions within the forum.
 
@@ -39,11 +39,10 @@ def verify_active_forum_account(user, forum):
         Raises:
             PermissionDenied: If no active forum account for the user exists in the specified forum.
         """
-    try:
-        ForumAccount.objects.get(user=user, forum=forum, active=True)
-        return True
-    except ObjectDoesNotExist:
+    account = user.retrieve_forum_account(forum)
+    if account is None or not account.active:
         raise PermissionDenied()
+    return True
 
 
 def verify_forum_master_status(account):
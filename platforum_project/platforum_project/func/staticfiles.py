@@ -0,0 +1,265 @@
+import asyncio
+import gzip
+import json
+import mimetypes
+import os
+from http import HTTPStatus
+from io import BytesIO
+from urllib.parse import urlparse
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it, only the gzip copies are written
+    brotli = None
+
+# The files worth compressing, the others (images, fonts in WOFF) are compressed already
+COMPRESSIBLE = (".css", ".js", ".mjs", ".map", ".svg", ".json", ".txt", ".xml", ".html", ".ico", ".ttf", ".otf",
+                ".eot")
+# A precompressed copy is kept only when it is at least 5% smaller than the file
+MIN_RATIO = 0.95
+# Extension of the precompressed copies, by HTTP content coding, preferred first
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# The files without a hash in their name (e.g. loaded by CKEditor) may change on the next deployment
+REVALIDATE = "public, max-age=60"
+CHUNK_SIZE = 64 * 1024
+
+
+def optimize_png(path):
+    """
+        Recompresses a PNG image losslessly, keeping the result only if it is smaller.
+
+        The pixels, the palette, the transparency and the ICC profile are kept, the other metadata is dropped.
+
+        Args:
+            path: The path of the image.
+
+        Returns:
+            int: The number of bytes saved.
+        """
+    with open(path, "rb") as file:
+        original = file.read()
+    with Image.open(BytesIO(original)) as image:
+        if getattr(image, "is_animated", False):
+            return 0
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", optimize=True, icc_profile=image.info.get("icc_profile"))
+    if buffer.tell() >= len(original):
+        return 0
+    with open(path, "wb") as file:
+        file.write(buffer.getvalue())
+    return len(original) - buffer.tell()
+
+
+def precompress(path):
+    """
+        Writes the gzip (.gz) and, if the 'brotli' package is installed, Brotli (.br) copies of a file next to it.
+
+        Args:
+            path: The path of the file.
+
+        Returns:
+            list: The paths of the copies written, the ones not saving enough bytes are skipped.
+        """
+    with open(path, "rb") as file:
+        data = file.read()
+    copies = {ENCODINGS["gzip"]: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copies[ENCODINGS["br"]] = brotli.compress(data, quality=11)
+    written = []
+    for extension, compressed in copies.items():
+        if len(compressed) < len(data) * MIN_RATIO:
+            with open(path + extension, "wb") as file:
+                file.write(compressed)
+            written.append(path + extension)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+        Stores the static files as ManifestStaticFilesStorage, with the hash of their content in their name, then
+        recompresses the PNG images losslessly and writes precompressed copies of the text files.
+
+        Everything happens during 'collectstatic', the copies are then served by PrecompressedStaticFiles.
+        """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+        names = set(paths)
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                names.add(hashed_name)
+            yield name, hashed_name, processed
+        # The hashes are the ones of the source files: the recompression gives the same result for the same source
+        for name in names:
+            if name.lower().endswith(".png"):
+                optimize_png(self.path(name))
+            elif name.lower().endswith(COMPRESSIBLE):
+                precompress(self.path(name))
+
+
+def accepted_encodings(header):
+    """
+        Returns the content codings accepted by a client, from its Accept-Encoding header ("gzip, br;q=0.8").
+
+        Args:
+            header: The value of the header, possibly empty.
+
+        Returns:
+            set: The accepted codings, without the ones refused with "q=0".
+        """
+    accepted = set()
+    for part in header.split(","):
+        coding, _, parameters = part.partition(";")
+        parameters = parameters.strip()
+        try:
+            quality = float(parameters.removeprefix("q=")) if parameters.startswith("q=") else 1
+        except ValueError:
+            quality = 1
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles:
+    """
+        Serves the collected static files (STATIC_ROOT) in front of the application, so that no separate web server or
+        CDN is needed for them. See PrecompressedStaticFilesWSGI and PrecompressedStaticFilesASGI.
+
+        The files are listed once, when the application starts, so a request costs no file system lookup: restart the
+        application after 'collectstatic'. Each file is served in its Brotli or gzip copy when one exists and the
+        client accepts it, and the files with a hash in their name (listed in the manifest) are cached by the clients
+        for a year. The other requests are passed to the application.
+
+        Args:
+            application: The WSGI or ASGI application.
+            root: The directory of the static files, STATIC_ROOT by default.
+            prefix: The URL path of the static files, the one of STATIC_URL by default.
+        """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = str(root or settings.STATIC_ROOT)
+        self.prefix = prefix or urlparse(settings.STATIC_URL).path
+        self.files = self.index()
+
+    def index(self):
+        try:
+            with open(os.path.join(self.root, ManifestStaticFilesStorage.manifest_name)) as file:
+                hashed = set(json.load(file).get("paths", {}).values())
+        except (OSError, ValueError):
+            hashed = set()
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(tuple(ENCODINGS.values())):
+                    continue
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                files[self.prefix + relative] = StaticFile(path, immutable=relative in hashed)
+        return files
+
+    def find(self, method, path, accept_encoding="", if_none_match=None):
+        """
+            Builds the response to a request for a static file.
+
+            Args:
+                method: The HTTP method.
+                path: The URL path requested.
+                accept_encoding: The Accept-Encoding header of the request.
+                if_none_match: The If-None-Match header of the request, if any.
+
+            Returns:
+                tuple: The status code, the headers and the path of the file to send (None for no body), or None when
+                the request is not for a static file.
+            """
+        static_file = self.files.get(path)
+        if static_file is None or method not in ("GET", "HEAD"):
+            return None
+        return static_file.response(method, accept_encoding, if_none_match)
+
+
+class StaticFile:
+    """
+        A static file and its precompressed copies, with the headers they are served with.
+
+        Args:
+            path: The path of the file.
+            immutable: Whether its name contains the hash of its content.
+        """
+
+    def __init__(self, path, immutable):
+        self.path = path
+        stat = os.stat(path)
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        self.headers = [("Content-Type", content_type), ("Cache-Control", IMMUTABLE if immutable else REVALIDATE)]
+        # (coding, path, size, ETag) of each available copy, preferred first, the file itself last. The copies have
+        # bytes of their own, hence ETags of their own ("...-br", "...-gzip"), as strong validators must
+        tag = f"{stat.st_size:x}-{int(stat.st_mtime):x}"
+        self.variants = [(coding, path + extension, os.path.getsize(path + extension), f'"{tag}-{coding}"')
+                         for coding, extension in ENCODINGS.items() if os.path.exists(path + extension)]
+        if self.variants:
+            self.headers.append(("Vary", "Accept-Encoding"))
+        self.variants.append((None, path, stat.st_size, f'"{tag}"'))
+
+    def response(self, method, accept_encoding, if_none_match):
+        accepted = accepted_encodings(accept_encoding)
+        coding, path, size, etag = next(variant for variant in self.variants
+                                        if variant[0] is None or variant[0] in accepted or "*" in accepted)
+        headers = [*self.headers, ("ETag", etag)]
+        # Compared with the tag of the copy the client would get
+        if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+            return HTTPStatus.NOT_MODIFIED, headers, None
+        headers.append(("Content-Length", str(size)))
+        if coding:
+            headers.append(("Content-Encoding", coding))
+        return HTTPStatus.OK, headers, path if method == "GET" else None
+
+
+class PrecompressedStaticFilesWSGI(PrecompressedStaticFiles):
+    def __call__(self, environ, start_response):
+        # PATH_INFO holds the bytes of the path decoded as latin-1, see PEP 3333
+        path = environ.get("PATH_INFO", "").encode("latin-1").decode("utf-8", "replace")
+        found = self.find(environ["REQUEST_METHOD"], path, environ.get("HTTP_ACCEPT_ENCODING", ""),
+                          environ.get("HTTP_IF_NONE_MATCH"))
+        if found is None:
+            return self.application(environ, start_response)
+        status, headers, path = found
+        start_response(f"{status.value} {status.phrase}", headers)
+        if path is None:
+            return []
+        return environ.get("wsgi.file_wrapper", FileWrapper)(open(path, "rb"), CHUNK_SIZE)
+
+
+class PrecompressedStaticFilesASGI(PrecompressedStaticFiles):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.application(scope, receive, send)
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        found = self.find(scope["method"], scope["path"], headers.get("accept-encoding", ""),
+                          headers.get("if-none-match"))
+        if found is None:
+            return await self.application(scope, receive, send)
+        status, headers, path = found
+        await send({"type": "http.response.start", "status": status.value,
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]})
+        if path is None:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        with open(path, "rb") as file:
+            # Read in a thread, not to block the event loop on the disk
+            while chunk := await asyncio.to_thread(file.read, CHUNK_SIZE):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
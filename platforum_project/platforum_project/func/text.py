@@ -0,0 +1,15 @@
+import unicodedata
+
+
+def fold(text):
+    """
+        Lowercases a text and removes its accents ("Été" -> "ete").
+
+        Args:
+            text: The text to fold.
+
+        Returns:
+            str: The folded text.
+        """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
@@ -147,6 +147,16 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+if ENV == "PROD":
+    # Names with the hash of the content, recompressed PNG and precompressed copies, see func/staticfiles.py
+    STORAGES = {
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "platforum_project.func.staticfiles.CompressedManifestStaticFilesStorage"},
+    }
+
+# Serves the collected static files from the WSGI/ASGI application (see PrecompressedStaticFiles), without a CDN
+FORUM_SERVE_STATIC = env.bool("FORUM_SERVE_STATIC", default=ENV == "PROD")
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "mediafiles"
 
@@ -161,6 +171,29 @@ AUTH_USER_MODEL = "account.CustomUser"
 # Login
 LOGIN_URL = "account:login"
 
+# Cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Cache of the forum accounts (see ForumAccount.get_cached), the alias of one of the CACHES
+FORUM_ACCOUNT_CACHE = "default"
+FORUM_ACCOUNT_CACHE_TIMEOUT = 300
+
+# Cache of the rendered pages of topics (see platforum_project/func/fragments.py), the alias of one of the CACHES
+FORUM_FRAGMENT_CACHE = "default"
+FORUM_FRAGMENT_CACHE_TIMEOUT = 600
+
+# Serves the async versions of the read-heavy forum views (see forum/views/asynchronous.py), for ASGI deployments
+FORUM_ASYNC_VIEWS = env.bool("FORUM_ASYNC_VIEWS", default=False)
+if FORUM_ASYNC_VIEWS:
+    ROOT_URLCONF = 'platforum_project.urls_async'
+
+# Search engine of the forums, see platforum_project/func/search.py
+FORUM_SEARCH_BACKEND = "platforum_project.func.search.InvertedIndexBackend"
+
 # Crispy
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
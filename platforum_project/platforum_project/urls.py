@@ -4,14 +4,29 @@ from django.urls import path, include
 
 from django.conf import settings
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('', include('landing.urls')),
-    path('account/', include('account.urls')),
-    path('forum/', include('forum.urls')),
-    path('ckeditor/', include('ckeditor_uploader.urls')),
-    path('sav/', include('sav.urls')),
-]
-
-if settings.ENV != "PROD":
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+
+def project_urlpatterns(forum_urls):
+    """
+        Returns the URL patterns of the project.
+
+        Args:
+            forum_urls: The URLconf of the forums, 'forum.urls' or 'forum.urls_async' (see urls_async.py).
+
+        Returns:
+            list: The URL patterns.
+        """
+    patterns = [
+        path('admin/', admin.site.urls),
+        path('', include('landing.urls')),
+        path('account/', include('account.urls')),
+        path('forum/', include(forum_urls)),
+        path('ckeditor/', include('ckeditor_uploader.urls')),
+        path('sav/', include('sav.urls')),
+    ]
+    if settings.ENV != "PROD":
+        patterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    return patterns
+
+
+urlpatterns = project_urlpatterns('forum.urls')
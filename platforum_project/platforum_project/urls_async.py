@@ -0,0 +1,7 @@
+"""
+    URLconf of the ASGI deployments, serving the async versions of the read-heavy forum views (see
+    forum/urls_async.py). Chosen as ROOT_URLCONF by the FORUM_ASYNC_VIEWS setting.
+"""
+from .urls import project_urlpatterns
+
+urlpatterns = project_urlpatterns('forum.urls_async')
@@ -0,0 +1,43 @@
+import time
+from smtplib import SMTPException
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from sav.models import OutgoingEmail
+
+
+class Command(BaseCommand):
+    help = "Sends the queued emails in batches, over one SMTP connection per batch, at a limited rate."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--rate", type=float, default=5, help="The maximum number of emails sent per second.")
+
+    def handle(self, *args, **options):
+        sent = failed = 0
+        # A failed email is rescheduled later (see OutgoingEmail.failed), so each email is tried once per run
+        while emails := list(OutgoingEmail.due()[:options["batch_size"]]):
+            start = time.monotonic()
+            pending = list(emails)
+            try:
+                with get_connection() as connection:
+                    while pending:
+                        email = pending[0]
+                        try:
+                            connection.send_messages([email.as_message(connection)])
+                        except (SMTPException, OSError, ValueError) as error:
+                            email.failed(error)
+                            failed += 1
+                        else:
+                            email.delete()
+                            sent += 1
+                        pending.pop(0)
+            except (SMTPException, OSError) as error:
+                # The connection could not be opened, or was lost: the emails not sent yet are retried later
+                for email in pending:
+                    email.failed(error)
+                failed += len(pending)
+            # Rate limit: a batch lasts at least as long as its emails are allowed to take
+            time.sleep(max(len(emails) / options["rate"] - (time.monotonic() - start), 0))
+        self.stdout.write(self.style.SUCCESS(f"{sent} emails sent, {failed} failed."))
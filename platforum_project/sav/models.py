@@ -1,3 +1,61 @@
+from datetime import timedelta
+
+from django.core.mail import EmailMessage
 from django.db import models
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """
+        An email waiting to be sent by the 'send_emails' command.
+
+        The views queue their emails here instead of talking to the SMTP server during the request. A failed email is
+        retried later, after a delay doubling at each attempt, and given up after MAX_ATTEMPTS attempts (it stays in
+        the table with its last error).
+        """
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = timedelta(minutes=1)
+
+    to = models.EmailField(verbose_name="Destinataire")
+    subject = models.CharField(max_length=200, verbose_name="Sujet")
+    body = models.TextField(verbose_name="Contenu")
+    from_email = models.CharField(max_length=200, blank=True, verbose_name="Expéditeur")
+    creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    next_attempt = models.DateTimeField(default=timezone.now, verbose_name="Prochain essai")
+    attempts = models.IntegerField(default=0, verbose_name="Nombre d'essais")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+
+    class Meta:
+        verbose_name = "Email à envoyer"
+        indexes = [
+            # Emails due, see the 'send_emails' command
+            models.Index(fields=["next_attempt"], name="email_next_attempt_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.to} - {self.subject}"
+
+    @classmethod
+    def queue(cls, to, subject, body, from_email=None):
+        return cls.objects.create(to=to, subject=subject, body=body, from_email=from_email or "")
+
+    @classmethod
+    def due(cls):
+        return cls.objects.filter(next_attempt__lte=timezone.now(), attempts__lt=cls.MAX_ATTEMPTS).order_by(
+            "next_attempt", "pk")
+
+    def as_message(self, connection=None):
+        return EmailMessage(subject=self.subject, body=self.body, from_email=self.from_email or None, to=[self.to],
+                            connection=connection)
+
+    def failed(self, error):
+        """
+            Records a failed attempt and schedules the next one, later and later.
 
-# Create your models here.
+            Args:
+                error: The exception raised while sending the email.
+            """
+        self.attempts += 1
+        self.last_error = repr(error)
+        self.next_attempt = timezone.now() + self.RETRY_DELAY * 2 ** (self.attempts - 1)
+        self.save(update_fields=["attempts", "last_error", "next_attempt"])
@@ -1,7 +1,7 @@
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.shortcuts import render, redirect
 from .forms import ContactForm
+from .models import OutgoingEmail
 
 
 def contact_view(request):
@@ -13,10 +13,9 @@ def contact_view(request):
             email = form.cleaned_data["email"]
             subject = form.cleaned_data["subject"]
             text = form.cleaned_data["text"]
-            send_mail(subject=subject, message=f"De la part de {email} - {text}",
-                      recipient_list=["gabrieltrouve5@gmail.com"], from_email=None)
-            send_mail(subject="Email bien envoyé", message="J'ai bien reçu votre email, je réponds rapidement :).",
-                      from_email=None, recipient_list=[email])
+            OutgoingEmail.queue(to="gabrieltrouve5@gmail.com", subject=subject, body=f"De la part de {email} - {text}")
+            OutgoingEmail.queue(to=email, subject="Email bien envoyé",
+                                body="J'ai bien reçu votre email, je réponds rapidement :).")
             messages.add_message(request, messages.INFO,
                                  "Le message a été envoyé, si vous ne recevez pas d'email "
                                  "de confirmation veuillez vérifier vos spams ou renvoyer votre "